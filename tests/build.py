@@ -4,10 +4,52 @@
 # dependencies = []
 # ///
 
+"""
+Build ./release/screenshot.exe from ./code.
+
+The build is incremental: a fingerprint of the sources in ./code (everything
+except bin/ and obj/, so including Screenshot.csproj), this script and the build
+command is stored with the SHA-256 of the built executable in
+./.cache/release-stamp.json. When both still match, the build is skipped. The
+stamp can't sit in ./release itself, which must contain only screenshot.exe.
+
+A new executable only replaces ./release/screenshot.exe (with one atomic
+rename) after a successful build; a failed build leaves ./release untouched.
+
+Every build is also stored in a content-addressed artifact cache shared by all
+worktrees and runs, keyed by the same fingerprint. When the sources match a
+cached build (e.g. after switching branches back), it is restored into ./release
+by hardlink (or copy) instead of rebuilding. The least recently used builds are
+evicted beyond BUILD_CACHE_ENTRIES builds or BUILD_CACHE_MAX_MB.
+
+Each run writes ./reports/<timestamp>_build.json (fingerprint, result:
+up-to-date / cache-hit / miss / failed, seconds per step, artifact size) with
+the compiler output in a gzipped <timestamp>_build_output.txt.gz next to it,
+and appends the same record to ./.cache/build-history.jsonl (last
+BUILD_HISTORY_LIMIT runs) for charting build cost over time.
+
+Environment:
+    BUILD_COMMAND   Build command run in ./code instead of dotnet publish
+                    (e.g. a stub on Linux)
+    BUILD_ARTIFACT  Path of the executable it produces, relative to ./code
+    BUILD_FORCE=1   Build even when the stamp matches or the build is cached
+    BUILD_CACHE_DIR Artifact cache location (default: %LOCALAPPDATA%\screenshot-build-cache
+                    on Windows, ~/.cache/screenshot-build-cache elsewhere); empty disables it
+    BUILD_CACHE_ENTRIES  Builds to keep (default 10)
+    BUILD_CACHE_MAX_MB   Total size to keep (default 2048)
+"""
+
 import sys
 import os
+import json
+import shlex
 import shutil
+import gzip
+import time
+import hashlib
 import subprocess
+from datetime import datetime
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
 
 # Fix Windows console encoding for Unicode characters
@@ -15,33 +57,308 @@ if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
     sys.stderr.reconfigure(encoding='utf-8')
 
+# Pipeline tracing lives in the-system; the build still works without it
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "the-system" / "scripts"))
+try:
+    import tracing
+except ImportError:
+    tracing = None
+
+def span(name):
+    """Trace span for a build step, or a no-op when tracing is unavailable."""
+    return tracing.span(name, cat="build") if tracing else nullcontext()
+
+DEFAULT_BUILD_COMMAND = ["dotnet", "publish", "-c", "Release", "-r", "win-x64", "--self-contained"]
+
+# The AOT-compiled executable is in code/bin/Release/net8.0-windows/win-x64/publish/
+DEFAULT_ARTIFACT = Path("bin") / "Release" / "net8.0-windows" / "win-x64" / "publish" / "screenshot.exe"
+
+# Build outputs, not sources
+FINGERPRINT_EXCLUDES = {"bin", "obj"}
+
+def build_command():
+    command = os.environ.get("BUILD_COMMAND")
+    return shlex.split(command) if command else DEFAULT_BUILD_COMMAND
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def source_fingerprint(code_dir, command):
+    """SHA-256 over every source file's path and content, this script and the build command."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(command).encode("utf-8"))
+    digest.update(Path(__file__).read_bytes())
+    for root, dirs, files in os.walk(code_dir):
+        dirs[:] = sorted(d for d in dirs if d not in FINGERPRINT_EXCLUDES)
+        for name in sorted(files):
+            path = Path(root) / name
+            digest.update(b"\0" + path.relative_to(code_dir).as_posix().encode("utf-8") + b"\0")
+            digest.update(file_hash(path).encode("ascii"))
+    return digest.hexdigest()
+
+def default_cache_dir():
+    if sys.platform == "win32" and os.environ.get("LOCALAPPDATA"):
+        return Path(os.environ["LOCALAPPDATA"]) / "screenshot-build-cache"
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "screenshot-build-cache"
+
+class ArtifactCache:
+    """
+    Published executables keyed by source fingerprint, one directory per build:
+    <root>/<fingerprint>/screenshot.exe plus meta.json. Entries are written to a
+    temporary directory and renamed into place, so concurrent builds in other
+    worktrees never see half-written entries; the directory's mtime records the
+    last use for LRU eviction.
+    """
+
+    def __init__(self, root, max_entries=10, max_bytes=2048 * 1024 * 1024):
+        self.root = Path(root)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_env(cls):
+        root = os.environ.get("BUILD_CACHE_DIR")
+        if root == "":
+            return None
+        return cls(
+            root or default_cache_dir(),
+            max_entries=int(os.environ.get("BUILD_CACHE_ENTRIES", "10")),
+            max_bytes=int(os.environ.get("BUILD_CACHE_MAX_MB", "2048")) * 1024 * 1024,
+        )
+
+    def lookup(self, fingerprint):
+        """Path of the cached executable for fingerprint, or None if missing or corrupt."""
+        entry = self.root / fingerprint
+        exe = entry / "screenshot.exe"
+        try:
+            meta = json.loads((entry / "meta.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not exe.is_file() or meta.get("exe_sha256") != file_hash(exe):
+            return None
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return exe
+
+    def store(self, fingerprint, exe_path, command):
+        self.root.mkdir(parents=True, exist_ok=True)
+        entry = self.root / fingerprint
+        if self.lookup(fingerprint) is not None:
+            return
+        shutil.rmtree(entry, ignore_errors=True)  # Corrupt or partial entry
+        staging = self.root / f".{fingerprint}.{os.getpid()}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir()
+        try:
+            shutil.copy2(exe_path, staging / "screenshot.exe")
+            (staging / "meta.json").write_text(json.dumps({
+                "exe_sha256": file_hash(staging / "screenshot.exe"),
+                "command": command,
+                "stored_at": datetime.now().isoformat(timespec="seconds"),
+            }, indent=2), encoding="utf-8")
+            os.rename(staging, entry)
+        except OSError:
+            # Another build stored the same fingerprint first
+            shutil.rmtree(staging, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used builds beyond max_entries or max_bytes."""
+        entries = []
+        for entry in self.root.iterdir():
+            if not entry.is_dir() or entry.name.startswith("."):
+                continue
+            try:
+                size = sum(f.stat().st_size for f in entry.iterdir())
+                entries.append((entry.stat().st_mtime, size, entry))
+            except OSError:
+                continue
+        entries.sort(reverse=True)
+        kept, total = 0, 0
+        for _, size, entry in entries:
+            if kept < self.max_entries and total + size <= self.max_bytes:
+                kept += 1
+                total += size
+            else:
+                shutil.rmtree(entry, ignore_errors=True)
+
+def install(exe_file, release_exe, link=False):
+    """
+    Put exe_file at release_exe with one atomic rename, and remove anything
+    else in ./release. With link, hardlink instead of copying when possible.
+    """
+    release_dir = release_exe.parent
+    release_dir.mkdir(exist_ok=True)
+    # Stage next to ./release (same filesystem), then swap it in with one rename
+    staged = release_dir.parent / f".screenshot.exe.{os.getpid()}.tmp"
+    if staged.exists():
+        staged.unlink()
+    linked = False
+    if link:
+        try:
+            os.link(exe_file, staged)
+            linked = True
+        except OSError:
+            pass  # Different filesystem, or no hardlinks there
+    if not linked:
+        shutil.copy2(exe_file, staged)
+    os.replace(staged, release_exe)
+    # ./release holds only the executable
+    for item in release_dir.iterdir():
+        if item == release_exe:
+            continue
+        if item.is_dir():
+            shutil.rmtree(item)
+        else:
+            item.unlink()
+
+BUILD_HISTORY_LIMIT = 1000  # Runs kept in ./.cache/build-history.jsonl
+
+class BuildReport:
+    """What one build run did and how long each step took."""
+
+    def __init__(self, project_root):
+        self.reports_dir = project_root / "reports"
+        self.history_file = project_root / ".cache" / "build-history.jsonl"
+        self.timestamp = datetime.now().strftime("%Y-%m-%d-%H-%M-%S-%f")
+        self.start = time.monotonic()
+        self.data = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "fingerprint": None,
+            "result": None,
+            "steps": {},
+        }
+
+    @contextmanager
+    def step(self, name):
+        """Time a build step (and trace it)."""
+        step_start = time.monotonic()
+        try:
+            with span(name):
+                yield
+        finally:
+            self.data["steps"][name] = round(time.monotonic() - step_start, 3)
+
+    def save_output(self, stdout, stderr):
+        """Keep the compiler's output as a gzipped sidecar of the report."""
+        self.reports_dir.mkdir(exist_ok=True)
+        output_file = self.reports_dir / f"{self.timestamp}_build_output.txt.gz"
+        with gzip.open(output_file, "wt", encoding="utf-8") as f:
+            f.write(stdout or "")
+            if stderr:
+                f.write("\n--- stderr ---\n")
+                f.write(stderr)
+        self.data["compiler_output"] = output_file.name
+
+    def finish(self, exit_code, exe_path=None):
+        """Write the report and add it to the build history."""
+        self.data["exit_code"] = exit_code
+        if exit_code != 0:
+            self.data["result"] = "failed"
+        elif exe_path is not None and exe_path.is_file():
+            self.data["artifact_bytes"] = exe_path.stat().st_size
+        self.data["total_seconds"] = round(time.monotonic() - self.start, 3)
+        try:
+            self.reports_dir.mkdir(exist_ok=True)
+            (self.reports_dir / f"{self.timestamp}_build.json").write_text(
+                json.dumps(self.data, indent=2), encoding="utf-8")
+            self.history_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.history_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(self.data) + "\n")
+            lines = self.history_file.read_text(encoding="utf-8").splitlines(keepends=True)
+            if len(lines) > BUILD_HISTORY_LIMIT:
+                tmp = self.history_file.with_name(self.history_file.name + ".tmp")
+                tmp.write_text("".join(lines[-BUILD_HISTORY_LIMIT:]), encoding="utf-8")
+                os.replace(tmp, self.history_file)
+        except OSError as e:
+            print(f"Warning: could not write build report: {e}", file=sys.stderr)
+
+def read_stamp(stamp_file):
+    try:
+        return json.loads(stamp_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def is_up_to_date(stamp, fingerprint, exe_path):
+    """True if the release executable was built from exactly these sources and is unmodified."""
+    if stamp.get("fingerprint") != fingerprint or not exe_path.is_file():
+        return False
+    return stamp.get("exe_sha256") == file_hash(exe_path)
+
+def write_stamp(stamp_file, fingerprint, exe_path, command):
+    stamp_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = stamp_file.with_name(stamp_file.name + ".tmp")
+    tmp.write_text(json.dumps({
+        "fingerprint": fingerprint,
+        "exe_sha256": file_hash(exe_path),
+        "command": command,
+        "built_at": datetime.now().isoformat(timespec="seconds"),
+    }, indent=2), encoding="utf-8")
+    os.replace(tmp, stamp_file)
+
 def main():
     # Get project root directory
     script_dir = Path(__file__).parent
     project_root = script_dir.parent
+    report = BuildReport(project_root)
+    exit_code = build(project_root, report)
+    report.finish(exit_code, project_root / "release" / "screenshot.exe")
+    return exit_code
+
+def build(project_root, report):
     code_dir = project_root / "code"
     release_dir = project_root / "release"
+    release_exe = release_dir / "screenshot.exe"
+    stamp_file = project_root / ".cache" / "release-stamp.json"
+    command = build_command()
+    report.data["command"] = command
 
     print(f"Building from: {code_dir}")
     print(f"Output to: {release_dir}")
 
-    # Step 1: Clean existing artifacts in ./release/
-    if release_dir.exists():
-        print(f"Cleaning existing release directory...")
-        shutil.rmtree(release_dir)
+    # Step 1: Skip the build when ./release already matches the sources
+    force = os.environ.get("BUILD_FORCE") == "1"
+    with report.step("fingerprint"):
+        fingerprint = source_fingerprint(code_dir, command)
+        up_to_date = not force and is_up_to_date(read_stamp(stamp_file), fingerprint, release_exe)
+    report.data["fingerprint"] = fingerprint
+    if up_to_date:
+        report.data["result"] = "up-to-date"
+        print(f"Up to date (fingerprint {fingerprint[:12]}), skipping build")
+        return 0
 
-    # Create release directory
-    release_dir.mkdir(exist_ok=True)
+    # Restore a build of the same sources from the artifact cache
+    cache = ArtifactCache.from_env()
+    if cache is not None and not force:
+        with report.step("cache restore"):
+            cached_exe = cache.lookup(fingerprint)
+            if cached_exe is not None:
+                install(cached_exe, release_exe, link=True)
+                write_stamp(stamp_file, fingerprint, release_exe, command)
+        if cached_exe is not None:
+            report.data["result"] = "cache-hit"
+            print(f"Restored from build cache: {cached_exe}")
+            return 0
+    report.data["result"] = "miss"
 
     # Step 2: Build the project with AOT compilation
     print("Building AOT-compiled executable...")
 
-    build_result = subprocess.run(
-        ["dotnet", "publish", "-c", "Release", "-r", "win-x64", "--self-contained"],
-        cwd=code_dir,
-        capture_output=True,
-        text=True
-    )
+    with report.step("publish"):
+        build_result = subprocess.run(
+            command,
+            cwd=code_dir,
+            capture_output=True,
+            text=True
+        )
+    report.save_output(build_result.stdout, build_result.stderr)
 
     if build_result.returncode != 0:
         print("Build failed:", file=sys.stderr)
@@ -51,23 +368,25 @@ def main():
 
     print("Build successful")
 
-    # Step 3: Copy only necessary runtime files to ./release/
-    # The AOT-compiled executable is in code/bin/Release/net8.0-windows/win-x64/publish/
-    publish_dir = code_dir / "bin" / "Release" / "net8.0-windows" / "win-x64" / "publish"
-
-    if not publish_dir.exists():
-        print(f"Error: Publish directory not found at {publish_dir}", file=sys.stderr)
-        return 1
-
-    # Copy only the executable (AOT compilation produces a single exe with no dependencies)
-    exe_file = publish_dir / "screenshot.exe"
+    # Step 3: Copy only the executable (AOT compilation produces a single exe
+    # with no dependencies) to ./release/
+    exe_file = code_dir / os.environ.get("BUILD_ARTIFACT", str(DEFAULT_ARTIFACT))
 
     if not exe_file.exists():
         print(f"Error: Executable not found at {exe_file}", file=sys.stderr)
         return 1
 
     print(f"Copying {exe_file.name} to release/")
-    shutil.copy2(exe_file, release_dir / "screenshot.exe")
+    with report.step("copy"):
+        install(exe_file, release_exe)
+        write_stamp(stamp_file, fingerprint, release_exe, command)
+
+    if cache is not None:
+        with report.step("cache store"):
+            try:
+                cache.store(fingerprint, release_exe, command)
+            except OSError as e:
+                print(f"Warning: could not store build in cache {cache.root}: {e}", file=sys.stderr)
 
     print(f"\nBuild complete! Executable: {release_dir / 'screenshot.exe'}")
     return 0
@@ -89,7 +89,8 @@ def main():
         # Get paths
         project_root = Path(__file__).parent.parent.parent
         screenshot_exe = project_root / "release" / "screenshot.exe"
-        tmp_dir = project_root / "tmp"
+        # test.py gives each test its own scratch directory; fall back to ./tmp
+        tmp_dir = Path(os.environ.get('TEST_TMP_DIR', project_root / "tmp"))
 
         # Ensure tmp directory exists
         tmp_dir.mkdir(exist_ok=True)
@@ -25,7 +25,8 @@ def main():
     timestamp = datetime.now().strftime("%Y-%m-%d-%H-%M-%S-%f")
 
     # Ensure tmp directory exists
-    tmp_dir = Path('./tmp')
+    # test.py gives each test its own scratch directory; fall back to ./tmp
+    tmp_dir = Path(os.environ.get('TEST_TMP_DIR', './tmp'))
     tmp_dir.mkdir(exist_ok=True)
 
     # Define test output files
@@ -0,0 +1,197 @@
+#!/usr/bin/env uvrun
+# /// script
+# requires-python = ">=3.8"
+# dependencies = []
+# ///
+
+"""
+On-disk cache of agent responses for read-only prompts.
+
+Checks like req-check_readmes, the req-fix_* validators and ORDER_TESTS give
+the same answer as long as nothing they read has changed, so re-running them on
+unchanged inputs only costs time and money. The cache is off unless
+PROMPT_AGENTIC_CACHE=1; a prompt is then cached only if it declares itself
+read-only with get_ai_response_text(..., read_only=True, cache_inputs=[...]).
+
+The key is a SHA-256 over:
+  - the prompt text, the agent and the model
+  - every file the prompt references as @path, recursively (a referenced
+    prompt's own @paths count too)
+  - every file under cache_inputs (paths or directories, for what the prompt
+    reads without an @ reference, e.g. ./reqs/)
+
+A response is stored only when the inputs hash the same after the agent ran as
+before, so a run that edited what it read is never replayed.
+
+Entries live in ./.cache/agent-responses (kept across cleanup.py), expire after
+PROMPT_AGENTIC_CACHE_TTL seconds (default 7 days), and the oldest are evicted
+beyond PROMPT_AGENTIC_CACHE_MAX_MB (default 50).
+
+Usage:
+    agent_cache.py                 # Show cached responses
+    agent_cache.py --clear         # Remove them all
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+from pathlib import Path
+
+# Fix Windows console encoding for Unicode characters
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+CACHE_DIR = Path('./.cache/agent-responses')
+
+DEFAULT_TTL = 7 * 24 * 3600   # Seconds
+DEFAULT_MAX_MB = 50
+
+# @the-system/prompts/PHILOSOPHY.md, @./reqs/flow.md
+REFERENCE_PATTERN = re.compile(r'@(\.?/?[\w.-]+(?:/[\w.-]+)*)')
+
+
+def enabled():
+    return os.environ.get('PROMPT_AGENTIC_CACHE') == '1'
+
+
+def _ttl():
+    return float(os.environ.get('PROMPT_AGENTIC_CACHE_TTL', DEFAULT_TTL))
+
+
+def _max_bytes():
+    return int(float(os.environ.get('PROMPT_AGENTIC_CACHE_MAX_MB', DEFAULT_MAX_MB)) * 1024 * 1024)
+
+
+def referenced_paths(text):
+    """Files referenced as @path in text, following references inside them."""
+    found = set()
+    pending = [text]
+    while pending:
+        for match in REFERENCE_PATTERN.finditer(pending.pop()):
+            path = Path(match.group(1).rstrip('.'))
+            if path in found or not path.is_file():
+                continue
+            found.add(path)
+            try:
+                pending.append(path.read_text(encoding='utf-8', errors='replace'))
+            except OSError:
+                continue
+    return found
+
+
+def _input_files(cache_inputs):
+    files = set()
+    for entry in cache_inputs or ():
+        path = Path(entry)
+        if path.is_dir():
+            files.update(p for p in path.rglob('*') if p.is_file())
+        else:
+            files.add(path)  # Missing files are part of the key too
+    return files
+
+
+def _file_digest(path):
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def cache_key(prompt_text, agent, model, cache_inputs=None):
+    """Key for a prompt and the current content of everything it reads."""
+    files = referenced_paths(prompt_text) | _input_files(cache_inputs)
+    inputs = sorted((path.as_posix(), _file_digest(path)) for path in files)
+    payload = json.dumps({'prompt': prompt_text, 'agent': agent, 'model': model, 'inputs': inputs})
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def lookup(key):
+    """Cached response for key, or None if missing or expired."""
+    entry = CACHE_DIR / f"{key}.json"
+    try:
+        data = json.loads(entry.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    if time.time() - data.get('stored_at', 0) > _ttl():
+        try:
+            entry.unlink()
+        except OSError:
+            pass
+        return None
+    return data.get('response')
+
+
+def store(key, response, report_type):
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    entry = CACHE_DIR / f"{key}.json"
+    tmp = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps({
+        'report_type': report_type,
+        'stored_at': time.time(),
+        'response': response,
+    }), encoding='utf-8')
+    os.replace(tmp, entry)
+    evict()
+
+
+def _entries():
+    entries = []
+    for entry in CACHE_DIR.glob('*.json'):
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry))
+    return sorted(entries, reverse=True)
+
+
+def evict():
+    """Drop expired entries, then the oldest ones beyond the size limit."""
+    now = time.time()
+    ttl, max_bytes = _ttl(), _max_bytes()
+    total = 0
+    for mtime, size, entry in _entries():
+        total += size
+        if now - mtime > ttl or total > max_bytes:
+            try:
+                entry.unlink()
+            except OSError:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show or clear cached agent responses')
+    parser.add_argument('--clear', action='store_true', help='Remove all cached responses')
+    args = parser.parse_args()
+
+    # Change to project root (two levels up from this script)
+    os.chdir(Path(__file__).resolve().parent.parent.parent)
+
+    entries = _entries()
+    if args.clear:
+        for _, _, entry in entries:
+            entry.unlink()
+        print(f"Removed {len(entries)} cached responses")
+        return
+
+    if not entries:
+        print("No cached agent responses")
+        return
+    print(f"{'Report type':<32} {'Age':>8} {'Size':>8}")
+    print("-" * 50)
+    now = time.time()
+    for mtime, size, entry in entries:
+        try:
+            report_type = json.loads(entry.read_text(encoding='utf-8')).get('report_type', '?')
+        except (OSError, ValueError):
+            report_type = '?'
+        print(f"{report_type:<32} {(now - mtime) / 3600:>7.1f}h {size / 1024:>7.1f}K")
+
+
+if __name__ == '__main__':
+    main()
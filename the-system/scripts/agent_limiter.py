@@ -0,0 +1,259 @@
+#!/usr/bin/env uvrun
+# /// script
+# requires-python = ">=3.8"
+# dependencies = []
+# ///
+
+"""
+Rate limits for agent CLI calls, shared by every process on this machine.
+
+reqs-gen.py, software-construction.py and the speculative fix workers all start
+agent CLIs; when they launch more than the backend accepts, calls fail with
+rate-limit errors. Every call first takes a lease from
+./.cache/agent-limiter.sqlite, which enforces two budgets:
+  - requests per minute     a token bucket refilled at PROMPT_AGENTIC_RPM
+                            (default 60), holding at most PROMPT_AGENTIC_BURST
+                            tokens (default 5)
+  - calls in flight         at most PROMPT_AGENTIC_MAX_INFLIGHT (default 8)
+                            unexpired leases across all processes
+
+A lease is reclaimed as soon as the process holding it has exited, and expires
+after the call's timeout plus a margin in any case, so a crashed process
+doesn't hold a slot. A call whose CLI reports a transient error (rate
+limit, overload, connection reset) in its error fields or stderr is retried
+with exponential backoff and full jitter, and pauses the shared bucket so every
+process backs off together.
+
+Usage:
+    agent_limiter.py               # Show the bucket and current leases
+"""
+
+import os
+import re
+import sys
+import time
+import uuid
+import random
+import sqlite3
+import asyncio
+import contextlib
+from pathlib import Path
+
+# Fix Windows console encoding for Unicode characters
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+LIMITER_DB = Path('./.cache/agent-limiter.sqlite')
+
+DEFAULT_RPM = 60
+DEFAULT_BURST = 5
+DEFAULT_MAX_INFLIGHT = 8
+LEASE_MARGIN = 60         # Seconds a lease outlives its call's timeout
+POLL_SECONDS = 1.0        # Longest wait between attempts to take a lease
+
+DEFAULT_RETRIES = 4       # PROMPT_AGENTIC_RETRIES
+BACKOFF_BASE = 5.0        # Seconds before the first retry (upper bound; jittered)
+BACKOFF_CAP = 300.0
+
+# Output that means the backend refused the call for now, not the prompt
+TRANSIENT_ERRORS = (
+    'rate limit', 'rate_limit', 'ratelimit', 'too many requests', 'overloaded',
+    'service unavailable', 'temporarily unavailable', 'econnreset',
+    'connection reset', 'etimedout',
+)
+# An HTTP status, not any number: stderr also carries line numbers and PIDs
+TRANSIENT_STATUS = re.compile(r'(?:status(?:[ _]code)?|http(?:/[\d.]+)?|api error)[\s=:"]+(429|503|529)\b',
+                              re.IGNORECASE)
+
+
+def _env_number(name, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def _connect():
+    LIMITER_DB.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(LIMITER_DB), timeout=30, isolation_level=None)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bucket (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            paused_until REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS leases (
+            lease_id TEXT PRIMARY KEY,
+            pid INTEGER NOT NULL,
+            taken_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    return conn
+
+
+def _pid_alive(pid):
+    """False if no process with this PID is running on this machine."""
+    if sys.platform == 'win32':
+        import ctypes
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return ctypes.get_last_error() != 87  # ERROR_INVALID_PARAMETER: no such process
+        try:
+            exit_code = ctypes.c_ulong()
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+            return exit_code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Someone else's process
+    return True
+
+
+def try_acquire(lease_seconds):
+    """
+    Take a lease if both budgets allow it. Returns (lease_id, 0) or
+    (None, seconds to wait before trying again).
+    """
+    rpm = _env_number('PROMPT_AGENTIC_RPM', DEFAULT_RPM)
+    burst = max(1.0, _env_number('PROMPT_AGENTIC_BURST', DEFAULT_BURST))
+    max_inflight = _env_number('PROMPT_AGENTIC_MAX_INFLIGHT', DEFAULT_MAX_INFLIGHT)
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM leases WHERE expires_at < ?", (now,))
+        # Leases of processes that died without releasing them
+        for lease_id, pid in conn.execute("SELECT lease_id, pid FROM leases").fetchall():
+            if pid != os.getpid() and not _pid_alive(pid):
+                conn.execute("DELETE FROM leases WHERE lease_id = ?", (lease_id,))
+        row = conn.execute("SELECT tokens, updated_at, paused_until FROM bucket WHERE id = 1").fetchone()
+        tokens, updated_at, paused_until = row if row else (burst, now, 0.0)
+        # No refill while paused after a throttle
+        tokens = min(burst, tokens + max(0.0, now - max(updated_at, paused_until)) * rpm / 60.0)
+
+        wait = 0.0
+        if paused_until > now:
+            wait = paused_until - now
+        elif conn.execute("SELECT COUNT(*) FROM leases").fetchone()[0] >= max_inflight:
+            wait = POLL_SECONDS
+        elif tokens < 1.0:
+            wait = (1.0 - tokens) * 60.0 / rpm if rpm > 0 else POLL_SECONDS
+
+        lease_id = None
+        if wait == 0.0:
+            tokens -= 1.0
+            lease_id = uuid.uuid4().hex
+            conn.execute("INSERT INTO leases VALUES (?, ?, ?, ?)",
+                         (lease_id, os.getpid(), now, now + lease_seconds))
+        conn.execute("INSERT OR REPLACE INTO bucket VALUES (1, ?, ?, ?)", (tokens, now, paused_until))
+        conn.execute("COMMIT")
+        return lease_id, wait
+    finally:
+        conn.close()
+
+
+def release(lease_id):
+    conn = _connect()
+    try:
+        conn.execute("DELETE FROM leases WHERE lease_id = ?", (lease_id,))
+    finally:
+        conn.close()
+
+
+def pause(seconds):
+    """Stop every process from starting calls for the next seconds (after a throttle)."""
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT paused_until FROM bucket WHERE id = 1").fetchone()
+        paused_until = row[0] if row else 0.0
+        conn.execute("INSERT OR REPLACE INTO bucket VALUES (1, ?, ?, ?)",
+                     (0.0, now, max(paused_until, now + seconds)))
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+@contextlib.asynccontextmanager
+async def lease(timeout):
+    """
+    Wait for a lease for one agent call that may run for timeout seconds.
+
+    The database calls run in the default executor: under contention they wait
+    on the sqlite lock, which must not stall the event loop's other work.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        lease_id, wait = await loop.run_in_executor(None, try_acquire, timeout + LEASE_MARGIN)
+        if lease_id is not None:
+            break
+        await asyncio.sleep(min(wait, POLL_SECONDS) * random.uniform(0.8, 1.2))
+    try:
+        yield
+    finally:
+        # Shielded so a cancelled call still gives its lease back
+        await asyncio.shield(loop.run_in_executor(None, release, lease_id))
+
+
+async def pause_async(seconds):
+    """pause(), off the event loop."""
+    await asyncio.get_running_loop().run_in_executor(None, pause, seconds)
+
+
+def is_transient(text):
+    """
+    True if a failed call's error output looks like a throttle or network error
+    worth retrying. Pass only what the CLI reported about the failure (its
+    error fields and stderr), never the assistant's text.
+    """
+    lowered = text.lower()
+    return any(needle in lowered for needle in TRANSIENT_ERRORS) or bool(TRANSIENT_STATUS.search(text))
+
+
+def retries():
+    return int(_env_number('PROMPT_AGENTIC_RETRIES', DEFAULT_RETRIES))
+
+
+def backoff(attempt):
+    """Seconds to wait before retry number attempt (0-based): full jitter."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def main():
+    # Change to project root (two levels up from this script)
+    os.chdir(Path(__file__).resolve().parent.parent.parent)
+
+    now = time.time()
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT tokens, updated_at, paused_until FROM bucket WHERE id = 1").fetchone()
+        leases = conn.execute(
+            "SELECT pid, taken_at, expires_at FROM leases WHERE expires_at >= ? ORDER BY taken_at", (now,)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    rpm = _env_number('PROMPT_AGENTIC_RPM', DEFAULT_RPM)
+    max_inflight = _env_number('PROMPT_AGENTIC_MAX_INFLIGHT', DEFAULT_MAX_INFLIGHT)
+    print(f"Budget: {rpm:g} calls/minute, {max_inflight:g} in flight")
+    if row:
+        tokens, updated_at, paused_until = row
+        print(f"Tokens: {tokens:.2f} (as of {now - updated_at:.0f}s ago)")
+        if paused_until > now:
+            print(f"Paused for another {paused_until - now:.0f}s after a throttle")
+    print(f"Leases: {len(leases)}")
+    for pid, taken_at, expires_at in leases:
+        print(f"  pid {pid:<8} running {now - taken_at:>6.0f}s, expires in {expires_at - now:.0f}s")
+
+
+if __name__ == '__main__':
+    main()
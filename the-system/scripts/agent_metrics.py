@@ -0,0 +1,200 @@
+#!/usr/bin/env uvrun
+# /// script
+# requires-python = ">=3.8"
+# dependencies = []
+# ///
+
+"""
+Persistent usage and latency record of every agent CLI call.
+
+Kept in ./.cache/agent-metrics.sqlite, which survives cleanup.py. Each call
+stores its report_type, agent, model, run, wall time, exit status and what the
+agent itself reports: claude's duration_ms, duration_api_ms, num_turns, token
+usage and total_cost_usd; codex's token usage.
+
+Recent latencies also set the hedge threshold for get_ai_response(hedge=True).
+
+A run is one top-level script invocation (reqs-gen.py, software-construction.py):
+the first process to import this module names it in PROMPT_AGENTIC_RUN_ID, and
+the processes it starts inherit the name.
+
+Usage:
+    agent_metrics.py                # p50/p95/p99 latency and cost per report_type
+    agent_metrics.py --runs         # ... per run
+    agent_metrics.py --run RUN_ID   # ... per report_type within one run
+"""
+
+import os
+import sys
+import sqlite3
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+sys.path.insert(0, str(Path(__file__).parent))
+from run_history import percentile
+
+# Fix Windows console encoding for Unicode characters
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+METRICS_DB = Path('./.cache/agent-metrics.sqlite')
+
+RUN_ID = os.environ.setdefault(
+    'PROMPT_AGENTIC_RUN_ID',
+    f"{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}_{Path(sys.argv[0]).stem or 'python'}",
+)
+
+USAGE_FIELDS = ('input_tokens', 'output_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens')
+
+HEDGE_PERCENTILE = 95     # A call slower than this share of recent ones gets hedged
+HEDGE_MIN_CALLS = 5       # Successful calls needed before hedging a report_type
+HEDGE_WINDOW = 50         # Most recent calls considered
+
+
+def _connect():
+    METRICS_DB.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(METRICS_DB), timeout=30)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS agent_calls (
+            run_id TEXT NOT NULL,
+            report_type TEXT NOT NULL,
+            agent TEXT NOT NULL,
+            model TEXT NOT NULL,
+            started_at REAL NOT NULL,
+            wall_seconds REAL NOT NULL,
+            status TEXT NOT NULL,
+            exit_code INTEGER,
+            duration_ms REAL,
+            duration_api_ms REAL,
+            num_turns INTEGER,
+            input_tokens INTEGER,
+            output_tokens INTEGER,
+            cache_creation_input_tokens INTEGER,
+            cache_read_input_tokens INTEGER,
+            cost_usd REAL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_agent_calls_type ON agent_calls (report_type, started_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_agent_calls_run ON agent_calls (run_id)")
+    return conn
+
+
+def payload_fields(payload):
+    """The columns a claude result payload (or codex usage totals) fills in."""
+    payload = payload or {}
+    usage = payload.get('usage') or {}
+    fields = {name: usage.get(name) for name in USAGE_FIELDS}
+    fields.update({
+        'duration_ms': payload.get('duration_ms'),
+        'duration_api_ms': payload.get('duration_api_ms'),
+        'num_turns': payload.get('num_turns'),
+        'cost_usd': payload.get('total_cost_usd', payload.get('cost_usd')),
+    })
+    return fields
+
+
+def record_call(report_type, agent, model, started_at, wall_seconds, status, exit_code=None, payload=None):
+    """Append one agent call. status is ok, error, stopped, timeout or cancelled."""
+    row = {
+        'run_id': RUN_ID,
+        'report_type': report_type,
+        'agent': agent,
+        'model': model,
+        'started_at': started_at,
+        'wall_seconds': wall_seconds,
+        'status': status,
+        'exit_code': exit_code,
+    }
+    row.update(payload_fields(payload))
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute(
+                f"INSERT INTO agent_calls ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                list(row.values()),
+            )
+    finally:
+        conn.close()
+
+
+def hedge_threshold(report_type, agent):
+    """
+    Seconds after which a call of report_type on agent is slower than usual:
+    the p95 of its recent successful calls. None (don't hedge) without enough
+    history, or when PROMPT_AGENTIC_HEDGE=0.
+    """
+    if os.environ.get('PROMPT_AGENTIC_HEDGE') == '0' or not METRICS_DB.exists():
+        return None
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT wall_seconds FROM agent_calls WHERE report_type = ? AND agent = ? "
+            "AND status IN ('ok', 'stopped') ORDER BY started_at DESC LIMIT ?",
+            (report_type, agent, HEDGE_WINDOW),
+        ).fetchall()
+    finally:
+        conn.close()
+    if len(rows) < HEDGE_MIN_CALLS:
+        return None
+    return percentile([row[0] for row in rows], HEDGE_PERCENTILE)
+
+
+def summarize(group_by, run_id=None):
+    """[(group, calls, failures, p50, p95, p99, cost, tokens)], most total time first."""
+    where, params = ("WHERE run_id = ?", (run_id,)) if run_id else ("", ())
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            f"SELECT {group_by}, wall_seconds, status, cost_usd, input_tokens, output_tokens "
+            f"FROM agent_calls {where}", params
+        ).fetchall()
+    finally:
+        conn.close()
+
+    groups = {}
+    for key, wall, status, cost, tokens_in, tokens_out in rows:
+        group = groups.setdefault(key, {'wall': [], 'failures': 0, 'cost': 0.0, 'tokens': 0})
+        group['wall'].append(wall)
+        group['failures'] += status not in ('ok', 'stopped')
+        group['cost'] += cost or 0.0
+        group['tokens'] += (tokens_in or 0) + (tokens_out or 0)
+
+    summary = [
+        (key, len(g['wall']), g['failures'], percentile(g['wall'], 50), percentile(g['wall'], 95),
+         percentile(g['wall'], 99), g['cost'], g['tokens'])
+        for key, g in groups.items()
+    ]
+    summary.sort(key=lambda row: sum(groups[row[0]]['wall']), reverse=True)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Agent call latency and cost')
+    parser.add_argument('--runs', action='store_true', help='Group by run instead of report_type')
+    parser.add_argument('--run', metavar='RUN_ID', help='Only calls from this run')
+    args = parser.parse_args()
+
+    # Change to project root (two levels up from this script)
+    os.chdir(Path(__file__).resolve().parent.parent.parent)
+
+    if not METRICS_DB.exists():
+        print(f"No agent calls recorded yet ({METRICS_DB})")
+        return 0
+
+    label = 'run' if args.runs else 'report_type'
+    summary = summarize('run_id' if args.runs else 'report_type', args.run)
+    width = max([len(label)] + [len(str(row[0])) for row in summary])
+    print(f"{label:<{width}} {'calls':>6} {'failed':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'cost':>9} {'tokens':>10}")
+    total_cost = 0.0
+    for key, calls, failures, p50, p95, p99, cost, tokens in summary:
+        total_cost += cost
+        print(f"{key:<{width}} {calls:>6} {failures:>6} {p50:>7.1f}s {p95:>7.1f}s {p99:>7.1f}s "
+              f"${cost:>8.2f} {tokens:>10}")
+    print(f"\nTotal cost: ${total_cost:.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,487 @@
+#!/usr/bin/env uvrun
+# /// script
+# requires-python = ">=3.8"
+# dependencies = []
+# ///
+
+"""
+Fork-server test launcher for test.py (POSIX only).
+
+Launching every test with `uv run --script <test>` pays for uv resolving the
+inline script metadata, a fresh interpreter, and importing heavy dependencies,
+once per test. With `test.py --fork-server`, tests are grouped by identical
+`# /// script` metadata and each group gets one warm server:
+
+  - uv resolves the group's environment once, running a generated script that
+    carries the same metadata block and calls serve()
+  - the server pre-imports the installed and standard-library modules the
+    group's tests import (never a test or any other module from the project,
+    whose import side effects belong to each test run), then listens on a
+    unix socket
+  - for each test, the client sends argv/cwd/env plus its stdio pipes
+    (SCM_RIGHTS); the server forks, and the child starts a new session,
+    takes over the pipes, and runs the test file as __main__
+  - the server reaps the child and sends back its exit code and rusage
+
+Resource limits (sandbox.py) are applied in the forked child, as they would be
+between fork and exec for a launched test.
+
+The child is its own process group leader, so timeouts and cleanup work the
+same as for directly launched tests (supervisor.supervise).
+
+Where fork() or unix sockets are unavailable (Windows), test.py --fork-server
+exits with an error.
+"""
+
+import os
+import re
+import sys
+import ast
+import json
+import array
+import signal
+import socket
+import asyncio
+import hashlib
+import tempfile
+import importlib.util
+import selectors
+from pathlib import Path
+
+import sandbox
+import supervisor
+
+SERVERS_DIR = Path('./tmp/fork-servers')
+READY_TIMEOUT = 600  # Seconds for uv to resolve an environment and the server to preload
+
+# Inline script metadata block (PEP 723 reference regex)
+METADATA_REGEX = re.compile(r'(?m)^# /// (?P<type>[a-zA-Z0-9-]+)$\s(?P<content>(^#(| .*)$\s)+)^# ///$')
+
+FD_COUNT = 3  # stdin, stdout, stderr
+
+
+def available():
+    """True if tests can be forked from a server on this platform."""
+    return hasattr(os, 'fork') and hasattr(socket, 'AF_UNIX') and sys.platform != 'win32'
+
+
+def script_metadata(test_file):
+    """The raw `# /// script` block of a test file, or '' if it has none."""
+    text = Path(test_file).read_text(encoding='utf-8', errors='replace')
+    for match in METADATA_REGEX.finditer(text):
+        if match.group('type') == 'script':
+            return match.group(0).strip()
+    return ''
+
+
+def imported_modules(test_file):
+    """Top-level modules a test imports at module level, excluding its local helper modules."""
+    try:
+        tree = ast.parse(Path(test_file).read_text(encoding='utf-8', errors='replace'))
+    except SyntaxError:
+        return set()
+    local = {path.stem for path in Path(test_file).parent.glob('*.py')}
+    modules = set()
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            modules.add(node.module.split('.')[0])
+    return {name for name in modules if name not in local and name != '__future__'}
+
+
+def _send_fds(sock, data, fds):
+    sock.sendmsg([data], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))])
+
+
+def _recv_request(conn):
+    """Read one newline-terminated JSON request and the file descriptors sent with it."""
+    data = b''
+    fds = []
+    while not data.endswith(b'\n'):
+        chunk, ancdata, _, _ = conn.recvmsg(65536, socket.CMSG_SPACE(FD_COUNT * array.array('i').itemsize))
+        if not chunk:
+            break
+        data += chunk
+        for level, kind, payload in ancdata:
+            if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                received = array.array('i')
+                received.frombytes(payload[:len(payload) - (len(payload) % received.itemsize)])
+                fds.extend(received)
+    return json.loads(data.decode('utf-8')) if data.strip() else None, fds
+
+
+# ---------------------------------------------------------------------------
+# Server side (runs inside the group's uv environment)
+# ---------------------------------------------------------------------------
+
+def _exit_code(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _run_child(request, fds, close_fds):
+    """In the forked child: become a fresh session running the test as __main__. Never returns."""
+    code = 1
+    try:
+        os.setsid()
+        signal.set_wakeup_fd(-1)
+        for sig in (signal.SIGCHLD, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, signal.SIG_DFL)
+        for fd in close_fds:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        if request.get('sandbox'):
+            if request['sandbox']['cgroup']:
+                sandbox.join_cgroup(request['sandbox']['cgroup'])
+            sandbox.apply_rlimits(request['sandbox']['rlimits'])
+
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+        test_file = os.path.abspath(request['argv'][0])
+        sys.argv = list(request['argv'])
+        sys.path[0] = os.path.dirname(test_file)
+
+        import runpy
+        try:
+            runpy.run_path(test_file, run_name='__main__')
+            code = 0
+        except SystemExit as e:
+            if e.code is None:
+                code = 0
+            elif isinstance(e.code, int):
+                code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+            code = 1
+        import atexit
+        atexit._run_exitfuncs()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+        os._exit(code)
+
+
+def _is_project_module(name):
+    """True if name would be imported from the project (cwd) rather than the environment, or isn't found."""
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return True
+    if spec is None:
+        return True
+    origin = spec.origin or next(iter(spec.submodule_search_locations or ()), None)
+    if not origin or origin in ('built-in', 'frozen'):
+        return False
+    path = Path(origin).resolve()
+    if 'site-packages' in path.parts:
+        return False
+    try:
+        path.relative_to(Path.cwd().resolve())
+    except ValueError:
+        return False
+    return True
+
+
+def serve(socket_path, preload=()):
+    """Pre-import environment modules, then fork a child per request on socket_path until terminated."""
+    for name in preload:
+        if _is_project_module(name):
+            continue  # A test or project module runs its import side effects in each test
+        try:
+            __import__(name)
+        except BaseException as e:
+            print(f"[fork-server] preload {name} failed: {e}", file=sys.stderr, flush=True)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(64)
+
+    # SIGCHLD wakes the select loop through a self-pipe; no polling
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_r, False)
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ, 'accept')
+    selector.register(wakeup_r, selectors.EVENT_READ, 'reap')
+    children = {}  # pid -> client connection
+
+    print("ready", flush=True)
+    while True:
+        for key, _ in selector.select():
+            if key.data == 'accept':
+                conn, _ = listener.accept()
+                try:
+                    request, fds = _recv_request(conn)
+                except (OSError, ValueError):
+                    conn.close()
+                    continue
+                if request is None or len(fds) != FD_COUNT:
+                    for fd in fds:
+                        os.close(fd)
+                    conn.close()
+                    continue
+                sys.stdout.flush()
+                sys.stderr.flush()
+                close_fds = [listener.fileno(), wakeup_r, wakeup_w, selector.fileno() if hasattr(selector, 'fileno') else -1]
+                close_fds += [c.fileno() for c in children.values()] + [conn.fileno()]
+                pid = os.fork()
+                if pid == 0:
+                    _run_child(request, fds, close_fds)
+                for fd in fds:
+                    os.close(fd)
+                children[pid] = conn
+                try:
+                    conn.sendall(json.dumps({'pid': pid}).encode('utf-8') + b'\n')
+                except OSError:
+                    pass
+            else:
+                try:
+                    while os.read(wakeup_r, 512):
+                        pass
+                except BlockingIOError:
+                    pass
+                while children:
+                    reap_pid = -1
+                    if hasattr(os, 'waitid'):
+                        # Kill what an exited test left in its group before reaping
+                        # it: its zombie keeps the group id from being reused
+                        try:
+                            exited = os.waitid(os.P_ALL, 0, os.WEXITED | os.WNOHANG | os.WNOWAIT)
+                        except ChildProcessError:
+                            break
+                        if exited is None:
+                            break
+                        reap_pid = exited.si_pid
+                        supervisor.kill_process_tree(reap_pid)
+                    try:
+                        pid, status, rusage = os.wait4(reap_pid, os.WNOHANG)
+                    except ChildProcessError:
+                        break
+                    if pid == 0:
+                        break
+                    conn = children.pop(pid, None)
+                    if conn is None:
+                        continue
+                    message = {
+                        'exit': _exit_code(status),
+                        'rusage': supervisor.rusage_dict(rusage),
+                    }
+                    try:
+                        conn.sendall(json.dumps(message).encode('utf-8') + b'\n')
+                    except OSError:
+                        pass
+                    conn.close()
+
+
+def serve_main():
+    """Entry point of a generated server script: serve(<socket path>, <modules...>)."""
+    serve(sys.argv[1], sys.argv[2:])
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# Client side (test.py)
+# ---------------------------------------------------------------------------
+
+class ForkedChild:
+    """A test forked by a server, with the interface supervisor.supervise() expects."""
+
+    def __init__(self, pid, reader, writer, pipes_closed):
+        self.pid = pid
+        self.returncode = None
+        self.rusage = None
+        self.pipes_closed = pipes_closed
+        self._writer = writer
+        self._exited = asyncio.ensure_future(self._read_exit(reader))
+
+    async def _read_exit(self, reader):
+        try:
+            line = await reader.readline()
+            message = json.loads(line.decode('utf-8')) if line else {}
+        except (OSError, ValueError):
+            message = {}
+        finally:
+            self._writer.close()
+        # Lost connection means the server died; report it as a failure
+        self.returncode = message.get('exit', -1)
+        self.rusage = message.get('rusage')
+        return self.returncode, self.rusage
+
+    async def wait(self):
+        return await asyncio.shield(self._exited)
+
+    def kill_tree(self, sig=None):
+        """
+        Signal the test's process group while it runs. The server kills what
+        the test left behind before reaping it, so once the exit is reported
+        (and the pid may be reused) this does nothing.
+        """
+        if self._exited.done():
+            return
+        try:
+            os.killpg(self.pid, sig if sig is not None else signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def close(self):
+        pass
+
+
+class ForkServer:
+    """Client handle for one warm server process."""
+
+    def __init__(self, metadata, process, socket_path):
+        self.metadata = metadata
+        self.process = process
+        self.socket_path = socket_path
+
+    def spawner(self, test_file):
+        """A spawn function for supervisor.supervise() that forks test_file from this server."""
+        async def spawn(cmd_list, on_line, env=None, cwd=None, sandbox=None):
+            return await self.fork(test_file, on_line, env=env, cwd=cwd, sandbox=sandbox)
+        return spawn
+
+    async def fork(self, test_file, on_line, env=None, cwd=None, sandbox=None):
+        request = {
+            'argv': [str(test_file)],
+            'cwd': str(cwd or os.getcwd()),
+            'env': dict(env if env is not None else os.environ),
+            'sandbox': sandbox.request() if sandbox is not None else None,
+        }
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        stdin = os.open(os.devnull, os.O_RDONLY)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+            _send_fds(sock, json.dumps(request).encode('utf-8') + b'\n', [stdin, stdout_w, stderr_w])
+        except OSError:
+            sock.close()
+            for fd in (stdout_r, stderr_r):
+                os.close(fd)
+            raise
+        finally:
+            for fd in (stdin, stdout_w, stderr_w):
+                os.close(fd)
+
+        pipes_closed = [
+            await supervisor.watch_pipe(open(stdout_r, 'rb', buffering=0), on_line),
+            await supervisor.watch_pipe(open(stderr_r, 'rb', buffering=0), on_line, "[stderr] "),
+        ]
+        reader, writer = await asyncio.open_unix_connection(sock=sock)
+        line = await reader.readline()
+        if not line:
+            writer.close()
+            raise OSError("fork server closed the connection")
+        pid = json.loads(line.decode('utf-8'))['pid']
+        return ForkedChild(pid, reader, writer, pipes_closed)
+
+    async def stop(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGTERM)
+        except (ProcessLookupError, PermissionError):
+            pass
+        try:
+            await asyncio.wait_for(self.process.wait(), 5)
+        except asyncio.TimeoutError:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
+
+
+def _server_script(metadata, key):
+    """Write the script uv runs for a group: the group's metadata block plus a call to serve_main()."""
+    SERVERS_DIR.mkdir(parents=True, exist_ok=True)
+    path = (SERVERS_DIR / f"env-{key}.py").resolve()
+    scripts_dir = str(Path(__file__).resolve().parent)
+    path.write_text(
+        (metadata + "\n\n" if metadata else "")
+        + "import sys\n"
+        + f"sys.path.insert(0, {scripts_dir!r})\n"
+        + "import fork_server\n"
+        + "sys.exit(fork_server.serve_main())\n",
+        encoding='utf-8'
+    )
+    return path
+
+
+async def start_server(metadata, modules, uv_exe):
+    """Resolve one environment with uv and start its server. Returns a ForkServer."""
+    key = hashlib.sha256(metadata.encode('utf-8')).hexdigest()[:12]
+    script = _server_script(metadata, key)
+    # Unix socket paths are limited to ~100 bytes, so keep them short
+    socket_path = os.path.join(tempfile.mkdtemp(prefix='fork-server-'), f"{key}.sock")
+    log = open(SERVERS_DIR / f"env-{key}.log", 'w', encoding='utf-8')
+    try:
+        process = await asyncio.create_subprocess_exec(
+            uv_exe, 'run', '--script', str(script), socket_path, *sorted(modules),
+            stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=log,
+            start_new_session=True
+        )
+    finally:
+        log.close()
+    server = ForkServer(metadata, process, socket_path)
+    try:
+        line = await asyncio.wait_for(process.stdout.readline(), READY_TIMEOUT)
+    except asyncio.TimeoutError:
+        line = b''
+    if line.strip() != b'ready':
+        await server.stop()
+        raise RuntimeError(f"fork server did not start (see {SERVERS_DIR / f'env-{key}.log'})")
+    return server
+
+
+async def start_servers(test_files, uv_exe):
+    """
+    Start one server per distinct script metadata among test_files.
+
+    Returns {test_file: ForkServer}; tests whose server failed to start are
+    left out and should be launched with uv as usual.
+    """
+    groups = {}
+    for test_file in test_files:
+        groups.setdefault(script_metadata(test_file), []).append(test_file)
+
+    async def start(metadata, files):
+        modules = set().union(*(imported_modules(f) for f in files))
+        try:
+            return await start_server(metadata, modules, uv_exe)
+        except (OSError, RuntimeError) as e:
+            print(f"⚠ Fork server for {len(files)} test(s) unavailable, launching them with uv: {e}", flush=True)
+            return None
+
+    servers = await asyncio.gather(*(start(metadata, files) for metadata, files in groups.items()))
+    assignment = {}
+    for server, files in zip(servers, groups.values()):
+        if server is not None:
+            for test_file in files:
+                assignment[test_file] = server
+    print(f"Started {sum(1 for s in servers if s)} fork server(s) for {len(groups)} environment(s)", flush=True)
+    return assignment
+
+
+async def stop_servers(servers):
+    await asyncio.gather(*(server.stop() for server in set(servers)))
@@ -0,0 +1,159 @@
+#!/usr/bin/env uvrun
+# /// script
+# requires-python = ">=3.8"
+# dependencies = []
+# ///
+
+"""
+Live run metrics in Prometheus text format.
+
+Metrics are always recorded in-process (cheap counters); software-construction.py
+and reqs-gen.py only expose them when started with --metrics-port, which serves
+http://127.0.0.1:<port>/metrics for a local collector to scrape.
+
+Usage from Python:
+    import metrics
+    metrics.AGENT_IN_FLIGHT.inc(report_type="failing_test")
+    metrics.serve(9464)
+
+pipeline_last_progress_timestamp_seconds moves whenever an agent call, index
+build or test run finishes; alert on time() minus it to catch stalled runs.
+"""
+
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_lock = threading.Lock()
+_metrics = []
+_collectors = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Metric:
+    """A counter, gauge or summary (sum + count) with optional labels."""
+
+    def __init__(self, name, help_text, kind):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self._values = {}
+        with _lock:
+            _metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(sorted(labels.items()))
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with _lock:
+            self._values[self._key(labels)] = value
+
+    def observe(self, value, **labels):
+        """Add one observation to a summary."""
+        key = self._key(labels)
+        with _lock:
+            total, count = self._values.get(key, (0.0, 0))
+            self._values[key] = (total + value, count + 1)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in key)
+            label_text = "{" + label_text + "}" if label_text else ""
+            if self.kind == "summary":
+                total, count = value
+                lines.append(f"{self.name}_sum{label_text} {total}")
+                lines.append(f"{self.name}_count{label_text} {count}")
+            else:
+                lines.append(f"{self.name}{label_text} {value}")
+        return "\n".join(lines)
+
+
+def counter(name, help_text):
+    return Metric(name, help_text, "counter")
+
+
+def gauge(name, help_text):
+    return Metric(name, help_text, "gauge")
+
+
+def summary(name, help_text):
+    return Metric(name, help_text, "summary")
+
+
+AGENT_IN_FLIGHT = gauge("pipeline_agent_calls_in_flight", "Agent CLI calls currently running")
+AGENT_SECONDS = summary("pipeline_agent_call_seconds", "Agent CLI call latency by report_type")
+AGENT_FAILURES = counter("pipeline_agent_call_failures_total", "Agent CLI calls that failed or timed out")
+AGENT_HEDGES = counter("pipeline_agent_call_hedges_total", "Agent calls that started a second backend after the hedge threshold")
+AGENT_RETRIES = counter("pipeline_agent_call_retries_total", "Agent CLI calls retried after a throttle or network error")
+TESTS = gauge("pipeline_tests", "Test files in ./tests/passing and ./tests/failing")
+TEST_ATTEMPTS = counter("pipeline_test_attempts_total", "Test runs per test file")
+FLAKY_RESULTS = counter("pipeline_flaky_test_results_total", "Tests that failed and then passed on a re-run")
+INDEX_BUILD_SECONDS = summary("pipeline_index_build_seconds", "Requirements index build duration")
+QUEUE_DEPTH = gauge("pipeline_queue_depth", "Work items waiting on dependencies or a resource slot")
+LAST_PROGRESS = gauge("pipeline_last_progress_timestamp_seconds", "Unix time of the last finished agent call, index build or test run")
+STARTED = gauge("pipeline_start_timestamp_seconds", "Unix time the run started")
+
+
+def progress():
+    """Mark that the run made progress just now."""
+    LAST_PROGRESS.set(time.time())
+
+
+def add_collector(fn):
+    """Register fn() to refresh gauges right before every scrape."""
+    with _lock:
+        _collectors.append(fn)
+
+
+def render():
+    """All metrics in Prometheus text exposition format."""
+    with _lock:
+        collectors = list(_collectors)
+    for fn in collectors:
+        try:
+            fn()
+        except Exception:
+            pass
+    return "\n".join(metric.render() for metric in list(_metrics)) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep scrapes out of the run's console output
+
+
+def serve(port, host='127.0.0.1'):
+    """Serve /metrics on a daemon thread. Returns the server."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='metrics', daemon=True)
+    thread.start()
+    STARTED.set(time.time())
+    progress()
+    print(f"Metrics: http://{host}:{server.server_address[1]}/metrics", flush=True)
+    return server
@@ -0,0 +1,131 @@
+#!/usr/bin/env uvrun
+# /// script
+# requires-python = ">=3.8"
+# dependencies = []
+# ///
+
+"""
+Asyncio work scheduler for the construction pipeline.
+
+Work items are asyncio tasks with explicit dependencies. An item may claim a
+named resource ("agent", "build", "test", "index") whose concurrency is capped
+by a per-resource limit, so independent items overlap and the run time is set
+by the critical path rather than the sum of all steps.
+
+Usage from Python:
+    async def main():
+        pipeline = Pipeline({"agent": 2, "build": 1, "test": 1, "index": 1})
+        build = pipeline.submit("build", run_build, resource="build")
+        pipeline.submit("test A", run_test, "A", deps=[build], resource="test")
+        await pipeline.wait()
+
+Plain functions run on a worker thread; coroutine functions are awaited on the
+event loop. A failed dependency fails every item that depends on it.
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import inspect
+import sys
+
+import tracing
+
+DEFAULT_LIMITS = {"agent": 1, "build": 1, "test": 1, "index": 1}
+
+
+def _traced_call(name, fn, args, kwargs):
+    with tracing.span(name, cat="work_item"):
+        return fn(*args, **kwargs)
+
+
+class Pipeline:
+    """Schedules work items as asyncio tasks with dependencies and resource limits."""
+
+    def __init__(self, limits=None):
+        self.limits = dict(DEFAULT_LIMITS)
+        self.limits.update(limits or {})
+        self._semaphores = {}
+        self._tasks = []
+        self._started = set()
+        self._pending = 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(4, sum(self.limits.values()) + 2),
+            thread_name_prefix="pipeline",
+        )
+
+    @property
+    def pending(self):
+        """Number of submitted items still waiting on dependencies or a resource slot."""
+        return self._pending
+
+    def _semaphore(self, resource):
+        if resource not in self._semaphores:
+            self._semaphores[resource] = asyncio.Semaphore(self.limits.get(resource, 1))
+        return self._semaphores[resource]
+
+    def slot(self, resource):
+        """
+        The semaphore capping resource, for work that takes several slots from
+        inside one item (async with pipeline.slot("agent"): ...).
+        """
+        return self._semaphore(resource)
+
+    def submit(self, name, fn, *args, deps=(), resource=None, **kwargs):
+        """
+        Schedule fn(*args, **kwargs) once every task in deps has finished.
+
+        Must be called from inside the running event loop. Returns the asyncio
+        task, which can be awaited for the item's result or passed as a
+        dependency of later items.
+        """
+        task = asyncio.get_running_loop().create_task(
+            self._run_item(name, fn, args, kwargs, list(deps), resource)
+        )
+        self._tasks = [t for t in self._tasks if not t.done()]
+        self._tasks.append(task)
+        return task
+
+    async def _run_item(self, name, fn, args, kwargs, deps, resource):
+        self._pending += 1
+        try:
+            if deps:
+                await asyncio.gather(*deps)
+            if resource is None:
+                return await self._start(name, fn, args, kwargs)
+            async with self._semaphore(resource):
+                return await self._start(name, fn, args, kwargs)
+        except Exception as e:
+            print(f"✗ Work item failed: {name}: {e}", file=sys.stderr, flush=True)
+            raise
+        finally:
+            if asyncio.current_task() not in self._started:
+                self._pending -= 1
+            self._started.discard(asyncio.current_task())
+
+    async def _start(self, name, fn, args, kwargs):
+        self._started.add(asyncio.current_task())
+        self._pending -= 1
+        if inspect.iscoroutinefunction(fn):
+            with tracing.async_span(name, cat="work_item"):
+                return await fn(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(_traced_call, name, fn, args, kwargs))
+
+    def cancel_pending(self, tasks):
+        """Cancel the given items that are still waiting; items already running are left alone."""
+        for task in tasks:
+            if not task.done() and task not in self._started:
+                task.cancel()
+
+    async def wait(self):
+        """Wait for every submitted item (including ones submitted while waiting)."""
+        while True:
+            outstanding = [t for t in self._tasks if not t.done()]
+            if not outstanding:
+                break
+            await asyncio.gather(*outstanding)
+        self._tasks = [t for t in self._tasks if not t.done()]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -15,17 +15,32 @@ Usage:
 Or from Python:
     import prompt_agentic_coder
     result = prompt_agentic_coder.get_ai_response_text(prompt_text, report_type="my_task")
+    result = await prompt_agentic_coder.get_ai_response(prompt_text, report_type="my_task")
+
+At most PROMPT_AGENTIC_MAX_CONCURRENCY (default 8) agent CLIs run at once per process.
 """
 
 import os
 import sys
 import json
-import subprocess
+import time
+import sqlite3
+import asyncio
 import argparse
 import threading
+import contextlib
+import collections
 from pathlib import Path
 from datetime import datetime
 
+sys.path.insert(0, str(Path(__file__).parent))
+import tracing
+import metrics
+import agent_cache
+import agent_limiter
+import agent_metrics
+import supervisor
+
 # Fix Windows console encoding for Unicode characters
 if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
@@ -33,9 +48,34 @@ if sys.stdout.encoding != 'utf-8':
 
 SUPPORTED_AGENTS = {"codex", "claude"}
 
+DEFAULT_MAX_CONCURRENCY = 8  # Agent CLIs running at once (PROMPT_AGENTIC_MAX_CONCURRENCY)
+STREAM_STDERR_TAIL_BYTES = 64 * 1024  # stderr kept from a streamed call
+
+
+def _add_codex_event(totals, event):
+    """
+    Collect what codex reports across events: the session's thread_id
+    (thread.started), error messages (error, turn.failed) and the token usage
+    of each turn (turn.completed).
+    """
+    if event.get("type") == "thread.started" and event.get("thread_id"):
+        totals["session_id"] = event["thread_id"]
+    if event.get("type") == "error":
+        totals.setdefault("errors", []).append(str(event.get("message", "")))
+    if event.get("type") == "turn.failed":
+        totals.setdefault("errors", []).append(str((event.get("error") or {}).get("message", "")))
+    if event.get("type") != "turn.completed":
+        return
+    usage = totals.setdefault("usage", {})
+    for name, value in (event.get("usage") or {}).items():
+        if isinstance(value, (int, float)):
+            usage[name] = usage.get(name, 0) + value
+
 
 def _process_codex_output(raw_stdout):
+    """Returns (final agent message, {"usage": token totals, "session_id": thread id})."""
     final_agent_message = None
+    payload = {}
 
     for line in raw_stdout.splitlines():
         stripped = line.strip()
@@ -47,48 +87,423 @@ def _process_codex_output(raw_stdout):
                 item = event.get("item", {})
                 if item.get("type") == "agent_message":
                     final_agent_message = item.get("text", "")
+            _add_codex_event(payload, event)
         except json.JSONDecodeError:
             continue
 
     if final_agent_message is None:
         final_agent_message = raw_stdout.strip()
 
-    return final_agent_message
+    return final_agent_message, payload
 
 
 def _process_claude_output(raw_stdout):
+    """Returns (result text, the whole JSON payload (incl. session_id) or None)."""
     stripped = raw_stdout.strip()
 
     if not stripped:
-        return ""
+        return "", None
 
     try:
         payload = json.loads(stripped)
     except json.JSONDecodeError:
-        return stripped
+        return stripped, None
+    if not isinstance(payload, dict):
+        return stripped, None
 
     result_text = payload.get("result")
     if result_text is None:
         result_text = stripped
 
-    return result_text
+    return result_text, payload
 
 
-def get_ai_response_text(prompt_text: str, report_type: str = "prompt", timeout: int = 3600, agent: str = DEFAULT_AGENT) -> str:
+def _cli_error_text(payload, raw_stderr):
     """
-    Run a prompt by delegating to the configured agent CLI using JSON output.
+    What the CLI itself reported about a failed call: claude's error result
+    (is_error, api_error_status), codex's error events, and stderr. Never the
+    assistant's text, which may mention "429" or "rate limit" for other reasons.
+    """
+    payload = payload or {}
+    parts = list(payload.get("errors") or [])
+    if payload.get("is_error"):
+        parts.append(str(payload.get("api_error_status") or ""))
+        parts.append(str(payload.get("result") or ""))
+    parts.append(raw_stderr or "")
+    return "\n".join(part for part in parts if part)
 
-    Args:
-        prompt_text: The prompt to send to the agent
-        report_type: Type of report for filename (e.g., "failing_test", "write_reqs")
-        timeout: Maximum seconds to wait for the agent (default: 3600 = 1 hour)
-        agent: Name of the agent CLI to use ("claude" or "codex")
 
-    Returns:
-        str: The AI's response text (NOT a subprocess.CompletedProcess object)
+def _reserve_report_path(reports_dir, report_timestamp, report_type):
     """
-    if agent not in SUPPORTED_AGENTS:
-        raise ValueError(f"Unsupported agent '{agent}'. Supported agents: {', '.join(sorted(SUPPORTED_AGENTS))}")
+    A new ./reports/<timestamp>_<report_type>[.N].md, created empty so that
+    concurrent calls finishing in the same second (batches, other threads)
+    each get their own file.
+    """
+    attempt = 1
+    while True:
+        suffix = f".{attempt}" if attempt > 1 else ""
+        path = reports_dir / f"{report_timestamp}_{report_type}{suffix}.md"
+        try:
+            with open(path, 'x', encoding='utf-8'):
+                return path
+        except FileExistsError:
+            attempt += 1
+
+
+def _write_report(report_type, prompt_text, ai_response, raw_stdout):
+    """Write the prompt, response and raw agent output to ./reports/."""
+    reports_dir = Path("./reports")
+    reports_dir.mkdir(exist_ok=True)
+
+    report_timestamp = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    final_report_path = _reserve_report_path(reports_dir, report_timestamp, report_type)
+
+    # Format report with prompt and response
+    report_title = report_type.replace('_', ' ').title()
+
+    # Pretty-format the JSON output
+    try:
+        parsed_json = json.loads(raw_stdout)
+        pretty_json = json.dumps(parsed_json, indent=1)
+    except (json.JSONDecodeError, ValueError):
+        # If it's not valid JSON, just use the raw output
+        pretty_json = raw_stdout
+
+    structured_report = f"""# {report_title}
+**Timestamp:** {report_timestamp}
+
+---
+
+## Prompt
+
+{prompt_text}
+
+---
+
+## Response
+
+{ai_response}
+
+---
+
+## Raw JSON Output
+
+```json
+// FULL JSON FROM AI
+{pretty_json}
+// FULL JSON FROM AI END
+```
+"""
+
+    final_report_path.write_text(structured_report, encoding='utf-8')
+    print(f"DEBUG [prompt_agentic_coder]: Wrote report to {final_report_path}", file=sys.stderr, flush=True)
+
+
+class _ConcurrencyLimiter:
+    """
+    Caps agent CLI processes across the whole process: every event loop and
+    thread shares the same slots (asyncio.Semaphore is tied to one loop).
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters = collections.deque()  # (loop, future) in arrival order
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._active < self.limit and not self._waiters:
+                self._active += 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            future = waiter[1]
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            if future.done() and not future.cancelled():
+                # Granted, then cancelled before resuming: the slot is ours to pass on
+                self.release()
+            # Otherwise the handover is still queued; _grant sees the cancelled future and gives it back
+            raise
+
+    def release(self):
+        with self._lock:
+            if not self._waiters:
+                self._active -= 1
+                return
+            loop, future = self._waiters.popleft()
+        # The slot passes straight to the next waiter
+        try:
+            loop.call_soon_threadsafe(self._grant, future)
+        except RuntimeError:  # Its loop has closed
+            self.release()
+
+    def _grant(self, future):
+        if future.done():
+            self.release()
+        else:
+            future.set_result(None)
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+_limiter = _ConcurrencyLimiter(int(os.environ.get("PROMPT_AGENTIC_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)))
+
+
+async def _run_agent_cli(agent_cmd, prompt_text, timeout):
+    """Run the agent CLI; on timeout or cancellation, kill it and everything it started."""
+    process = await asyncio.create_subprocess_exec(
+        *agent_cmd,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        **supervisor.process_group_kwargs()
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(prompt_text.encode('utf-8')), timeout)
+    except BaseException:
+        if process.returncode is None:
+            supervisor.kill_process_tree(process.pid)
+        raise
+    return (
+        process.returncode,
+        stdout.decode('utf-8', errors='replace'),
+        stderr.decode('utf-8', errors='replace'),
+    )
+
+
+class _EventStream:
+    """
+    Follows the agent's JSON-lines events (claude stream-json, codex --json)
+    while they arrive, keeping only the response text in memory.
+    """
+
+    def __init__(self, agent, on_progress=None, stop_when=None):
+        self.agent = agent
+        self.on_progress = on_progress
+        self.stop_when = stop_when
+        self.texts = []      # Assistant text blocks so far
+        self.result = None   # Final answer, once the agent reports one
+        self.payload = {}    # claude's result event, or codex usage totals
+        self.stopped = False
+
+    def feed(self, line):
+        """Handle one output line; True once stop_when has seen its sentinel."""
+        try:
+            event = json.loads(line)
+        except ValueError:
+            return False
+        if not isinstance(event, dict):
+            return False
+        if self.on_progress is not None:
+            self.on_progress(event)
+        new_text = None
+        if self.agent == "codex":
+            item = event.get("item", {})
+            if event.get("type") == "item.completed" and item.get("type") == "agent_message":
+                new_text = item.get("text", "")
+                self.result = new_text
+            _add_codex_event(self.payload, event)
+        elif event.get("type") == "assistant":
+            blocks = event.get("message", {}).get("content", [])
+            new_text = "".join(b.get("text", "") for b in blocks if isinstance(b, dict) and b.get("type") == "text")
+        elif event.get("type") == "result":
+            self.result = event.get("result")
+            self.payload = event
+        if new_text:
+            self.texts.append(new_text)
+            if self.stop_when is not None and self.stop_when("\n".join(self.texts)):
+                self.stopped = True
+        return self.stopped
+
+    @property
+    def response(self):
+        if self.result is not None and not self.stopped:
+            return self.result
+        return "\n".join(self.texts)
+
+
+async def _read_tail(stream, limit):
+    """Read a stream to EOF, keeping only its last limit bytes."""
+    tail = b""
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            return tail
+        tail = (tail + chunk)[-limit:]
+
+
+async def _stream_agent_cli(agent_cmd, prompt_text, timeout, events, raw_path):
+    """
+    Run the agent CLI, feeding its stdout lines to events as they arrive and
+    appending them to raw_path instead of holding them in memory. Ends the CLI
+    early when events says stop. Returns (returncode, stderr tail).
+    """
+    process = await asyncio.create_subprocess_exec(
+        *agent_cmd,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        **supervisor.process_group_kwargs()
+    )
+    stderr_task = asyncio.ensure_future(_read_tail(process.stderr, STREAM_STDERR_TAIL_BYTES))
+
+    async def consume():
+        process.stdin.write(prompt_text.encode('utf-8'))
+        await process.stdin.drain()
+        process.stdin.close()
+        pending = b""
+        with open(raw_path, 'wb') as raw:
+            while True:
+                chunk = await process.stdout.read(65536)
+                if not chunk:
+                    break
+                raw.write(chunk)
+                pending += chunk
+                *lines, pending = pending.split(b"\n")
+                for line in lines:
+                    if events.feed(line.decode('utf-8', errors='replace')):
+                        return
+            if pending:
+                events.feed(pending.decode('utf-8', errors='replace'))
+
+    try:
+        await asyncio.wait_for(consume(), timeout)
+        if events.stopped:
+            supervisor.kill_process_tree(process.pid)
+        returncode = await process.wait()
+        stderr = await stderr_task
+    except BaseException:
+        if process.returncode is None:
+            supervisor.kill_process_tree(process.pid)
+        stderr_task.cancel()
+        raise
+    return returncode, stderr.decode('utf-8', errors='replace')
+
+
+async def _call_agent(agent, model, agent_cmd, prompt_text, timeout, report_type, streaming, raw_path,
+                      on_progress, stop_when):
+    """
+    One agent CLI run, with metrics, tracing and a row in agent_metrics.
+    Returns (returncode, raw_stdout, raw_stderr, final message, stopped early,
+    payload: claude's result JSON or codex's usage, session and errors).
+    """
+    metrics.AGENT_IN_FLIGHT.inc(report_type=report_type)
+    started_at = time.time()
+    started = time.monotonic()
+    status, returncode, payload = "error", None, None
+    try:
+        stopped = False
+        with tracing.async_span(f"agent {report_type}", cat="agent", agent=agent, report_type=report_type):
+            if streaming:
+                events = _EventStream(agent, on_progress, stop_when)
+                returncode, raw_stderr = await _stream_agent_cli(agent_cmd, prompt_text, timeout, events, raw_path)
+                raw_stdout = f"(streamed to {raw_path})"
+                stopped = events.stopped
+            else:
+                returncode, raw_stdout, raw_stderr = await _run_agent_cli(agent_cmd, prompt_text, timeout)
+
+        if streaming:
+            final_agent_message, payload = events.response, events.payload
+            if stopped:
+                print(f"DEBUG [prompt_agentic_coder]: {report_type}: decision reached, {agent} CLI ended early", file=sys.stderr, flush=True)
+        elif agent == "codex":
+            final_agent_message, payload = _process_codex_output(raw_stdout)
+        else:
+            final_agent_message, payload = _process_claude_output(raw_stdout)
+
+        status = "stopped" if stopped else "ok" if returncode == 0 else "error"
+        return returncode, raw_stdout, raw_stderr, final_agent_message, stopped, payload
+
+    except asyncio.TimeoutError:
+        status = "timeout"
+        metrics.AGENT_FAILURES.inc(report_type=report_type)
+        error_msg = f"Timeout: {agent} CLI did not complete within {timeout}s"
+        print(f"ERROR [prompt_agentic_coder]: {error_msg}", file=sys.stderr, flush=True)
+        raise TimeoutError(error_msg)
+    except asyncio.CancelledError:
+        status = "cancelled"
+        print(f"DEBUG [prompt_agentic_coder]: {report_type}: cancelled, {agent} CLI killed", file=sys.stderr, flush=True)
+        raise
+    except Exception as e:
+        metrics.AGENT_FAILURES.inc(report_type=report_type)
+        error_msg = f"Error running {agent} CLI: {e}"
+        print(f"ERROR [prompt_agentic_coder]: {error_msg}", file=sys.stderr, flush=True)
+        raise
+    finally:
+        wall_seconds = time.monotonic() - started
+        metrics.AGENT_IN_FLIGHT.dec(report_type=report_type)
+        metrics.AGENT_SECONDS.observe(wall_seconds, report_type=report_type)
+        metrics.progress()
+        # Shielded so a cancelled call is still recorded
+        await asyncio.shield(asyncio.get_running_loop().run_in_executor(
+            None, _record_call, report_type, agent, model, started_at, wall_seconds, status, returncode, payload
+        ))
+
+
+def _record_call(report_type, agent, model, started_at, wall_seconds, status, exit_code, payload):
+    """agent_metrics.record_call(), logging instead of raising if the database is unavailable."""
+    try:
+        agent_metrics.record_call(report_type, agent, model, started_at, wall_seconds, status,
+                                  exit_code=exit_code, payload=payload)
+    except sqlite3.Error as e:
+        print(f"DEBUG [prompt_agentic_coder]: could not record agent metrics: {e}", file=sys.stderr, flush=True)
+
+
+class AgentSession:
+    """
+    An agent conversation that later prompts can continue. Pass the same
+    AgentSession to each get_ai_response() call: the first call starts a new
+    session and records its ID; later calls with a resume_prompt resume it
+    (claude --resume, codex exec resume) and send only that prompt, since the
+    instructions and files the agent read are already in its context.
+    """
+
+    def __init__(self):
+        self.agent = None
+        self.session_id = None
+
+    def resumable(self, agent):
+        return self.session_id is not None and self.agent == agent
+
+
+def _model_override(hedging=False):
+    """
+    --model from the environment: PROMPT_AGENTIC_MODEL for the requested agent,
+    PROMPT_AGENTIC_HEDGE_MODEL for the other backend when hedging (a claude
+    model name means nothing to codex, and vice versa).
+    """
+    return os.environ.get("PROMPT_AGENTIC_HEDGE_MODEL" if hedging else "PROMPT_AGENTIC_MODEL")
+
+
+def _agent_model(agent, hedging=False):
+    """Model the agent runs with: the override, else the agent's default."""
+    return _model_override(hedging) or ("sonnet" if agent == "claude" else "default")
+
+
+async def _run_prompt(prompt_text, report_type, timeout, agent, streaming, on_progress, stop_when,
+                      session=None, resume_id=None, hedging=False):
+    """
+    Run the prompt on one agent CLI, retrying throttles; returns the response
+    text. With resume_id the prompt continues that agent session; the session
+    the call ends in is recorded in session. hedging marks a run on the other
+    backend for _hedged_prompt, which takes its model from PROMPT_AGENTIC_HEDGE_MODEL.
+    """
+    model_override = _model_override(hedging)
+    model = _agent_model(agent, hedging)
 
     # Create ./tmp directory if needed
     tmp_dir = Path("./tmp")
@@ -105,138 +520,348 @@ def get_ai_response_text(prompt_text: str, report_type: str = "prompt", timeout:
 
     # Build agent CLI command
     if agent == "codex":
+        # Use cdxcli.bat on Windows, codex on Linux
+        codex_cmd = "cdxcli.bat" if sys.platform == "win32" else "codex"
         agent_cmd = [
-            "cdxcli.bat", "exec", "-",
+            codex_cmd, "exec",
             "--json",
             "--skip-git-repo-check",
             "--dangerously-bypass-approvals-and-sandbox"
         ]
-        model_override = os.environ.get("PROMPT_AGENTIC_MODEL")
         if model_override:
             agent_cmd.extend(["--model", model_override])
+        if resume_id:
+            agent_cmd.extend(["resume", resume_id])
+        agent_cmd.append("-")
     else:  # agent == "claude"
         # Use clco.bat on Windows, claude on Linux
         claude_cmd = "clco.bat" if sys.platform == "win32" else "claude"
         agent_cmd = [
             claude_cmd,
             "-",
-            "--output-format=json",
+            "--output-format=stream-json" if streaming else "--output-format=json",
             "--dangerously-skip-permissions"
         ]
-        model_override = os.environ.get("PROMPT_AGENTIC_MODEL")
-        agent_cmd.extend(["--model", model_override if model_override else "sonnet"])
-
-    print(f"DEBUG [prompt_agentic_coder]: Launching {agent} CLI (timeout: {timeout}s)...", file=sys.stderr, flush=True)
-
-    # Launch agent CLI and capture output
-    try:
-        # Internal subprocess result - NOT what this function returns!
-        _subprocess_result = subprocess.run(
-            agent_cmd,
-            input=prompt_text,
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            errors='replace',
-            timeout=timeout
-        )
-
-        raw_stdout = _subprocess_result.stdout or ""
-        raw_stderr = _subprocess_result.stderr or ""
-
-        final_agent_message = None
-
-        if agent == "codex":
-            final_agent_message = _process_codex_output(raw_stdout)
-        else:
-            final_agent_message = _process_claude_output(raw_stdout)
+        if streaming:
+            agent_cmd.append("--verbose")  # stream-json requires it
+        agent_cmd.extend(["--model", model])
+        if resume_id:
+            agent_cmd.extend(["--resume", resume_id])
+
+    attempt = 0
+    while True:
+        # A slot in this process, then a lease within the machine-wide budgets
+        async with _limiter.slot(), agent_limiter.lease(timeout):
+            resuming = f", resuming session {resume_id}" if resume_id else ""
+            print(f"DEBUG [prompt_agentic_coder]: Launching {agent} CLI (timeout: {timeout}s{resuming})...", file=sys.stderr, flush=True)
+            returncode, raw_stdout, raw_stderr, final_agent_message, stopped, payload = await _call_agent(
+                agent, model, agent_cmd, prompt_text, timeout, report_type, streaming,
+                tmp_dir / f"{timestamp}_{report_type}_stream.jsonl", on_progress, stop_when,
+            )
 
         ai_response = final_agent_message or ""
 
         if raw_stderr:
             ai_response += f"\n\n--- stderr ---\n{raw_stderr}"
 
-        print(f"DEBUG [prompt_agentic_coder]: {agent} CLI completed (exit code: {_subprocess_result.returncode})", file=sys.stderr, flush=True)
+        print(f"DEBUG [prompt_agentic_coder]: {agent} CLI completed (exit code: {returncode})", file=sys.stderr, flush=True)
         print(f"DEBUG [prompt_agentic_coder]: Final message length: {len(ai_response)} chars", file=sys.stderr, flush=True)
 
         # Write structured report to ./reports/
-        reports_dir = Path("./reports")
-        reports_dir.mkdir(exist_ok=True)
+        _write_report(report_type, prompt_text, ai_response, raw_stdout)
+
+        if returncode == 0 or stopped:
+            session_id = (payload or {}).get("session_id")
+            if session is not None and session_id:
+                session.agent, session.session_id = agent, session_id
+            return ai_response
+
+        if attempt < agent_limiter.retries() and agent_limiter.is_transient(_cli_error_text(payload, raw_stderr)):
+            delay = agent_limiter.backoff(attempt)
+            attempt += 1
+            print(f"DEBUG [prompt_agentic_coder]: {report_type}: {agent} CLI throttled, "
+                  f"retry {attempt}/{agent_limiter.retries()} in {delay:.0f}s", file=sys.stderr, flush=True)
+            metrics.AGENT_RETRIES.inc(report_type=report_type)
+            await agent_limiter.pause_async(delay)
+            await asyncio.sleep(delay)
+            continue
 
-        report_timestamp = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
-        final_report_path = reports_dir / f"{report_timestamp}_{report_type}.md"
+        metrics.AGENT_FAILURES.inc(report_type=report_type)
+        error_msg = f"Error running {agent} CLI: {agent} CLI exited with {returncode}"
+        print(f"ERROR [prompt_agentic_coder]: {error_msg}", file=sys.stderr, flush=True)
+        raise RuntimeError(f"{agent} CLI exited with {returncode}")
 
-        # Format report with prompt and response
-        report_title = report_type.replace('_', ' ').title()
 
-        # Pretty-format the JSON output
+async def _hedged_prompt(prompt_text, report_type, timeout, agent, streaming, on_progress, stop_when):
+    """
+    Run the prompt on agent; if it is still running after its hedge threshold,
+    start it on the other agent too. The first successful response wins.
+    Returns (response, the agent that gave it).
+    """
+    def start(name):
+        return asyncio.ensure_future(
+            _run_prompt(prompt_text, report_type, timeout, name, streaming, on_progress, stop_when,
+                        hedging=name != agent)
+        )
+
+    primary = start(agent)
+    threshold = await asyncio.get_running_loop().run_in_executor(
+        None, agent_metrics.hedge_threshold, report_type, agent
+    )
+    if threshold is None:
+        return await primary, agent
+    done, _ = await asyncio.wait({primary}, timeout=threshold)
+    if done:
+        return primary.result(), agent
+
+    other = next(name for name in sorted(SUPPORTED_AGENTS) if name != agent)
+    print(f"DEBUG [prompt_agentic_coder]: {report_type}: no answer from {agent} after {threshold:.1f}s, "
+          f"hedging with {other}", file=sys.stderr, flush=True)
+    metrics.AGENT_HEDGES.inc(report_type=report_type)
+    tasks = [primary, start(other)]
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    winner = agent if task is primary else other
+                    print(f"DEBUG [prompt_agentic_coder]: {report_type}: {winner} answered first", file=sys.stderr, flush=True)
+                    return task.result(), winner
+        # Both failed: report the primary's error
+        raise primary.exception()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()  # Kills the losing agent CLI
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def get_ai_response(prompt_text: str, report_type: str = "prompt", timeout: int = 3600, agent: str = DEFAULT_AGENT,
+                          read_only: bool = False, cache_inputs=None, stream: bool = False,
+                          on_progress=None, stop_when=None, hedge: bool = False,
+                          session: AgentSession = None, resume_prompt: str = None) -> str:
+    """
+    Run a prompt by delegating to the configured agent CLI using JSON output.
+
+    At most PROMPT_AGENTIC_MAX_CONCURRENCY agent CLIs run at once in this
+    process; further calls wait for a slot, then for a lease within the
+    machine-wide budgets of agent_limiter. A call that fails with a throttle
+    or network error is retried with backoff. Cancelling the call kills the CLI.
+
+    Args:
+        prompt_text: The prompt to send to the agent
+        report_type: Type of report for filename (e.g., "failing_test", "write_reqs")
+        timeout: Maximum seconds to wait for the agent (default: 3600 = 1 hour)
+        agent: Name of the agent CLI to use ("claude" or "codex")
+        read_only: The prompt only reads files, so its response may be served
+            from agent_cache (when PROMPT_AGENTIC_CACHE=1) while nothing it reads has changed
+        cache_inputs: Paths or directories the prompt reads besides its @path
+            references (part of the cache key)
+        stream: Consume the agent's events as they arrive (stream-json for
+            claude) and write its raw output to ./tmp instead of memory;
+            implied by on_progress and stop_when
+        on_progress: Called with every event (a dict) as it arrives
+        stop_when: Called with the response text so far whenever it grows;
+            returning True ends the agent early with that text as the response
+        hedge: For read-only prompts: if the agent hasn't answered within its
+            recent p95 latency for this report_type, also start the other
+            agent; the first successful response wins and the other is killed
+        session: AgentSession to record this call's agent session in
+        resume_prompt: If session holds a session of this agent, resume it
+            with only this prompt; if resuming fails, prompt_text starts a
+            fresh session instead
+
+    Returns:
+        str: The AI's response text
+    """
+    if agent not in SUPPORTED_AGENTS:
+        raise ValueError(f"Unsupported agent '{agent}'. Supported agents: {', '.join(sorted(SUPPORTED_AGENTS))}")
+
+    model = _agent_model(agent)
+    streaming = stream or on_progress is not None or stop_when is not None
+
+    if session is not None and resume_prompt is not None and session.resumable(agent):
         try:
-            parsed_json = json.loads(raw_stdout)
-            pretty_json = json.dumps(parsed_json, indent=1)
-        except (json.JSONDecodeError, ValueError):
-            # If it's not valid JSON, just use the raw output
-            pretty_json = raw_stdout
+            return await _run_prompt(resume_prompt, report_type, timeout, agent, streaming, on_progress, stop_when,
+                                     session=session, resume_id=session.session_id)
+        except RuntimeError as e:
+            print(f"DEBUG [prompt_agentic_coder]: {report_type}: could not resume {agent} session "
+                  f"{session.session_id} ({e}), starting a fresh one", file=sys.stderr, flush=True)
+            session.session_id = None
+
+    cache_key = None
+    if read_only and session is None and agent_cache.enabled():
+        cache_key = agent_cache.cache_key(prompt_text, agent, model, cache_inputs)
+        cached = agent_cache.lookup(cache_key)
+        if cached is not None:
+            print(f"DEBUG [prompt_agentic_coder]: {report_type}: inputs unchanged, using cached response", file=sys.stderr, flush=True)
+            _write_report(report_type, prompt_text, cached, "(cached response, agent not run)")
+            return cached
+
+    answered_by = agent
+    if hedge and read_only and session is None:
+        ai_response, answered_by = await _hedged_prompt(prompt_text, report_type, timeout, agent, streaming,
+                                                        on_progress, stop_when)
+    else:
+        ai_response = await _run_prompt(prompt_text, report_type, timeout, agent, streaming, on_progress, stop_when,
+                                        session=session)
 
-        structured_report = f"""# {report_title}
-**Timestamp:** {report_timestamp}
+    # Only cache a run that left everything it read as it found it, under the
+    # agent and model that actually answered
+    if cache_key is not None and agent_cache.cache_key(prompt_text, agent, model, cache_inputs) == cache_key:
+        if answered_by != agent:
+            cache_key = agent_cache.cache_key(prompt_text, answered_by, _agent_model(answered_by, hedging=True),
+                                              cache_inputs)
+        agent_cache.store(cache_key, ai_response, report_type)
 
----
+    return ai_response
 
-## Prompt
 
-{prompt_text}
+def get_ai_response_text(prompt_text: str, report_type: str = "prompt", timeout: int = 3600, agent: str = DEFAULT_AGENT,
+                         read_only: bool = False, cache_inputs=None, stream: bool = False,
+                         on_progress=None, stop_when=None, hedge: bool = False,
+                         session: AgentSession = None, resume_prompt: str = None) -> str:
+    """
+    Synchronous get_ai_response(), for callers without an event loop (each
+    call runs its own loop; the concurrency limit still applies across threads).
 
----
+    Returns:
+        str: The AI's response text (NOT a subprocess.CompletedProcess object)
+    """
+    return asyncio.run(get_ai_response(
+        prompt_text, report_type=report_type, timeout=timeout, agent=agent,
+        read_only=read_only, cache_inputs=cache_inputs, stream=stream,
+        on_progress=on_progress, stop_when=stop_when, hedge=hedge,
+        session=session, resume_prompt=resume_prompt,
+    ))
 
-## Response
 
-{ai_response}
+class AgentResult:
+    """Outcome of one prompt in a batch: response, or error if the call failed."""
 
----
+    def __init__(self, index, report_type, response=None, error=None, seconds=0.0):
+        self.index = index
+        self.report_type = report_type
+        self.response = response
+        self.error = error
+        self.seconds = seconds
 
-## Raw JSON Output
+    @property
+    def ok(self):
+        return self.error is None
 
-```json
-// FULL JSON FROM AI
-{pretty_json}
-// FULL JSON FROM AI END
-```
-"""
 
-        final_report_path.write_text(structured_report, encoding='utf-8')
-        print(f"DEBUG [prompt_agentic_coder]: Wrote report to {final_report_path}", file=sys.stderr, flush=True)
+def _batch_item(item, report_type, options):
+    """(prompt_text, get_ai_response kwargs) for a batch entry: a prompt, or a dict of kwargs."""
+    if isinstance(item, str):
+        return item, dict(options, report_type=report_type)
+    kwargs = dict(options, report_type=report_type)
+    kwargs.update(item)
+    return kwargs.pop("prompt_text"), kwargs
 
-        if _subprocess_result.returncode != 0:
-            raise RuntimeError(f"{agent} CLI exited with {_subprocess_result.returncode}")
 
-        return ai_response  # Returns str, not subprocess result!
+def _write_batch_report(batch_name, results, total):
+    """
+    One report summarizing every prompt of a batch (each prompt also has its
+    own). results may cover fewer than total prompts if the batch was stopped.
+    """
+    reports_dir = Path("./reports")
+    reports_dir.mkdir(exist_ok=True)
+    report_timestamp = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    report_path = _reserve_report_path(reports_dir, report_timestamp, f"{batch_name}_batch")
+    failed = sum(not r.ok for r in results)
+    lines = [
+        f"# {batch_name.replace('_', ' ').title()} Batch",
+        f"**Timestamp:** {report_timestamp}",
+        f"**Prompts:** {total} ({failed} failed"
+        + (f", {total - len(results)} stopped before finishing)" if len(results) < total else ")"),
+        "",
+        "| # | Report type | Result | Seconds | Summary |",
+        "|---|-------------|--------|---------|---------|",
+    ]
+    for r in sorted(results, key=lambda r: r.index):
+        text = r.response if r.ok else r.error
+        summary = (text or "").strip().splitlines()[0][:100] if (text or "").strip() else ""
+        summary = summary.replace("|", "\\|")
+        lines.append(f"| {r.index} | {r.report_type} | {'ok' if r.ok else 'FAILED'} | {r.seconds:.1f} | {summary} |")
+    report_path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    print(f"DEBUG [prompt_agentic_coder]: Wrote batch report to {report_path}", file=sys.stderr, flush=True)
+
+
+async def iter_ai_responses(prompts, max_concurrency=None, report_type="prompt", batch_name="batch", **options):
+    """
+    Run a batch of prompts concurrently and yield an AgentResult for each as
+    it completes. A failed prompt yields a result with error set; the rest of
+    the batch keeps running. When the batch ends, one aggregated report is
+    written to ./reports/<timestamp>_<batch_name>_batch.md; if the consumer
+    stops early, the prompts still running are cancelled (killing their agent
+    CLIs) and the report covers those that finished.
+
+    Each entry of prompts is a prompt string or a dict of get_ai_response
+    arguments (prompt_text, report_type, ...); options apply to every entry.
+    At most max_concurrency prompts of the batch run at once (besides the
+    process-wide PROMPT_AGENTIC_MAX_CONCURRENCY).
+    """
+    semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
 
-    except subprocess.TimeoutExpired:
-        error_msg = f"Timeout: {agent} CLI did not complete within {timeout}s"
-        print(f"ERROR [prompt_agentic_coder]: {error_msg}", file=sys.stderr, flush=True)
-        raise TimeoutError(error_msg)
-    except Exception as e:
-        error_msg = f"Error running {agent} CLI: {e}"
-        print(f"ERROR [prompt_agentic_coder]: {error_msg}", file=sys.stderr, flush=True)
-        raise
+    async def run(index, item):
+        prompt_text, kwargs = _batch_item(item, report_type, options)
+        started = time.monotonic()
+        try:
+            if semaphore is None:
+                response = await get_ai_response(prompt_text, **kwargs)
+            else:
+                async with semaphore:
+                    response = await get_ai_response(prompt_text, **kwargs)
+            return AgentResult(index, kwargs["report_type"], response=response, seconds=time.monotonic() - started)
+        except Exception as e:
+            return AgentResult(index, kwargs["report_type"], error=str(e), seconds=time.monotonic() - started)
+
+    tasks = [asyncio.ensure_future(run(index, item)) for index, item in enumerate(prompts)]
+
+    # The report is written once every prompt has finished or been cancelled,
+    # from the tasks themselves: a consumer that breaks out of its loop may
+    # never close this generator (asyncio.run cancels the pending close)
+    unfinished = len(tasks)
+
+    def task_done(_):
+        nonlocal unfinished
+        unfinished -= 1
+        if unfinished == 0:
+            finished = [task.result() for task in tasks if not task.cancelled()]
+            _write_batch_report(batch_name, finished, len(tasks))
+
+    for task in tasks:
+        task.add_done_callback(task_done)
+    if not tasks:
+        _write_batch_report(batch_name, [], 0)
 
-def test_worker(task_name, prompt, expected_answer, results, agent):
-    """Worker thread for test mode"""
     try:
-        print(f"[TEST] {task_name}: Submitting prompt...", file=sys.stderr, flush=True)
-        result = get_ai_response_text(prompt, report_type=f"test_{task_name}", agent=agent)
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        # The consumer stopped early or was cancelled: don't leave agents running
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def get_ai_responses(prompts, max_concurrency=None, report_type="prompt", batch_name="batch", **options):
+    """iter_ai_responses(), collected into a list of AgentResult in input order."""
+    results = [result async for result in iter_ai_responses(
+        prompts, max_concurrency=max_concurrency, report_type=report_type, batch_name=batch_name, **options
+    )]
+    return sorted(results, key=lambda r: r.index)
+
+
+def get_ai_responses_text(prompts, max_concurrency=None, report_type="prompt", batch_name="batch", **options):
+    """Synchronous get_ai_responses(), for callers without an event loop."""
+    return asyncio.run(get_ai_responses(
+        prompts, max_concurrency=max_concurrency, report_type=report_type, batch_name=batch_name, **options
+    ))
 
-        # Check if expected answer is in the result
-        if str(expected_answer) in result:
-            print(f"[TEST] {task_name}: ✓ Got expected answer: {expected_answer}", file=sys.stderr, flush=True)
-            results[task_name] = True
-        else:
-            print(f"[TEST] {task_name}: ✗ Expected {expected_answer} not found in result", file=sys.stderr, flush=True)
-            print(f"[TEST] {task_name}: Result was: {result[:200]}...", file=sys.stderr, flush=True)
-            results[task_name] = False
-    except Exception as e:
-        print(f"[TEST] {task_name}: ✗ Error: {e}", file=sys.stderr, flush=True)
-        results[task_name] = False
 
 def run_test_mode(agent):
     """Run test mode with two concurrent prime number tasks"""
@@ -253,24 +878,28 @@ def run_test_mode(agent):
 
     print("[TEST] Starting test mode with 2 concurrent tasks...", file=sys.stderr, flush=True)
 
-    results = {}
-    threads = []
-
-    # Spawn worker threads (each will launch its own agent CLI process)
-    for task_name, config in test_tasks.items():
-        thread = threading.Thread(
-            target=test_worker,
-            args=(task_name, config["prompt"], config["expected"], results, agent),
-            daemon=False
-        )
-        thread.start()
-        threads.append(thread)
-
-    # Wait for all threads to complete
-    for thread in threads:
-        thread.join()
+    # Run the tasks as one batch (each launches its own agent CLI process)
+    prompts = [
+        {"prompt_text": config["prompt"], "report_type": f"test_{task_name}"}
+        for task_name, config in test_tasks.items()
+    ]
+    batch = get_ai_responses_text(prompts, batch_name="test", agent=agent)
 
     # Check results
+    results = {}
+    for (task_name, config), result in zip(test_tasks.items(), batch):
+        expected_answer = config["expected"]
+        if not result.ok:
+            print(f"[TEST] {task_name}: ✗ Error: {result.error}", file=sys.stderr, flush=True)
+            results[task_name] = False
+        elif str(expected_answer) in result.response:
+            print(f"[TEST] {task_name}: ✓ Got expected answer: {expected_answer}", file=sys.stderr, flush=True)
+            results[task_name] = True
+        else:
+            print(f"[TEST] {task_name}: ✗ Expected {expected_answer} not found in result", file=sys.stderr, flush=True)
+            print(f"[TEST] {task_name}: Result was: {result.response[:200]}...", file=sys.stderr, flush=True)
+            results[task_name] = False
+
     all_passed = all(results.values())
 
     if all_passed:
@@ -20,7 +20,7 @@ import hashlib
 import argparse
 from datetime import datetime
 from pathlib import Path
-import concurrent.futures
+import asyncio
 
 # Change to project root (two levels up from this script)
 script_dir = Path(__file__).parent
@@ -32,7 +32,24 @@ UV_EXE = str(project_root / 'the-system' / 'bin' / 'uv.exe')
 
 # Import the agentic coder wrapper (already in same Python environment)
 sys.path.insert(0, str(script_dir))
-from prompt_agentic_coder import get_ai_response_text
+from prompt_agentic_coder import get_ai_response_text, iter_ai_responses
+import tracing
+import metrics
+
+# What the README check and the req-fix_* validators read (agent_cache keys);
+# a fix prompt that edits ./reqs changes its inputs, so its response isn't cached
+README_INPUTS = ['README.md', 'readme']
+FIX_PROMPT_INPUTS = README_INPUTS + ['reqs', 'release']
+
+README_CHANGES_SENTINEL = "**README_CHANGES_REQUIRED: true**"
+
+def print_agent_progress(event):
+    """Show the agent's tool calls as they stream in."""
+    if event.get('type') != 'assistant':
+        return
+    for block in event.get('message', {}).get('content', []):
+        if isinstance(block, dict) and block.get('type') == 'tool_use':
+            print(f"   · {block.get('name')}", flush=True)
 
 def find_most_recent_report():
     """Find the most recent report file in ./reports/ directory."""
@@ -86,11 +103,16 @@ def run_check_readmes():
     print(f"   (Prompt: @the-system/prompts/req-check_readmes.md)")
 
     try:
-        response = get_ai_response_text(prompt, report_type="req-check_readmes")
+        # Streamed: the call ends as soon as the agent states changes are required.
+        # Hedged: a second backend starts if the first is slower than usual.
+        response = get_ai_response_text(prompt, report_type="req-check_readmes",
+                                        read_only=True, cache_inputs=README_INPUTS, hedge=True,
+                                        on_progress=print_agent_progress,
+                                        stop_when=lambda text: README_CHANGES_SENTINEL in text)
         print(f"← Command finished successfully\n")
 
         # Check if README changes are required
-        if "**README_CHANGES_REQUIRED: true**" in response:
+        if README_CHANGES_SENTINEL in response:
             prompt_user_to_continue()
 
     except Exception as e:
@@ -105,36 +127,6 @@ def find_fix_prompts():
     fix_prompts = sorted(prompts_dir.glob('req-fix_*.md'))
     return [str(p) for p in fix_prompts]
 
-def run_single_fix_prompt(prompt_path):
-    """Run a single fix prompt. Returns dict with results."""
-    prompt_name = Path(prompt_path).stem
-
-    print(f"  → Starting: {prompt_name}")
-
-    try:
-        prompt = f"Please follow these instructions: @{prompt_path}"
-        response = get_ai_response_text(prompt, report_type=prompt_name)
-
-        readme_changes_required = "**README_CHANGES_REQUIRED: true**" in response
-
-        print(f"  ← Finished: {prompt_name}")
-
-        return {
-            'prompt_path': prompt_path,
-            'prompt_name': prompt_name,
-            'readme_changes_required': readme_changes_required,
-            'success': True
-        }
-    except Exception as e:
-        print(f"  ✗ Failed: {prompt_name} - {e}")
-        return {
-            'prompt_path': prompt_path,
-            'prompt_name': prompt_name,
-            'readme_changes_required': False,
-            'success': False,
-            'error': str(e)
-        }
-
 def run_all_fix_prompts_in_parallel():
     """Run all req-fix_*.md prompts in parallel. Returns True if any require README changes."""
     fix_prompts = find_fix_prompts()
@@ -151,27 +143,32 @@ def run_all_fix_prompts_in_parallel():
         print(f"  - {p}")
     print("\nLaunching parallel execution...\n")
 
-    # Run all fix prompts in parallel using ThreadPoolExecutor
+    # Run all fix prompts as one batch (agent CLIs capped by PROMPT_AGENTIC_MAX_CONCURRENCY);
+    # a failed prompt doesn't stop the others, and a slow one is hedged on the
+    # other backend so it doesn't hold up the whole batch
     readme_changes_required = False
     failed_prompts = []
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=len(fix_prompts)) as executor:
-        # Submit all prompts
-        future_to_prompt = {
-            executor.submit(run_single_fix_prompt, prompt_path): prompt_path
-            for prompt_path in fix_prompts
-        }
-
-        # Collect results as they complete
-        for future in concurrent.futures.as_completed(future_to_prompt):
-            result = future.result()
-
-            if not result['success']:
-                failed_prompts.append(result['prompt_name'])
-
-            if result['readme_changes_required']:
+    prompts = [
+        {'prompt_text': f"Please follow these instructions: @{p}", 'report_type': Path(p).stem}
+        for p in fix_prompts
+    ]
+    for p in prompts:
+        print(f"  → Starting: {p['report_type']}")
+
+    async def run_all():
+        nonlocal readme_changes_required
+        async for result in iter_ai_responses(prompts, batch_name="req-fix",
+                                              read_only=True, cache_inputs=FIX_PROMPT_INPUTS, hedge=True):
+            if not result.ok:
+                print(f"  ✗ Failed: {result.report_type} - {result.error}")
+                failed_prompts.append(result.report_type)
+                continue
+            print(f"  ← Finished: {result.report_type}")
+            if README_CHANGES_SENTINEL in result.response:
                 readme_changes_required = True
 
+    asyncio.run(run_all())
+
     print()
 
     # Check for failures
@@ -214,7 +211,8 @@ def run_fix_unique_ids():
     cmd = [UV_EXE, 'run', '--script', './the-system/scripts/fix-unique-req-ids.py']
     print(f"→ Running command: {' '.join(cmd)}")
 
-    result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
+    with tracing.span("fix-unique-req-ids", cat="index"):
+        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
 
     print(f"← Command finished with exit code: {result.returncode}")
 
@@ -276,8 +274,13 @@ def main():
     parser = argparse.ArgumentParser(description='Generate requirements from README documentation')
     parser.add_argument('--skip-readme-check', action='store_true',
                        help='Skip the initial README quality check')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                       help='Serve live Prometheus metrics on http://127.0.0.1:PORT/metrics')
     args = parser.parse_args()
 
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+
     print("\n" + "=" * 60)
     print("REQUIREMENTS GENERATION")
     print("=" * 60)
@@ -285,6 +288,9 @@ def main():
     # Clean up old reports and tmp before starting
     run_cleanup()
 
+    # Trace the whole run (child processes append to the same file)
+    tracing.start_trace("reqs-gen")
+
     # Create necessary directories
     os.makedirs('./reqs', exist_ok=True)
     os.makedirs('./reports', exist_ok=True)
@@ -326,7 +332,8 @@ def main():
         run_fix_unique_ids()
 
         # Phase 2: Run all fix prompts IN PARALLEL
-        readme_changes_required = run_all_fix_prompts_in_parallel()
+        with tracing.span(f"fix prompts (iteration {iteration})", cat="work_item"):
+            readme_changes_required = run_all_fix_prompts_in_parallel()
 
         if readme_changes_required:
             prompt_user_to_continue()
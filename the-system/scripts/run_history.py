@@ -0,0 +1,240 @@
+#!/usr/bin/env uvrun
+# /// script
+# requires-python = ">=3.8"
+# dependencies = []
+# ///
+
+"""
+Persistent per-test run history (durations and outcomes).
+
+Kept in ./.cache/test-history.sqlite, which survives cleanup.py. Tests are keyed
+by file name, so history follows a test between ./tests/failing and ./tests/passing.
+
+Used to derive per-test timeouts: p99 of recent passing durations times a
+multiplier, clamped to a floor and a ceiling. A hung test is killed soon after
+its normal runtime, while a slow-but-healthy test gets a timeout that fits it.
+Only PASS runs count: a TIMEOUT run lasts as long as the timeout itself, and a
+FAIL often ends early, so either would drag the timeout away from the test's
+real runtime. Tests without enough passing runs get DEFAULT_TIMEOUT.
+
+Median durations also drive test.py's longest-first scheduling and --shard bins.
+
+Each test's final verdict (after test.py --reruns) is kept too: PASS, FAIL, or
+FLAKY when a failure passed on a re-run. The share of FLAKY verdicts among the
+recent ones is the test's flakiness score; tests above QUARANTINE_SCORE are
+quarantined, and their failures no longer fail a suite run.
+
+Usage:
+    run_history.py                 # Show timeouts and regressions for all tests
+"""
+
+import os
+import sys
+import math
+import time
+import sqlite3
+import statistics
+from pathlib import Path
+
+# Fix Windows console encoding for Unicode characters
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+HISTORY_DB = Path('./.cache/test-history.sqlite')
+
+DEFAULT_TIMEOUT = 120     # Seconds, for tests without enough history
+DEFAULT_DURATION = 10.0   # Seconds assumed for scheduling when no test has history
+TIMEOUT_FLOOR = 30
+TIMEOUT_CEILING = 1800
+TIMEOUT_MULTIPLIER = 3.0
+MIN_SAMPLES = 3           # Runs needed before history replaces DEFAULT_TIMEOUT
+WINDOW = 50               # Most recent runs considered
+
+VERDICT_WINDOW = 20       # Recent verdicts in the flakiness score
+QUARANTINE_SCORE = 0.2    # Flakiness score at which a test is quarantined
+QUARANTINE_MIN_VERDICTS = 5
+
+REGRESSION_RECENT = 5     # Recent runs compared against the older baseline
+REGRESSION_RATIO = 1.5
+REGRESSION_MIN_SECONDS = 2.0
+
+
+def _connect():
+    HISTORY_DB.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(HISTORY_DB), timeout=30)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS test_runs (
+            test_name TEXT NOT NULL,
+            started_at REAL NOT NULL,
+            duration REAL NOT NULL,
+            status TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_test_runs_name ON test_runs (test_name, started_at)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS test_verdicts (
+            test_name TEXT NOT NULL,
+            decided_at REAL NOT NULL,
+            verdict TEXT NOT NULL,
+            attempts INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_test_verdicts_name ON test_verdicts (test_name, decided_at)")
+    return conn
+
+
+def test_key(test_file):
+    """History key for a test file path."""
+    return Path(test_file).name
+
+
+def record_run(test_file, duration, status, started_at=None):
+    """Append one run. status is PASS, FAIL or TIMEOUT."""
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO test_runs (test_name, started_at, duration, status) VALUES (?, ?, ?, ?)",
+                (test_key(test_file), started_at if started_at is not None else time.time(), duration, status)
+            )
+    finally:
+        conn.close()
+
+
+def durations(test_file, limit=WINDOW, passing_only=False):
+    """Recent durations for a test, newest first (only PASS runs if passing_only)."""
+    status_filter = " AND status = 'PASS'" if passing_only else ""
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            f"SELECT duration FROM test_runs WHERE test_name = ?{status_filter} ORDER BY started_at DESC LIMIT ?",
+            (test_key(test_file), limit)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in rows]
+
+
+def has_passed(test_file):
+    """True if the test has passed at least once."""
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT 1 FROM test_runs WHERE test_name = ? AND status = 'PASS' LIMIT 1", (test_key(test_file),)
+        ).fetchone()
+    finally:
+        conn.close()
+    return row is not None
+
+
+def record_verdict(test_file, verdict, attempts):
+    """Append a test's final verdict (PASS, FAIL or FLAKY) after attempts runs."""
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO test_verdicts (test_name, decided_at, verdict, attempts) VALUES (?, ?, ?, ?)",
+                (test_key(test_file), time.time(), verdict, attempts)
+            )
+    finally:
+        conn.close()
+
+
+def flakiness(test_file):
+    """(score, verdict count): share of FLAKY among the test's recent verdicts."""
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT verdict FROM test_verdicts WHERE test_name = ? ORDER BY decided_at DESC LIMIT ?",
+            (test_key(test_file), VERDICT_WINDOW)
+        ).fetchall()
+    finally:
+        conn.close()
+    if not rows:
+        return 0.0, 0
+    return sum(1 for (verdict,) in rows if verdict == 'FLAKY') / len(rows), len(rows)
+
+
+def is_quarantined(test_file):
+    """True if the test has been flaky often enough that its failures shouldn't count."""
+    score, count = flakiness(test_file)
+    return count >= QUARANTINE_MIN_VERDICTS and score >= QUARANTINE_SCORE
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered), math.ceil(pct / 100.0 * len(ordered))) - 1)
+    return ordered[rank]
+
+
+def expected_duration(test_file):
+    """Median recent duration of a test in seconds, or None without history."""
+    history = durations(test_file)
+    return statistics.median(history) if history else None
+
+
+def timeout_for(test_file):
+    """Timeout in seconds for a test, derived from its passing durations."""
+    history = durations(test_file, passing_only=True)
+    if len(history) < MIN_SAMPLES:
+        return DEFAULT_TIMEOUT
+    timeout = percentile(history, 99) * TIMEOUT_MULTIPLIER
+    return int(min(TIMEOUT_CEILING, max(TIMEOUT_FLOOR, timeout)))
+
+
+def regression(test_file):
+    """
+    Compare the median of the most recent passing runs against the older ones.
+
+    Returns (recent_median, baseline_median) if the test got markedly slower,
+    otherwise None.
+    """
+    history = durations(test_file, passing_only=True)
+    recent, baseline = history[:REGRESSION_RECENT], history[REGRESSION_RECENT:]
+    if len(recent) < REGRESSION_RECENT or len(baseline) < REGRESSION_RECENT:
+        return None
+    recent_median = statistics.median(recent)
+    baseline_median = statistics.median(baseline)
+    if recent_median > baseline_median * REGRESSION_RATIO and recent_median - baseline_median > REGRESSION_MIN_SECONDS:
+        return recent_median, baseline_median
+    return None
+
+
+def all_tests():
+    """Names of every test with recorded runs."""
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT DISTINCT test_name FROM test_runs ORDER BY test_name").fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in rows]
+
+
+def main():
+    # Change to project root (two levels up from this script)
+    os.chdir(Path(__file__).resolve().parent.parent.parent)
+
+    if not HISTORY_DB.exists():
+        print(f"No test history yet ({HISTORY_DB})")
+        return 0
+    print(f"{'test':<45} {'runs':>5} {'passed':>6} {'p50':>8} {'p99':>8} {'timeout':>8} {'flaky':>6}")
+    for name in all_tests():
+        history = durations(name)
+        passing = durations(name, passing_only=True)
+        p50, p99 = (f"{percentile(passing, pct):>7.1f}s" if passing else f"{'-':>8}" for pct in (50, 99))
+        score, _ = flakiness(name)
+        line = (f"{name:<45} {len(history):>5} {len(passing):>6} {p50} {p99} "
+                f"{timeout_for(name):>7}s {score:>6.0%}")
+        if is_quarantined(name):
+            line += "  QUARANTINED"
+        slower = regression(name)
+        if slower:
+            line += f"  REGRESSING ({slower[1]:.1f}s → {slower[0]:.1f}s)"
+        print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
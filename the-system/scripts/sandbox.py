@@ -0,0 +1,272 @@
+#!/usr/bin/env uvrun
+# /// script
+# requires-python = ">=3.8"
+# dependencies = []
+# ///
+
+"""
+Per-test resource limits for test.py, so one runaway test can't starve the
+others when many run in parallel on a shared machine.
+
+Limits are applied in the test's own process before it starts (rlimits are
+inherited by everything it launches):
+  - CPU time      RLIMIT_CPU (SIGXCPU, then SIGKILL 5s later)
+  - memory        RLIMIT_AS, or memory.max with --cgroup
+  - open files    RLIMIT_NOFILE
+  - processes     RLIMIT_NPROC (counts all of the user's processes), or
+                  pids.max with --cgroup (counts only the test's)
+
+With --cgroup on Linux, every test also gets its own cgroup v2 group (plus
+cpu.max with --cgroup-cpus). cgroup v2 only lets a group delegate controllers
+when it has no processes of its own, so this needs test.py to be alone in a
+delegated cgroup, e.g. started with
+    systemd-run --user --scope -p Delegate=yes uv run --script ./the-system/scripts/test.py ...
+Otherwise test.py says why and keeps to rlimits.
+
+After a test ends, limits_hit() explains kills and failures a limit caused:
+signals (SIGXCPU), cgroup events (oom_kill, pids max) and the errors a test
+prints when an allocation, open() or fork() is refused.
+
+Usage from Python:
+    sandbox = sandbox.Sandbox(cpu_seconds=300, memory_mb=2048)
+    test_sandbox = sandbox.for_test('test_capture_by_id.py')
+    ... spawn with preexec_fn=test_sandbox.preexec ...
+    reasons = test_sandbox.limits_hit(returncode, resources)
+"""
+
+import os
+import sys
+import signal
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+CPU_KILL_GRACE = 5  # Seconds between SIGXCPU (soft limit) and SIGKILL (hard limit)
+
+# Output that means the kernel refused a resource, per limit
+LIMIT_ERRORS = {
+    'memory': ('MemoryError', 'Cannot allocate memory', 'std::bad_alloc', 'out of memory'),
+    'files': ('Too many open files',),
+    'procs': ('Resource temporarily unavailable', "can't start new thread", 'fork: retry'),
+}
+
+
+def available():
+    """True if rlimits can be applied on this platform."""
+    return resource is not None
+
+
+def _cgroup2_mount():
+    """Mount point of the cgroup v2 hierarchy, or None."""
+    try:
+        with open('/proc/self/mountinfo', encoding='utf-8') as f:
+            for line in f:
+                fields = line.split()
+                separator = fields.index('-')
+                if fields[separator + 1] == 'cgroup2':
+                    return Path(fields[4])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _own_cgroup():
+    """This process's cgroup v2 path relative to the mount, or None."""
+    try:
+        with open('/proc/self/cgroup', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('0::'):
+                    return line[3:].strip()
+    except OSError:
+        pass
+    return None
+
+
+class CgroupParent:
+    """A delegated cgroup v2 group that per-test groups are created under."""
+
+    def __init__(self, path, controllers):
+        self.path = path
+        self.controllers = controllers
+
+    @classmethod
+    def create(cls, controllers=('memory', 'pids', 'cpu')):
+        """
+        Set up a parent group for tests. Returns (CgroupParent, None) or
+        (None, reason it isn't possible here).
+        """
+        if not sys.platform.startswith('linux'):
+            return None, "cgroups are Linux-only"
+        mount, own = _cgroup2_mount(), _own_cgroup()
+        if mount is None or own is None:
+            return None, "no cgroup v2 hierarchy"
+        own_path = mount / own.lstrip('/')
+        try:
+            available_controllers = (own_path / 'cgroup.controllers').read_text().split()
+            missing = [c for c in controllers if c not in available_controllers]
+            if missing:
+                return None, f"controllers not delegated to {own_path}: {', '.join(missing)}"
+            members = (own_path / 'cgroup.procs').read_text().split()
+            if members != [str(os.getpid())]:
+                return None, f"{own_path} has other processes; run test.py alone in a delegated cgroup"
+            # Move ourselves to a leaf so the group may delegate controllers
+            leaf = own_path / 'supervisor'
+            leaf.mkdir(exist_ok=True)
+            (leaf / 'cgroup.procs').write_text(str(os.getpid()))
+            (own_path / 'cgroup.subtree_control').write_text(' '.join(f'+{c}' for c in controllers))
+        except OSError as e:
+            return None, f"cannot configure {own_path}: {e}"
+        return cls(own_path, controllers), None
+
+    def child(self, name):
+        path = self.path / name
+        path.mkdir(exist_ok=True)
+        return path
+
+
+class Sandbox:
+    """Limits to apply to every test; None means unlimited."""
+
+    def __init__(self, cpu_seconds=None, memory_mb=None, open_files=None, processes=None,
+                 cgroup=None, cgroup_cpus=None):
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.open_files = open_files
+        self.processes = processes
+        self.cgroup = cgroup  # CgroupParent or None
+        self.cgroup_cpus = cgroup_cpus
+
+    @property
+    def active(self):
+        return any(value is not None for value in (
+            self.cpu_seconds, self.memory_mb, self.open_files, self.processes, self.cgroup
+        ))
+
+    def rlimits(self):
+        """[(RLIMIT name, soft, hard)] for this sandbox; memory and process
+        limits move to the cgroup when there is one."""
+        limits = []
+        if self.cpu_seconds is not None:
+            limits.append(('RLIMIT_CPU', self.cpu_seconds, self.cpu_seconds + CPU_KILL_GRACE))
+        if self.memory_mb is not None and self.cgroup is None:
+            limits.append(('RLIMIT_AS', self.memory_mb * 1024 * 1024, self.memory_mb * 1024 * 1024))
+        if self.open_files is not None:
+            limits.append(('RLIMIT_NOFILE', self.open_files, self.open_files))
+        if self.processes is not None and self.cgroup is None:
+            limits.append(('RLIMIT_NPROC', self.processes, self.processes))
+        return limits
+
+    def for_test(self, test_file):
+        return TestSandbox(self, Path(test_file).stem)
+
+
+def apply_rlimits(rlimits):
+    """Set [(RLIMIT name, soft, hard)] on the current process, never raising a hard limit."""
+    for name, soft, hard in rlimits:
+        kind = getattr(resource, name, None)
+        if kind is None:
+            continue
+        _, current_hard = resource.getrlimit(kind)
+        if current_hard != resource.RLIM_INFINITY:
+            hard = min(hard, current_hard)
+            soft = min(soft, hard)
+        resource.setrlimit(kind, (soft, hard))
+
+
+def join_cgroup(path):
+    """Move the current process into the cgroup at path."""
+    with open(os.path.join(path, 'cgroup.procs'), 'w') as f:
+        f.write(str(os.getpid()))
+
+
+class TestSandbox:
+    """The limits for one test run, with its cgroup if any."""
+
+    def __init__(self, sandbox, name):
+        self.sandbox = sandbox
+        self.rlimits = sandbox.rlimits()
+        self.cgroup_path = None
+        self.output_hits = set()
+        if sandbox.cgroup is not None:
+            self.cgroup_path = sandbox.cgroup.child(f"{name}-{os.getpid()}")
+            if sandbox.memory_mb is not None:
+                (self.cgroup_path / 'memory.max').write_text(str(sandbox.memory_mb * 1024 * 1024))
+                if (self.cgroup_path / 'memory.swap.max').exists():
+                    (self.cgroup_path / 'memory.swap.max').write_text('0')
+            if sandbox.processes is not None:
+                (self.cgroup_path / 'pids.max').write_text(str(sandbox.processes))
+            if sandbox.cgroup_cpus is not None:
+                period = 100000
+                (self.cgroup_path / 'cpu.max').write_text(f"{int(sandbox.cgroup_cpus * period)} {period}")
+
+    def preexec(self):
+        """Runs in the child between fork and exec."""
+        if self.cgroup_path is not None:
+            join_cgroup(str(self.cgroup_path))
+        apply_rlimits(self.rlimits)
+
+    def request(self):
+        """What a fork server needs to apply these limits in a forked child."""
+        return {'rlimits': self.rlimits, 'cgroup': str(self.cgroup_path) if self.cgroup_path else None}
+
+    def observe(self, line):
+        """Output hook: remember lines that look like a refused resource."""
+        for limit, needles in LIMIT_ERRORS.items():
+            if limit not in self.output_hits and any(needle in line for needle in needles):
+                self.output_hits.add(limit)
+
+    def _cgroup_events(self, filename):
+        try:
+            text = (self.cgroup_path / filename).read_text()
+        except (OSError, TypeError):
+            return {}
+        return {key: int(value) for key, value in (line.split() for line in text.splitlines() if line)}
+
+    def limits_hit(self, returncode, resources):
+        """Reasons a limit killed the test or made it fail (empty if none)."""
+        sandbox = self.sandbox
+        reasons = []
+        # CPU time of the whole tree (wait4 rusage); RLIMIT_CPU applies to each process
+        cpu_used = (resources.get('user_seconds') or 0) + (resources.get('sys_seconds') or 0)
+        xcpu = getattr(signal, 'SIGXCPU', None)
+        kill = getattr(signal, 'SIGKILL', None)
+        # uv reports a child killed by a signal as 128 + signal
+        killed_by_xcpu = xcpu is not None and returncode in (-xcpu, 128 + xcpu)
+        killed_by_kill = kill is not None and returncode in (-kill, 128 + kill)
+        if sandbox.cpu_seconds is not None:
+            if killed_by_xcpu:
+                reasons.append(f"cpu: killed at the CPU time limit ({sandbox.cpu_seconds}s per process)")
+            elif killed_by_kill and cpu_used >= sandbox.cpu_seconds:
+                # A process that ignored SIGXCPU gets SIGKILL at the hard limit;
+                # other processes of the tree may have used part of cpu_used
+                reasons.append(f"cpu: probably killed at the CPU time limit ({sandbox.cpu_seconds}s per process; "
+                               f"the test's processes used {cpu_used:.1f}s together)")
+        if sandbox.memory_mb is not None:
+            if self._cgroup_events('memory.events').get('oom_kill', 0) > 0:
+                reasons.append(f"memory: cgroup OOM-killed at memory.max ({sandbox.memory_mb} MB)")
+            elif returncode != 0 and 'memory' in self.output_hits:
+                reasons.append(f"memory: allocation refused at the memory limit ({sandbox.memory_mb} MB)")
+        if sandbox.open_files is not None and returncode != 0 and 'files' in self.output_hits:
+            reasons.append(f"files: open() refused at the open-file limit ({sandbox.open_files})")
+        if sandbox.processes is not None:
+            if self._cgroup_events('pids.events').get('max', 0) > 0:
+                reasons.append(f"procs: fork refused at pids.max ({sandbox.processes})")
+            elif returncode != 0 and 'procs' in self.output_hits:
+                reasons.append(f"procs: fork refused at the process limit ({sandbox.processes})")
+        return reasons
+
+    def cleanup(self):
+        """Remove the test's cgroup once its processes are gone."""
+        if self.cgroup_path is None:
+            return
+        try:
+            (self.cgroup_path / 'cgroup.kill').write_text('1')
+        except OSError:
+            pass
+        try:
+            self.cgroup_path.rmdir()
+        except OSError:
+            pass
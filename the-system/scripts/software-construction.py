@@ -11,8 +11,12 @@ if sys.stdout.encoding != 'utf-8':
     sys.stderr.reconfigure(encoding='utf-8')
 
 import os
+import time
+import asyncio
+import argparse
 import subprocess
 import sqlite3
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 
@@ -26,7 +30,19 @@ UV_EXE = str(project_root / 'the-system' / 'bin' / 'uv.exe')
 
 # Import the agentic coder wrapper
 sys.path.insert(0, str(script_dir))
-from prompt_agentic_coder import get_ai_response_text
+from prompt_agentic_coder import AgentSession, get_ai_response_text
+from pipeline import Pipeline
+import tracing
+import metrics
+import run_history
+import speculative
+
+# Lines of a test report included in a fix prompt
+REPORT_TAIL_LINES = 200
+
+# A failing test that has passed before is re-run this many times before it
+# counts as a real failure; one that then passes is flaky and gets no agent fix
+TEST_RERUNS = 2
 
 def run_fix_unique_ids():
     """Run fix-unique-req-ids.py to auto-fix duplicate IDs."""
@@ -35,7 +51,8 @@ def run_fix_unique_ids():
     print("=" * 60 + "\n")
 
     cmd = [UV_EXE, 'run', '--script', './the-system/scripts/fix-unique-req-ids.py']
-    result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', timeout=60)
+    with tracing.span("fix-unique-req-ids", cat="index"):
+        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', timeout=60)
 
     print(result.stdout)
     if result.stderr:
@@ -55,7 +72,11 @@ def run_build_req_index():
     print("=" * 60 + "\n")
 
     cmd = [UV_EXE, 'run', '--script', './the-system/scripts/build-req-index.py']
-    result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', timeout=60)
+    started = time.monotonic()
+    with tracing.span("build-req-index", cat="index"):
+        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', timeout=60)
+    metrics.INDEX_BUILD_SECONDS.observe(time.monotonic() - started)
+    metrics.progress()
 
     print(result.stdout)
     if result.stderr:
@@ -68,11 +89,11 @@ def run_build_req_index():
         print(f"\nERROR: build-req-index.py failed with exit code {result.returncode}\n")
         sys.exit(1)
 
-def query_db(query):
+def query_db(query, params=()):
     """Execute a query against the requirements database."""
     conn = sqlite3.connect('./tmp/reqs.sqlite')
     cursor = conn.cursor()
-    cursor.execute(query)
+    cursor.execute(query, params)
     results = cursor.fetchall()
     conn.close()
     return results
@@ -158,15 +179,8 @@ def handle_orphan_req_ids(orphans):
     print(f"✓ Removed {len(orphans)} orphan $REQ_IDs\n")
     return True  # work was done
 
-def handle_untested_req(untested):
-    """Write test for the first untested requirement."""
-    print("\n" + "=" * 60)
-    print("WORK ITEM: untested_req")
-    print("=" * 60 + "\n")
-
-    # Get first untested req
-    req_id = untested[0][0]
-
+def untested_req_prompt(req_id):
+    """Prompt that writes the test for an untested requirement."""
     # Get flow file for this req
     flow_info = query_db(f"SELECT flow_file, req_text, source_attribution FROM req_definitions WHERE req_id = '{req_id}'")
     if not flow_info:
@@ -191,22 +205,18 @@ def handle_untested_req(untested):
     prompt += f"  Flow file: {flow_file}\n"
     prompt += f"  Source: {source_attribution}\n"
     prompt += f"  Requirement text: {req_text}\n"
+    return prompt
 
-    print(f"→ Running: prompt_agentic_coder.get_ai_response_text()")
-    result = get_ai_response_text(prompt, report_type="untested_req")
-    print(f"← Command finished\n")
-
-    print(f"✓ Created test for {req_id}\n")
-    return True  # work was done
-
-def handle_test_strategy_compliance():
-    """Ensure all tests comply with documented testing strategies."""
+def handle_test_strategy_compliance(test_files=None):
+    """Ensure tests comply with documented testing strategies (all tests, or only test_files)."""
     print("\n" + "=" * 60)
     print("WORK ITEM: test_strategy_compliance")
     print("=" * 60 + "\n")
 
     # Build prompt
     prompt = "Please follow these instructions: @./the-system/prompts/TEST-STRATEGY-COMPLIANCE.md"
+    if test_files:
+        prompt += "\n\nOnly check these test files: " + ", ".join(test_files)
 
     print(f"→ Running: prompt_agentic_coder.get_ai_response_text()")
     result = get_ai_response_text(prompt, report_type="test_strategy_compliance")
@@ -224,13 +234,126 @@ def handle_test_ordering():
     prompt = "Please follow these instructions: @./the-system/prompts/ORDER_TESTS.md"
 
     print(f"→ Running: prompt_agentic_coder.get_ai_response_text()")
-    result = get_ai_response_text(prompt, report_type="order_tests")
+    result = get_ai_response_text(prompt, report_type="order_tests", read_only=True,
+                                  cache_inputs=['README.md', 'readme', 'tests/failing', 'tests/passing'])
     print(f"← Command finished\n")
 
     print("✓ Tests analyzed and ordered\n")
 
-def handle_single_test_until_passes(test_file):
-    """Fix code to make a single test pass, retrying until it succeeds."""
+def run_build():
+    """Run ./tests/build.py once. Returns (returncode, build_output)."""
+    print(f"→ Building project...")
+    cmd = [UV_EXE, 'run', '--script', './tests/build.py']
+    try:
+        with tracing.span("build", cat="build"):
+            result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace', timeout=3600)
+    except subprocess.TimeoutExpired:
+        print("✗ Build timed out after 3600 seconds\n")
+        return 124, "[ERROR] Build timed out after 3600 seconds\n"
+
+    build_output = result.stdout + result.stderr
+    if result.returncode != 0:
+        print(build_output)
+        print(f"✗ Build failed with exit code {result.returncode}\n")
+    else:
+        print(f"← Build finished\n")
+    return result.returncode, build_output
+
+def read_report_tail(report_path, max_lines=REPORT_TAIL_LINES):
+    """A report's status line plus its last max_lines lines, read in constant memory."""
+    line_count = 0
+    tail = deque(maxlen=max_lines)
+    with open(report_path, 'r', encoding='utf-8', errors='replace') as f:
+        header = f.readline()
+        for line in f:
+            line_count += 1
+            tail.append(line)
+    omitted = line_count - len(tail)
+    if omitted > 0:
+        header += f"[... {omitted} earlier lines omitted (see {report_path}) ...]\n"
+    return header + ''.join(tail)
+
+def run_test_file(test_file, skip_build=False):
+    """Run a single test through test.py. Returns (returncode, test_output)."""
+    # Use uv run --script to run test.py (same pattern that works in reqs-gen.py)
+    test_cmd = [UV_EXE, 'run', '--script', './the-system/scripts/test.py']
+    if skip_build:
+        test_cmd.append('--skip-build')
+    test_cmd += ['--reruns', str(TEST_RERUNS), test_file]
+
+    report_file_path = None
+    metrics.TEST_ATTEMPTS.inc(test=os.path.basename(test_file))
+
+    # test.py enforces the per-test timeout from duration history; this outer
+    # limit only guards against test.py itself hanging (plus build time)
+    outer_timeout = run_history.timeout_for(test_file) * (1 + TEST_RERUNS) + (300 if skip_build else 3600)
+
+    try:
+        # Run test and capture output to find report file
+        try:
+            with tracing.span(f"test.py {os.path.basename(test_file)}", cat="test", test=test_file):
+                result = subprocess.run(test_cmd, capture_output=True, text=True, timeout=outer_timeout)
+            returncode = result.returncode
+            captured_output = result.stdout + result.stderr
+        except subprocess.TimeoutExpired:
+            returncode = -1
+            captured_output = f"[ERROR] Test execution timed out after {outer_timeout} seconds\n"
+
+        # Look for "report file: " line in captured output
+        for line in captured_output.splitlines():
+            if line.startswith("report file: "):
+                report_file_path = line[len("report file: "):].strip()
+            elif line.startswith("flaky: "):
+                # Timing noise, not a bug: report the pass, but don't hide it
+                score, _ = run_history.flakiness(test_file)
+                print(f"⚠ {os.path.basename(test_file)} passed only on a re-run (flaky in {score:.0%} of recent runs)")
+                metrics.FLAKY_RESULTS.inc(test=os.path.basename(test_file))
+
+        # Read the actual test report (clean, without build output); only its
+        # status line and last lines go into the fix prompt
+        if report_file_path and os.path.exists(report_file_path):
+            test_output = read_report_tail(report_file_path)
+        else:
+            # Fallback to captured output if report file not found
+            test_output = captured_output
+
+    except Exception as e:
+        returncode = -1
+        test_output = f"Error running test: {e}\n"
+
+    metrics.progress()
+    return returncode, test_output
+
+async def run_test_after_build(build, test_file):
+    """Run a test against a finished build task; a failed build is reported as the test's failure."""
+    build_returncode, build_output = await build
+    if build_returncode != 0:
+        return build_returncode, f"Build failed with exit code {build_returncode}\n\n{build_output}"
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, run_test_file, test_file, True)
+
+def move_to_passing(test_file):
+    """Move a test file from ./tests/failing/ to ./tests/passing/. Returns the new path."""
+    dest = f"./tests/passing/{Path(test_file).name}"
+    os.makedirs('./tests/passing', exist_ok=True)
+    os.rename(test_file, dest)
+    return dest
+
+async def handle_single_test_until_passes(pipeline, test_file, first_result=None, speculative_fixes=0):
+    """Fix code to make a single test pass, retrying until it succeeds.
+
+    first_result is an already-known (returncode, test_output) for the current
+    code, e.g. from a parallel probe run, so attempt 1 doesn't re-run the test.
+    After each fix the requirements index rebuild overlaps the build, and the
+    test runs as soon as the build is done.
+
+    Fix attempts continue one agent session: from attempt 2 on the agent gets
+    only the new test output, with FIX_FAILING_TEST.md, the flows and the code
+    it read already in context (a fresh session if it can't be resumed).
+
+    With speculative_fixes > 1, each fix attempt launches that many agent fixes
+    in parallel git worktrees and merges the first one that passes.
+    """
     test_name = os.path.basename(test_file)
 
     print("\n" + "=" * 60)
@@ -245,10 +368,11 @@ def handle_single_test_until_passes(test_file):
         return False  # No failure occurred
 
     # Build requirements index before running test
-    run_build_req_index()
+    index = pipeline.submit("index", run_build_req_index, resource="index")
 
     attempt = 0
     max_attempts = 10  # If test can't be fixed after 10 attempts, there's a systemic problem
+    session = AgentSession()
 
     while attempt < max_attempts:
         attempt += 1
@@ -263,51 +387,22 @@ def handle_single_test_until_passes(test_file):
             return False  # No failure occurred
 
         # Run the test to check if it passes
-        print(f"→ Running {test_name}...")
-        # Use uv run --script to run test.py (same pattern that works in reqs-gen.py)
-        test_cmd = [UV_EXE, 'run', '--script', './the-system/scripts/test.py', test_file]
-        # Capture output to find the report file path
-        test_result = None
-        test_output = ""
-        report_file_path = None
-
-        try:
-            # Run test and capture output to find report file
-            try:
-                result = subprocess.run(test_cmd, capture_output=True, text=True, timeout=3600)
-                test_result = result
-                captured_output = result.stdout + result.stderr
-            except subprocess.TimeoutExpired:
-                # Test timed out -- create a result object indicating timeout
-                test_result = type('obj', (object,), {'returncode': -1})()
-                captured_output = "[ERROR] Test execution timed out after 3600 seconds\n"
-
-            # Look for "report file: " line in captured output
-            for line in captured_output.splitlines():
-                if line.startswith("report file: "):
-                    report_file_path = line[len("report file: "):].strip()
-                    break
-
-            # Read the actual test report (clean, without build output)
-            if report_file_path and os.path.exists(report_file_path):
-                with open(report_file_path, 'r', encoding='utf-8') as f:
-                    test_output = f.read()
-            else:
-                # Fallback to captured output if report file not found
-                test_output = captured_output
-
-        except Exception as e:
-            test_result = type('obj', (object,), {'returncode': -1})()
-            test_output = f"Error running test: {e}\n"
-
-        print(f"← Test completed with exit code: {test_result.returncode}\n")
+        if first_result is not None:
+            returncode, test_output = first_result
+            first_result = None
+        else:
+            print(f"→ Running {test_name}...")
+            build = pipeline.submit("build", run_build, resource="build")
+            returncode, test_output = await pipeline.submit(
+                f"test {test_name}", run_test_after_build, build, test_file, deps=[build], resource="test"
+            )
+
+        print(f"← Test completed with exit code: {returncode}\n")
 
         # If test passes, move it to passing and return
-        if test_result.returncode == 0:
-            test_filename = Path(test_file).name
-            dest = f"./tests/passing/{test_filename}"
-            os.makedirs('./tests/passing', exist_ok=True)
-            os.rename(test_file, dest)
+        if returncode == 0:
+            await index
+            dest = move_to_passing(test_file)
 
             if attempt == 1:
                 print(f"✓ Test passed on first try! Moved to {dest}\n")
@@ -325,12 +420,37 @@ def handle_single_test_until_passes(test_file):
         prompt += f"Attempt: {attempt}/{max_attempts}\n\n"
         prompt += f"Test output:\n```\n{test_output}\n```\n"
 
+        # For the session that made the previous attempt
+        resume_prompt = f"The test still fails after your last fix ({test_file}).\n"
+        resume_prompt += f"Attempt: {attempt}/{max_attempts}\n\n"
+        resume_prompt += f"Test output:\n```\n{test_output}\n```\n"
+
+        if speculative_fixes > 1:
+            # Each attempt's agent takes its own agent slot
+            won = await pipeline.submit(
+                f"speculative fix {test_name}", speculative.race_fixes,
+                test_file, prompt, speculative_fixes, UV_EXE, agent_slot=pipeline.slot("agent"), deps=[index]
+            )
+            if won:
+                await pipeline.submit("index", run_build_req_index, resource="index")
+                if os.path.exists(test_file):
+                    move_to_passing(test_file)
+                print(f"✓ Test passes after {attempt} speculative round(s)! Moved to ./tests/passing/\n")
+                return True
+            # The main tree is untouched, so the failing output is still current
+            print(f"✗ No speculative attempt passed, retrying...\n")
+            first_result = (returncode, test_output)
+            continue
+
         print(f"→ Running: prompt_agentic_coder.get_ai_response_text()")
-        result = get_ai_response_text(prompt, report_type="failing_test")
+        await pipeline.submit(
+            f"fix {test_name}", get_ai_response_text, prompt, report_type="failing_test",
+            session=session, resume_prompt=resume_prompt, deps=[index], resource="agent"
+        )
         print(f"← Command finished\n")
 
-        # Rebuild requirements index after AI made changes
-        run_build_req_index()
+        # Rebuild requirements index after AI made changes (overlaps the next build and test run)
+        index = pipeline.submit("index", run_build_req_index, resource="index")
 
         # Loop continues to re-test
 
@@ -363,14 +483,166 @@ def run_cleanup():
         print(f"\nERROR: cleanup.py failed with exit code {result.returncode}\n")
         sys.exit(1)
 
-def main():
+def list_tests(directory):
+    """List test files (test_*.py and _test_*.py) in a directory, sorted."""
+    if not os.path.exists(directory):
+        return []
+    return sorted(
+        os.path.join(directory, filename)
+        for filename in os.listdir(directory)
+        if (filename.startswith('test_') or filename.startswith('_test_')) and filename.endswith('.py')
+    )
+
+def untested_reqs_in_flow(flow_file):
+    """Requirement ids of a flow that no test is tagged with yet."""
+    return [row[0] for row in query_db("""
+        SELECT req_id FROM req_definitions
+        WHERE flow_file = ?
+          AND req_id NOT IN (SELECT req_id FROM req_locations WHERE category = 'tests')
+        ORDER BY req_id
+    """, (flow_file,))]
+
+def test_flows():
+    """Map each test file name to the flows whose requirements it tests."""
+    flows = {}
+    for filespec, flow_file in query_db("""
+        SELECT DISTINCT l.filespec, d.flow_file FROM req_locations l
+        JOIN req_definitions d ON d.req_id = l.req_id
+        WHERE l.category = 'tests'
+    """):
+        flows.setdefault(os.path.basename(filespec.replace('\\', '/')), set()).add(flow_file)
+    return flows
+
+async def prepare_flow_tests(pipeline, flow_file, check_compliance):
+    """Write tests for a flow's untested requirements, then check them against the strategy.
+
+    Runs as one work item per flow, concurrently with other flows and with
+    fixing. A flow's tests go into its own test file, so its requirements are
+    written one agent call at a time. Returns the number of tests written.
+    """
+    written = 0
+    while True:
+        untested = untested_reqs_in_flow(flow_file)
+        if not untested:
+            break
+        req_id = untested[0]
+        print("\n" + "=" * 60)
+        print("WORK ITEM: untested_req")
+        print("=" * 60 + "\n")
+        await pipeline.submit(f"write test {req_id}", get_ai_response_text, untested_req_prompt(req_id),
+                              report_type="untested_req", resource="agent")
+        await pipeline.submit("index", run_build_req_index, resource="index")  # Rebuild after writing the test
+        if req_id in untested_reqs_in_flow(flow_file):
+            raise RuntimeError(f"no test tagged with {req_id} was written")
+        print(f"✓ Created test for {req_id}\n")
+        written += 1
+
+    if check_compliance:
+        test_files = sorted(name for name, flows in test_flows().items() if flow_file in flows)
+        if test_files:
+            await pipeline.submit(f"test strategy compliance {flow_file}", handle_test_strategy_compliance,
+                                  test_files, resource="agent")
+            await pipeline.submit("index", run_build_req_index, resource="index")  # Rebuild after any test modifications
+    return written
+
+def ready_failing_tests(pending_flows):
+    """Failing tests that can be fixed now: none of their flows still has tests being written."""
+    failing_tests = list_tests('./tests/failing')
+    if not pending_flows:
+        return failing_tests
+    flows = test_flows()
+    # A test the index can't place waits until every flow is ready
+    return [test_file for test_file in failing_tests
+            if flows.get(os.path.basename(test_file))
+            and not flows[os.path.basename(test_file)] & pending_flows]
+
+def move_all_passing_to_failing():
+    """Move every passing test to failing, to re-validate them one at a time."""
+    passing_tests = [os.path.basename(t) for t in list_tests('./tests/passing')]
+
     print("\n" + "=" * 60)
-    print("SOFTWARE CONSTRUCTION")
+    print("MOVING TESTS FOR VALIDATION")
     print("=" * 60)
+    print(f"\nNo tests in ./tests/failing/ - moving {len(passing_tests)} test(s) from ./tests/passing/ for validation:\n")
+
+    for filename in passing_tests:
+        src = os.path.join('./tests/passing', filename)
+        dst = os.path.join('./tests/failing', filename)
+        os.rename(src, dst)
+        print(f"  → {filename}")
+
+    print(f"\n✓ Moved {len(passing_tests)} test(s) to ./tests/failing/\n")
+
+def run_passing_suite(jobs):
+    """
+    Run every passing test in one test.py process, jobs at a time, against the
+    existing build. Returns the names of tests that failed (quarantined tests
+    excluded), or None if test.py itself couldn't run.
+    """
+    test_cmd = [UV_EXE, 'run', '--script', './the-system/scripts/test.py',
+                '--skip-build', '--passing', '-j', str(jobs), '--reruns', str(TEST_RERUNS)]
+    passing_tests = list_tests('./tests/passing')
+    # Generous outer limit: test.py enforces each test's own timeout
+    outer_timeout = sum(run_history.timeout_for(t) for t in passing_tests) * (1 + TEST_RERUNS) // max(1, jobs) + 600
+
+    try:
+        with tracing.span("validate passing suite", cat="test", jobs=jobs):
+            result = subprocess.run(test_cmd, capture_output=True, text=True, encoding='utf-8', errors='replace',
+                                    timeout=outer_timeout)
+    except subprocess.TimeoutExpired:
+        print(f"✗ Validation run timed out after {outer_timeout} seconds\n")
+        return None
+
+    failed = set()
+    quarantined = set()
+    for line in result.stdout.splitlines():
+        if line.startswith("Report written to: "):
+            report_path = line[len("Report written to: "):].strip()
+            try:
+                with open(report_path, 'r', encoding='utf-8', errors='replace') as f:
+                    name, _, status = f.readline().strip().rpartition(' ')
+            except OSError:
+                continue
+            if status != "PASS":
+                failed.add(name)
+        elif line.startswith("quarantined: "):
+            quarantined.add(os.path.basename(line[len("quarantined: "):].strip()))
+        elif line.startswith("flaky: "):
+            metrics.FLAKY_RESULTS.inc(test=os.path.basename(line[len("flaky: "):].strip()))
+
+    metrics.progress()
+    if result.returncode != 0 and not failed:
+        # test.py failed without reporting any test: don't trust the run
+        print(result.stdout[-5000:] + result.stderr[-5000:])
+        return None
+    return sorted(failed - quarantined)
+
+async def validate_passing_tests(pipeline, jobs):
+    """Re-validate the passing suite in one parallel pass, demoting only real failures."""
+    print("\n" + "=" * 60)
+    print("VALIDATING PASSING TESTS")
+    print("=" * 60 + "\n")
 
-    # Clean up old reports and tmp before starting
-    run_cleanup()
-
+    build_returncode, _ = await pipeline.submit("build", run_build, resource="build")
+    if build_returncode != 0:
+        # Nothing can be validated against a broken build; fix it test by test
+        move_all_passing_to_failing()
+        return
+
+    print(f"→ Running {len(list_tests('./tests/passing'))} passing test(s), {jobs} at a time...")
+    failed = await pipeline.submit("validate", run_passing_suite, jobs, resource="test")
+    if failed is None:
+        print("✗ Could not validate in parallel; falling back to one test at a time\n")
+        move_all_passing_to_failing()
+        return
+
+    for name in failed:
+        dest = os.path.join('./tests/failing', name)
+        os.rename(os.path.join('./tests/passing', name), dest)
+        print(f"  ✗ {name} fails - moved to ./tests/failing/")
+    print(f"\n✓ Validation complete: {len(list_tests('./tests/passing'))} passing, {len(failed)} moved to failing\n")
+
+async def run_construction(pipeline, speculative_fixes=0, validation_jobs=0):
     # Create necessary directories
     os.makedirs('./tests/failing', exist_ok=True)
     os.makedirs('./tests/passing', exist_ok=True)
@@ -381,6 +653,8 @@ def main():
     # ========================================================================
     # SETUP PHASE (runs once)
     # ========================================================================
+    # Test writing is not part of it: each flow's tests are written by their own
+    # work item, and fixing starts on a flow as soon as its tests are ready.
 
     print("\n" + "=" * 60)
     print("SETUP PHASE")
@@ -406,83 +680,66 @@ def main():
         handle_orphan_req_ids(orphans)
         run_build_req_index()  # Rebuild after cleanup
 
-    # Step 5: Write tests for all untested requirements
-    tests_were_written = False
-    while True:
-        untested = query_db("""
-            SELECT DISTINCT req_id FROM req_definitions
-            WHERE req_id NOT IN (SELECT req_id FROM req_locations WHERE category = 'tests')
-        """)
-        if not untested:
-            break
-        handle_untested_req(untested)
-        run_build_req_index()  # Rebuild after writing tests
-        tests_were_written = True
-
-    # Step 6: Ensure test strategy compliance
-    # Only run if there are NO tests in passing/ (i.e., all tests are new/untested)
-    passing_test_count = len([f for f in os.listdir('./tests/passing') if (f.startswith('test_') or f.startswith('_test_')) and f.endswith('.py')]) if os.path.exists('./tests/passing') else 0
-
-    if passing_test_count == 0:
-        handle_test_strategy_compliance()
-        run_build_req_index()  # Rebuild after any test modifications
-
-    # Step 7: Order tests by dependency (only if new tests were written)
-    if tests_were_written:
-        handle_test_ordering()
+    # Step 5: Write tests for untested requirements, one work item per flow.
+    # Test strategy compliance only runs if there are NO tests in passing/
+    # (i.e., all tests are new/untested)
+    check_compliance = len(list_tests('./tests/passing')) == 0
+    flow_files = [row[0] for row in query_db("SELECT DISTINCT flow_file FROM req_definitions ORDER BY flow_file")]
+    flow_tasks = {
+        flow_file: pipeline.submit(f"prepare {flow_file}", prepare_flow_tests, pipeline, flow_file, check_compliance)
+        for flow_file in flow_files
+    }
 
     print("\n" + "=" * 60)
     print("✓ SETUP COMPLETE")
     print("=" * 60)
-    print("\nAll tests written and ordered. Beginning test processing...\n")
+    print(f"\nPreparing tests for {len(flow_tasks)} flow(s). Beginning test processing...\n")
 
     # ========================================================================
-    # PRE-TEST PHASE - Move passing tests back to failing for validation
+    # PRE-TEST PHASE - Re-validate passing tests
     # ========================================================================
 
     # Check if failing directory is empty
-    failing_tests = []
-    if os.path.exists('./tests/failing'):
-        for filename in os.listdir('./tests/failing'):
-            if (filename.startswith('test_') or filename.startswith('_test_')) and filename.endswith('.py'):
-                failing_tests.append(filename)
-
-    if not failing_tests:
-        # No tests in failing - move all from passing to failing for validation
-        passing_tests = []
-        if os.path.exists('./tests/passing'):
-            for filename in os.listdir('./tests/passing'):
-                if (filename.startswith('test_') or filename.startswith('_test_')) and filename.endswith('.py'):
-                    passing_tests.append(filename)
-
-        if passing_tests:
-            print("\n" + "=" * 60)
-            print("MOVING TESTS FOR VALIDATION")
-            print("=" * 60)
-            print(f"\nNo tests in ./tests/failing/ - moving {len(passing_tests)} test(s) from ./tests/passing/ for validation:\n")
+    failing_tests = list_tests('./tests/failing')
 
-            for filename in passing_tests:
-                src = os.path.join('./tests/passing', filename)
-                dst = os.path.join('./tests/failing', filename)
-                os.rename(src, dst)
-                print(f"  → {filename}")
-
-            print(f"\n✓ Moved {len(passing_tests)} test(s) to ./tests/failing/\n")
+    if not failing_tests and list_tests('./tests/passing'):
+        if validation_jobs > 0:
+            # Build once, run the whole passing suite in parallel, and demote
+            # only the tests that actually fail
+            await validate_passing_tests(pipeline, validation_jobs)
+        else:
+            move_all_passing_to_failing()
 
     # ========================================================================
     # MAIN TEST LOOP - Process tests until failing directory is empty
     # ========================================================================
 
+    tests_were_written = False
+    tests_ordered = False
     while True:
-        # Get alphabetically first test from failing directory
-        failing_tests = []
-        if os.path.exists('./tests/failing'):
-            for filename in os.listdir('./tests/failing'):
-                if (filename.startswith('test_') or filename.startswith('_test_')) and filename.endswith('.py'):
-                    failing_tests.append(os.path.join('./tests/failing', filename))
-
-        # Sort alphabetically - numeric prefixes ensure proper order
-        failing_tests.sort()
+        for flow_file, task in flow_tasks.items():
+            if task.done() and task.exception() is not None:
+                print("\n" + "=" * 60)
+                print("EXIT: TEST WRITING FAILED")
+                print("=" * 60)
+                print(f"\nERROR: Preparing tests for {flow_file} failed: {task.exception()}\n")
+                sys.exit(1)
+
+        pending_flows = {flow_file for flow_file, task in flow_tasks.items() if not task.done()}
+        if not pending_flows and not tests_ordered:
+            tests_were_written = any(task.result() for task in flow_tasks.values())
+            # Step 6: Order tests by dependency (only if new tests were written)
+            if tests_were_written:
+                await pipeline.submit("order tests", handle_test_ordering, resource="agent")
+            tests_ordered = True
+
+        # Numeric prefixes in the sorted order ensure foundational tests come first
+        failing_tests = ready_failing_tests(pending_flows)
+
+        if not failing_tests and pending_flows:
+            # Nothing to fix until another flow's tests are ready
+            await asyncio.wait([flow_tasks[f] for f in pending_flows], return_when=asyncio.FIRST_COMPLETED)
+            continue
 
         if not failing_tests:
             # No tests in failing directory - we're done!
@@ -509,11 +766,100 @@ def main():
             print("EXIT: SUCCESS")
             print("=" * 60)
             print("\nAll requirements implemented and all tests passing.\n")
-            sys.exit(0)
+            return 0
+
+        # Build once against the current code, then probe every failing test
+        # concurrently (bounded by the test slots)
+        build = pipeline.submit("build", run_build, resource="build")
+        probes = {
+            test_file: pipeline.submit(
+                f"probe {os.path.basename(test_file)}", run_test_after_build, build, test_file,
+                deps=[build], resource="test"
+            )
+            for test_file in failing_tests
+        }
+
+        # Tests that already pass move straight to passing; the first one that
+        # fails is fixed, then the remaining failing tests are probed again
+        # against the changed code
+        for test_file in failing_tests:
+            returncode, test_output = await probes[test_file]
+            if returncode == 0:
+                dest = move_to_passing(test_file)
+                print(f"✓ {os.path.basename(test_file)} passes. Moved to {dest}\n")
+                continue
+
+            # Drop probes that haven't started; keep any that pass while finishing
+            pipeline.cancel_pending(probes.values())
+            for other_file, probe in probes.items():
+                if other_file == test_file or probe.cancelled():
+                    continue
+                try:
+                    other_returncode, _ = await probe
+                except asyncio.CancelledError:
+                    continue
+                if other_returncode == 0 and os.path.exists(other_file):
+                    dest = move_to_passing(other_file)
+                    print(f"✓ {os.path.basename(other_file)} passes. Moved to {dest}\n")
+
+            await handle_single_test_until_passes(
+                pipeline, test_file, first_result=(returncode, test_output), speculative_fixes=speculative_fixes
+            )
+            break
+
+def update_run_metrics(pipeline):
+    """Refresh scrape-time gauges: test counts and scheduler queue depth."""
+    metrics.TESTS.set(len(list_tests('./tests/passing')), state="passing")
+    metrics.TESTS.set(len(list_tests('./tests/failing')), state="failing")
+    metrics.QUEUE_DEPTH.set(pipeline.pending)
+
+def main():
+    parser = argparse.ArgumentParser(description='Build software from requirement flows')
+    parser.add_argument('--agent-slots', type=int, default=2,
+                        help='Maximum concurrent agent calls (default: 2)')
+    parser.add_argument('--test-slots', type=int, default=1,
+                        help='Maximum concurrent test runs (default: 1)')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='Serve live Prometheus metrics on http://127.0.0.1:PORT/metrics')
+    parser.add_argument('--validation-jobs', type=int, default=4, metavar='N',
+                        help='Re-validate passing tests in one parallel test.py run, N at a time; '
+                             '0 moves them all to failing and checks them one by one (default: 4)')
+    parser.add_argument('--speculative', type=int, default=0, metavar='K',
+                        help='Try K agent fixes for a failing test at once in separate git worktrees; '
+                             'the first one that passes is merged (default: off)')
+    args = parser.parse_args()
+
+    if args.speculative > 1 and not speculative.is_git_repo():
+        print("WARNING: --speculative needs a git repository; falling back to one fix at a time")
+        args.speculative = 0
+
+    print("\n" + "=" * 60)
+    print("SOFTWARE CONSTRUCTION")
+    print("=" * 60)
+
+    # Clean up old reports and tmp before starting
+    run_cleanup()
 
-        # Process the first failing test
-        test_file = failing_tests[0]
-        handle_single_test_until_passes(test_file)
+    # Trace the whole run (child processes append to the same file)
+    tracing.start_trace("software-construction")
+
+    pipeline = Pipeline({
+        "agent": args.agent_slots,
+        "build": 1,
+        "test": args.test_slots,
+        "index": 1,
+    })
+
+    if args.metrics_port is not None:
+        metrics.add_collector(lambda: update_run_metrics(pipeline))
+        metrics.serve(args.metrics_port)
+    try:
+        exit_code = asyncio.run(run_construction(
+            pipeline, speculative_fixes=args.speculative, validation_jobs=args.validation_jobs
+        ))
+    finally:
+        pipeline.shutdown()
+    sys.exit(exit_code)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env uvrun
+# /// script
+# requires-python = ">=3.8"
+# dependencies = []
+# ///
+
+"""
+Speculative parallel fix attempts for a failing test.
+
+Launches K agent fix attempts at the same time, each in its own local git
+worktree created from a snapshot of the current working tree (including
+uncommitted and untracked files). Every attempt builds and runs the failing
+test independently, then re-runs the passing suite. The first attempt whose
+test passes without breaking any passing test is applied to the main working
+tree as a patch; the other attempts are cancelled and their processes killed.
+
+Usage from Python:
+    import speculative
+    won = await speculative.race_fixes(test_file, prompt, k=3, uv_exe=UV_EXE)
+"""
+
+import os
+import sys
+import shutil
+import signal
+import asyncio
+import subprocess
+import tempfile
+from pathlib import Path
+
+import tracing
+
+WORKTREES_DIR = Path('./tmp/worktrees')
+
+# Never snapshot generated or per-run directories into a worktree
+SNAPSHOT_EXCLUDES = [':(exclude)tmp', ':(exclude)reports', ':(exclude)release']
+
+
+def _git(args, cwd='.', env=None, input_text=None):
+    result = subprocess.run(
+        ['git'] + args, cwd=cwd, env=env, input=input_text,
+        capture_output=True, text=True, encoding='utf-8', errors='replace'
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"git {' '.join(args)} failed: {result.stderr.strip()}")
+    return result.stdout
+
+
+def is_git_repo():
+    """True if the current directory is inside a git work tree."""
+    try:
+        return _git(['rev-parse', '--is-inside-work-tree']).strip() == 'true'
+    except (RuntimeError, OSError):
+        return False
+
+
+def snapshot_commit(cwd='.', parent=None):
+    """
+    Commit the full working tree state (tracked, modified and untracked files)
+    without touching the real index, HEAD or any branch. Returns the commit id.
+    """
+    fd, index_path = tempfile.mkstemp(prefix='snapshot-index-')
+    os.close(fd)
+    os.unlink(index_path)  # git refuses an empty index file; it creates its own
+    env = dict(os.environ, GIT_INDEX_FILE=index_path)
+    # Snapshot commits are internal; don't require a configured git identity
+    for key, value in (('GIT_AUTHOR_NAME', 'software-construction'), ('GIT_AUTHOR_EMAIL', 'software-construction@localhost')):
+        env.setdefault(key, value)
+        env.setdefault(key.replace('AUTHOR', 'COMMITTER'), value)
+    try:
+        _git(['add', '-A', '--', '.'] + SNAPSHOT_EXCLUDES, cwd=cwd, env=env)
+        tree = _git(['write-tree'], cwd=cwd, env=env).strip()
+        if parent is None:
+            try:
+                parent = _git(['rev-parse', '--verify', 'HEAD'], cwd=cwd).strip()
+            except RuntimeError:
+                parent = None  # Repository without commits yet
+        commit_args = ['commit-tree', tree, '-m', 'speculative fix snapshot']
+        if parent:
+            commit_args += ['-p', parent]
+        return _git(commit_args, cwd=cwd, env=env).strip()
+    finally:
+        if os.path.exists(index_path):
+            os.unlink(index_path)
+
+
+def add_worktree(path, commit):
+    """Create a detached worktree at path checked out at commit."""
+    path = Path(path)
+    if path.exists():
+        remove_worktree(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _git(['worktree', 'add', '--detach', str(path), commit])
+
+
+def remove_worktree(path):
+    """Remove a worktree and its directory, ignoring failures."""
+    try:
+        _git(['worktree', 'remove', '--force', str(path)])
+    except RuntimeError:
+        shutil.rmtree(path, ignore_errors=True)
+        try:
+            _git(['worktree', 'prune'])
+        except RuntimeError:
+            pass
+
+
+def apply_worktree_changes(worktree, base_commit):
+    """Apply everything the worktree changed relative to base_commit to the main working tree."""
+    result_commit = snapshot_commit(cwd=worktree, parent=base_commit)
+    patch = _git(['diff', '--binary', base_commit, result_commit])
+    if patch.strip():
+        _git(['apply', '--binary', '--whitespace=nowarn', '-'], input_text=patch)
+
+
+def _kill_process_tree(process):
+    """Kill a child started by _spawn along with everything it launched."""
+    if process.returncode is not None:
+        return
+    try:
+        if sys.platform == 'win32':
+            subprocess.run(['taskkill', '/T', '/F', '/PID', str(process.pid)], capture_output=True)
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+async def _in_thread(fn, *args):
+    """Run a blocking git helper in the default executor, so the attempts keep racing meanwhile."""
+    return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+
+async def _spawn(cmd, cwd, input_text=None):
+    """Run cmd in its own process group. Returns (returncode, output); cancellation kills the tree."""
+    kwargs = {}
+    if sys.platform == 'win32':
+        kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs['start_new_session'] = True
+    process = await asyncio.create_subprocess_exec(
+        *cmd, cwd=str(cwd),
+        stdin=asyncio.subprocess.PIPE if input_text is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+        **kwargs
+    )
+    try:
+        stdout, _ = await process.communicate(input_text.encode('utf-8') if input_text is not None else None)
+    except asyncio.CancelledError:
+        _kill_process_tree(process)
+        await process.wait()
+        raise
+    return process.returncode, stdout.decode('utf-8', errors='replace')
+
+
+async def _attempt(index, worktree, test_file, prompt, uv_exe, agent_slot):
+    """
+    One fix attempt inside a worktree. Returns True if the fix is safe to merge.
+
+    The agent runs as its own prompt_agentic_coder.py process in the worktree,
+    holding agent_slot while it runs. Its spans reach the run's trace (the
+    trace file is inherited through PIPELINE_TRACE_FILE), but it bypasses this
+    process's Prometheus metrics and concurrency limit, and its agent_metrics
+    row and agent_limiter lease go to the worktree's own ./.cache.
+    """
+    label = f"[speculative {index}]"
+    scripts = Path(worktree) / 'the-system' / 'scripts'
+
+    agent_cmd = [uv_exe, 'run', '--script', str(scripts / 'prompt_agentic_coder.py')]
+    async with agent_slot:
+        print(f"{label} → Running agent fix in {worktree}", flush=True)
+        returncode, _ = await _spawn(agent_cmd, worktree, input_text=prompt)
+    if returncode != 0:
+        print(f"{label} ✗ Agent exited with {returncode}", flush=True)
+        return False
+
+    if not (Path(worktree) / test_file).exists():
+        # The agent may have moved the test to passing itself
+        test_file = str(Path('tests') / 'passing' / Path(test_file).name)
+        if not (Path(worktree) / test_file).exists():
+            print(f"{label} ✗ Test file no longer exists", flush=True)
+            return False
+
+    print(f"{label} → Building and running {test_file}", flush=True)
+    returncode, _ = await _spawn([uv_exe, 'run', '--script', str(scripts / 'test.py'), test_file], worktree)
+    if returncode != 0:
+        print(f"{label} ✗ Test still fails (exit code {returncode})", flush=True)
+        return False
+
+    if any((Path(worktree) / 'tests' / 'passing').glob('*test_*.py')):
+        print(f"{label} → Checking passing tests for regressions", flush=True)
+        returncode, _ = await _spawn(
+            [uv_exe, 'run', '--script', str(scripts / 'test.py'), '--skip-build', '--passing', '--reruns', '2'], worktree
+        )
+        if returncode != 0:
+            print(f"{label} ✗ Fix breaks passing tests", flush=True)
+            return False
+
+    print(f"{label} ✓ Test passes", flush=True)
+    return True
+
+
+async def _traced_attempt(index, worktree, test_file, prompt, uv_exe, agent_slot):
+    with tracing.async_span(f"speculative attempt {index}", cat="work_item", test=test_file):
+        return await _attempt(index, worktree, test_file, prompt, uv_exe, agent_slot)
+
+
+async def race_fixes(test_file, prompt, k, uv_exe, agent_slot=None):
+    """
+    Run k fix attempts in parallel worktrees and merge the first one that passes.
+
+    Args:
+        test_file: Path of the failing test relative to the project root
+        prompt: The FIX_FAILING_TEST prompt to give every attempt
+        k: Number of concurrent attempts
+        uv_exe: Path to uv used to run the agent wrapper and test.py
+        agent_slot: Async context manager (e.g. a Pipeline.slot("agent")
+            semaphore) held by each attempt while its agent runs; by default
+            all k agents run at once
+
+    Returns:
+        bool: True if a winning attempt was applied to the main working tree
+    """
+    base_commit = await _in_thread(snapshot_commit)
+    test_name = Path(test_file).stem
+    worktrees = [WORKTREES_DIR / f"{test_name}-{i}" for i in range(1, k + 1)]
+
+    print(f"→ Launching {k} speculative fix attempts for {test_file}", flush=True)
+    for worktree in worktrees:
+        # One at a time: concurrent `git worktree add` runs contend for the same locks
+        await _in_thread(add_worktree, worktree, base_commit)
+
+    if agent_slot is None:
+        agent_slot = asyncio.Semaphore(k)
+    tasks = {
+        asyncio.ensure_future(_traced_attempt(i, worktree.resolve(), test_file, prompt, uv_exe, agent_slot)): worktree
+        for i, worktree in enumerate(worktrees, start=1)
+    }
+    winner = None
+    try:
+        pending = set(tasks)
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and task.result():
+                    winner = tasks[task]
+                    break
+                if task.exception() is not None:
+                    print(f"✗ Speculative attempt in {tasks[task]} failed: {task.exception()}", flush=True)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    try:
+        if winner is not None:
+            print(f"✓ Applying winning fix from {winner}", flush=True)
+            await _in_thread(apply_worktree_changes, winner, base_commit)
+    finally:
+        # One executor job: once started it finishes even if this task is cancelled
+        await _in_thread(lambda: [remove_worktree(worktree) for worktree in worktrees])
+
+    return winner is not None
@@ -0,0 +1,569 @@
+#!/usr/bin/env uvrun
+# /// script
+# requires-python = ">=3.8"
+# dependencies = []
+# ///
+
+"""
+Event-driven supervision of test processes for test.py.
+
+A child is started as the leader of a new process group. Its output pipes and
+its exit are both event-loop events, so supervising a test costs no timer
+wakeups no matter how many run at once:
+  - POSIX: pipes are read with loop.connect_read_pipe(); exit is a pidfd
+    readable event (Linux), falling back to one thread blocked in os.wait4().
+  - Windows: one blocked reader thread per pipe and one blocked waiter thread
+    hand results to the loop; nothing polls.
+
+The deadline is a single loop timer. On timeout the whole process group is
+terminated, then killed; after a normal exit, anything the test left running
+in its group is killed too, so orphaned children never linger. Group kills only
+ever target a group known to be ours:
+  - POSIX: leftovers are killed when the leader has exited but before it is
+    reaped, while its zombie still reserves the pid and group id; once reaped,
+    kill_tree() does nothing. (Without pidfd or waitid, e.g. macOS before
+    Python 3.13, the leader is reaped blindly and leftovers aren't killed.)
+  - Windows: the child is put in a Job Object, and kill_tree() terminates the
+    job rather than a PID that may have been reused.
+
+Output is streamed to a file as it arrives (OutputCapture); only the last
+lines are kept in memory, so memory per test stays constant however much the
+test prints. Past a byte cap the file stops growing and gets a truncation
+marker followed by the final lines.
+
+Resource usage of each run is left in capture.resources: wall time; user and
+system CPU from wait4 (the leader plus the descendants that were waited for);
+peak_rss_kb, the largest single process among those, not the tree's combined
+footprint; and on Linux children_sampled, the processes seen in the group by
+a /proc scan every 0.5s. Both of the last two are lower bounds: a child that
+was never waited for, or that lived between two scans, isn't counted.
+
+Usage from Python:
+    capture = supervisor.OutputCapture('./reports/x.txt')
+    returncode, capture = await supervisor.supervise(cmd_list, timeout=120, env=env, capture=capture)
+    print(capture.text())
+"""
+
+import os
+import sys
+import time
+import signal
+import asyncio
+import threading
+import subprocess
+from collections import deque
+
+TIMEOUT_EXIT_CODE = 124
+
+DEFAULT_TAIL_LINES = 200              # Lines kept in memory for the console and fix prompts
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024  # Output written to the file before truncating
+MAX_LINE_BYTES = 64 * 1024            # Longer lines are split so no single line grows unbounded
+
+
+def process_group_kwargs():
+    """Popen arguments that start the child as the leader of a new process group."""
+    if sys.platform == 'win32':
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {'start_new_session': True}
+
+
+def kill_process_tree(pid, sig=None):
+    """Kill the process group led by pid (POSIX) or the process tree under pid (Windows)."""
+    if sys.platform == 'win32':
+        subprocess.run(['taskkill', '/T', '/F', '/PID', str(pid)], capture_output=True)
+        return
+    try:
+        os.killpg(pid, sig if sig is not None else signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class _JobObject:
+    """A Windows Job Object: terminating it ends the child and everything it started."""
+
+    def __init__(self):
+        import ctypes
+        from ctypes import wintypes
+        self._ctypes = ctypes
+        self._kernel32 = kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        kernel32.CreateJobObjectW.argtypes = (wintypes.LPVOID, wintypes.LPCWSTR)
+        kernel32.CreateJobObjectW.restype = wintypes.HANDLE
+        kernel32.AssignProcessToJobObject.argtypes = (wintypes.HANDLE, wintypes.HANDLE)
+        kernel32.AssignProcessToJobObject.restype = wintypes.BOOL
+        kernel32.TerminateJobObject.argtypes = (wintypes.HANDLE, wintypes.UINT)
+        kernel32.TerminateJobObject.restype = wintypes.BOOL
+        kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+        kernel32.CloseHandle.restype = wintypes.BOOL
+        self.handle = kernel32.CreateJobObjectW(None, None)
+        if not self.handle:
+            raise ctypes.WinError(ctypes.get_last_error())
+
+    def assign(self, process_handle):
+        if not self._kernel32.AssignProcessToJobObject(self.handle, int(process_handle)):
+            error = self._ctypes.WinError(self._ctypes.get_last_error())
+            self.close()
+            raise error
+
+    def terminate(self):
+        if self.handle:
+            self._kernel32.TerminateJobObject(self.handle, 1)
+
+    def close(self):
+        if self.handle:
+            self._kernel32.CloseHandle(self.handle)
+            self.handle = None
+
+
+def _exit_code(status):
+    """Convert a wait status to a Popen-style return code (negative for signals)."""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def rusage_dict(rusage):
+    """CPU seconds and peak RSS (KB) from a wait4() rusage, including reaped descendants."""
+    maxrss = rusage.ru_maxrss
+    if sys.platform == 'darwin':
+        maxrss //= 1024  # Bytes on macOS, KB elsewhere
+    return {'user_seconds': round(rusage.ru_utime, 3), 'sys_seconds': round(rusage.ru_stime, 3), 'peak_rss_kb': maxrss}
+
+
+class _GroupSampler:
+    """
+    Records which processes appear in watched process groups (Linux).
+
+    One /proc scan per SAMPLE_INTERVAL serves every running test, and only
+    while at least one group is watched. Children that live shorter than the
+    interval can be missed, so counts are a lower bound.
+    """
+
+    SAMPLE_INTERVAL = 0.5
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.groups = {}
+        self._timer = None
+
+    def watch(self, pgid):
+        self.groups[pgid] = set()
+        self.scan()
+        if self._timer is None:
+            self._timer = self.loop.call_later(self.SAMPLE_INTERVAL, self._tick)
+
+    def unwatch(self, pgid):
+        """Stop watching; returns how many processes other than the leader were seen."""
+        self.scan()
+        seen = self.groups.pop(pgid, set())
+        if not self.groups and self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return len(seen - {pgid})
+
+    def _tick(self):
+        self.scan()
+        self._timer = self.loop.call_later(self.SAMPLE_INTERVAL, self._tick) if self.groups else None
+
+    def scan(self):
+        if not self.groups:
+            return
+        try:
+            entries = os.listdir('/proc')
+        except OSError:
+            return
+        for name in entries:
+            if not name.isdigit():
+                continue
+            try:
+                with open(f'/proc/{name}/stat', 'rb') as f:
+                    stat = f.read()
+            except OSError:
+                continue
+            # Fields after the parenthesised command name: state, ppid, pgrp, ...
+            fields = stat[stat.rfind(b')') + 2:].split()
+            if len(fields) > 2:
+                seen = self.groups.get(int(fields[2]))
+                if seen is not None:
+                    seen.add(int(name))
+
+
+_samplers = {}
+
+
+def _group_sampler():
+    """The /proc sampler for the running loop, or None where /proc is unavailable."""
+    if not sys.platform.startswith('linux'):
+        return None
+    loop = asyncio.get_running_loop()
+    sampler = _samplers.get(id(loop))
+    if sampler is None or sampler.loop is not loop:
+        sampler = _samplers[id(loop)] = _GroupSampler(loop)
+    return sampler
+
+
+class _LineSplitter:
+    """Turns chunks of bytes into complete decoded lines."""
+
+    def __init__(self, on_line, prefix=""):
+        self.on_line = on_line
+        self.prefix = prefix
+        self._pending = b''
+
+    def feed(self, data):
+        self._pending += data
+        *lines, self._pending = self._pending.split(b'\n')
+        for line in lines:
+            self.on_line(self.prefix + line.decode('utf-8', errors='replace') + '\n')
+        while len(self._pending) > MAX_LINE_BYTES:
+            piece, self._pending = self._pending[:MAX_LINE_BYTES], self._pending[MAX_LINE_BYTES:]
+            self.on_line(self.prefix + piece.decode('utf-8', errors='replace') + '\n')
+
+    def close(self):
+        if self._pending:
+            self.on_line(self.prefix + self._pending.decode('utf-8', errors='replace'))
+            self._pending = b''
+
+
+class OutputCapture:
+    """
+    Collects a child's output lines: streamed to path (when given) as they
+    arrive, with only the last tail_lines kept in memory.
+
+    Once max_bytes have been written, further lines are only counted; close()
+    then appends a truncation marker and the final lines, so the end of the
+    output (usually where the failure is) is always in the file.
+
+    final_path is where the file will be once the caller has finished it (e.g.
+    test.py renames <report>.part); text() points readers there.
+    """
+
+    def __init__(self, path=None, tail_lines=DEFAULT_TAIL_LINES, max_bytes=DEFAULT_MAX_BYTES, final_path=None):
+        self.path = path
+        self.final_path = final_path or path
+        self.max_bytes = max_bytes
+        self.tail = deque(maxlen=tail_lines)
+        self.line_count = 0
+        self.bytes_written = 0
+        self.dropped_lines = 0
+        self.dropped_bytes = 0
+        self.resources = {}  # Filled in by supervise()
+        self._file = open(path, 'a', encoding='utf-8', newline='') if path else None
+
+    def write(self, line):
+        self.line_count += 1
+        self.tail.append(line)
+        size = len(line) if line.isascii() else len(line.encode('utf-8'))
+        if self.bytes_written + size > self.max_bytes:
+            self.dropped_lines += 1
+            self.dropped_bytes += size
+            return
+        self.bytes_written += size
+        if self._file is not None:
+            self._file.write(line)
+
+    @property
+    def truncated(self):
+        return self.dropped_lines > 0
+
+    def close(self):
+        """Finish the file, adding the truncation marker and final lines if needed."""
+        if self._file is None:
+            return
+        if self.truncated:
+            final_lines = list(self.tail)[-self.dropped_lines:]
+            self._file.write(
+                f"\n[TRUNCATED] Output exceeded {self.max_bytes} bytes: {self.dropped_lines} lines "
+                f"({self.dropped_bytes} bytes) not written. Last {len(final_lines)} lines:\n"
+            )
+            self._file.writelines(final_lines)
+        self._file.close()
+        self._file = None
+
+    def text(self):
+        """The last lines of output, noting how many earlier lines were left out."""
+        omitted = self.line_count - len(self.tail)
+        prefix = ""
+        if omitted > 0:
+            where = f" (see {self.final_path})" if self.final_path else ""
+            prefix = f"[... {omitted} earlier lines omitted{where} ...]\n"
+        return prefix + ''.join(self.tail)
+
+
+class _PipeProtocol(asyncio.Protocol):
+    def __init__(self, splitter, done):
+        self.splitter = splitter
+        self.done = done
+
+    def data_received(self, data):
+        self.splitter.feed(data)
+
+    def connection_lost(self, exc):
+        self.splitter.close()
+        if not self.done.done():
+            self.done.set_result(None)
+
+
+async def watch_pipe(stream, on_line, prefix=""):
+    """
+    Deliver lines read from a pipe (a binary file object) to on_line on the
+    event loop (POSIX). Returns a future that completes when the pipe closes.
+    """
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+    splitter = _LineSplitter(on_line, prefix)
+    await loop.connect_read_pipe(lambda: _PipeProtocol(splitter, done), stream)
+    return done
+
+
+class Child:
+    """A running child process whose output lines and exit are delivered to the event loop."""
+
+    def __init__(self, process, on_line):
+        self.process = process
+        self.pid = process.pid
+        self.on_line = on_line
+        self.returncode = None
+        self.rusage = None
+        self._loop = asyncio.get_running_loop()
+        self._exited = self._loop.create_future()
+        self.pipes_closed = []
+        self._job = None
+        self._reap_lock = threading.Lock()  # Reaping vs. kill_tree() (POSIX)
+        self._reaped = False
+
+    @classmethod
+    async def spawn(cls, cmd_list, on_line, env=None, cwd=None, sandbox=None):
+        kwargs = process_group_kwargs()
+        if sandbox is not None:
+            kwargs['preexec_fn'] = sandbox.preexec  # rlimits and cgroup (sandbox.TestSandbox)
+        process = subprocess.Popen(
+            cmd_list,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=env,
+            cwd=cwd,
+            **kwargs
+        )
+        child = cls(process, on_line)
+        if sys.platform == 'win32':
+            try:
+                job = _JobObject()
+                job.assign(process._handle)
+                child._job = job
+            except OSError:
+                pass  # kill_tree() falls back to taskkill while the child runs
+        await child._watch()
+        return child
+
+    async def _watch(self):
+        streams = [(self.process.stdout, ""), (self.process.stderr, "[stderr] ")]
+        if sys.platform == 'win32':
+            for stream, prefix in streams:
+                self.pipes_closed.append(self._read_in_thread(stream, prefix))
+            threading.Thread(target=self._wait_in_thread, daemon=True).start()
+            return
+
+        for stream, prefix in streams:
+            self.pipes_closed.append(await watch_pipe(stream, self.on_line, prefix))
+
+        pidfd = None
+        if hasattr(os, 'pidfd_open'):
+            try:
+                pidfd = os.pidfd_open(self.pid)
+            except OSError:
+                pidfd = None
+        if pidfd is not None:
+            def on_exit():
+                # Readable once the leader has exited; it stays a zombie until reaped
+                self._loop.remove_reader(pidfd)
+                os.close(pidfd)
+                self._kill_leftovers_and_reap()
+            self._loop.add_reader(pidfd, on_exit)
+        elif hasattr(os, 'waitid'):
+            threading.Thread(target=self._wait_exit_in_thread, daemon=True).start()
+        else:
+            threading.Thread(target=self._reap_blind_in_thread, daemon=True).start()
+
+    def _wait_exit_in_thread(self):
+        """Block until the leader exits, without reaping it."""
+        try:
+            os.waitid(os.P_PID, self.pid, os.WEXITED | os.WNOWAIT)
+        except ChildProcessError:
+            pass
+        self._kill_leftovers_and_reap()
+
+    def _kill_leftovers_and_reap(self):
+        """
+        The leader has exited: kill what it left in its group, then wait4() it.
+        The unreaped zombie keeps the pid and group id from being reused, so the
+        kill can't reach another process.
+        """
+        with self._reap_lock:
+            kill_process_tree(self.pid)
+            try:
+                _, status, rusage = os.wait4(self.pid, 0)
+            except ChildProcessError:
+                status = rusage = None
+            self._reaped = True
+        if status is None:
+            self._set_exit(self.process.poll() if self.process.returncode is None else self.process.returncode, None)
+        else:
+            self._set_exit(_exit_code(status), rusage)
+
+    def _reap_blind_in_thread(self):
+        """wait4() the child where its exit can't be observed before reaping it."""
+        try:
+            _, status, rusage = os.wait4(self.pid, 0)
+        except ChildProcessError:
+            status = rusage = None
+        with self._reap_lock:
+            self._reaped = True
+        if status is None:
+            self._set_exit(self.process.poll() if self.process.returncode is None else self.process.returncode, None)
+        else:
+            self._set_exit(_exit_code(status), rusage)
+
+    def _set_exit(self, returncode, rusage):
+        def deliver():
+            if not self._exited.done():
+                self.returncode = returncode
+                self.process.returncode = returncode  # Keep the Popen object consistent
+                self.rusage = rusage_dict(rusage) if rusage is not None else None
+                self._exited.set_result((returncode, self.rusage))
+        # Called on the loop (pidfd) or from the blocked wait4() thread
+        self._loop.call_soon_threadsafe(deliver)
+
+    def _read_in_thread(self, stream, prefix):
+        done = self._loop.create_future()
+
+        def deliver(line):
+            self._loop.call_soon_threadsafe(self.on_line, line)
+
+        def read():
+            splitter = _LineSplitter(deliver, prefix)
+            try:
+                for chunk in iter(lambda: stream.read1(65536), b''):
+                    splitter.feed(chunk)
+            except (OSError, ValueError) as e:
+                deliver(f"\n[ERROR reading stream: {e}]\n")
+            splitter.close()
+            self._loop.call_soon_threadsafe(lambda: done.done() or done.set_result(None))
+
+        threading.Thread(target=read, daemon=True).start()
+        return done
+
+    def _wait_in_thread(self):
+        self._set_exit(self.process.wait(), None)
+
+    async def wait(self):
+        """Wait for the child to exit. Returns (returncode, rusage or None)."""
+        return await asyncio.shield(self._exited)
+
+    def kill_tree(self, sig=None):
+        """
+        Signal the child's process group (POSIX) or end its Job Object
+        (Windows). Once the leader has been reaped its pid may belong to an
+        unrelated process, so this does nothing then.
+        """
+        if sys.platform == 'win32':
+            if self._job is not None:
+                self._job.terminate()
+            elif self.process.poll() is None:
+                kill_process_tree(self.pid)
+            return
+        with self._reap_lock:
+            if not self._reaped:
+                kill_process_tree(self.pid, sig)
+
+    def close(self):
+        if self._job is not None:
+            self._job.close()
+
+
+async def supervise(cmd_list, timeout, env=None, cwd=None, capture=None, spawn=None, sandbox=None):
+    """
+    Run a child in its own process group, streaming its output into capture
+    (an in-memory OutputCapture if none is given).
+
+    spawn(cmd_list, on_line, env=, cwd=, sandbox=) starts the child; it
+    defaults to Child.spawn and may return any object with Child's pid,
+    pipes_closed, returncode, wait(), kill_tree() and close() (e.g. a
+    fork_server.ForkedChild).
+
+    sandbox (a sandbox.TestSandbox) limits the child's resources; limits that
+    killed or failed the test are noted as [LIMIT] lines at the end of the
+    output and in capture.resources['limits_hit'].
+
+    Returns (returncode, capture); returncode is 124 on timeout. The capture
+    is closed before returning, with the run's resource usage in
+    capture.resources (CPU and RSS are absent where wait4 is unavailable).
+    """
+    if capture is None:
+        capture = OutputCapture()
+    write = capture.write
+    if sandbox is not None:
+        def write(line):
+            capture.write(line)
+            sandbox.observe(line)
+    started = time.monotonic()
+    try:
+        child = await (spawn or Child.spawn)(cmd_list, write, env=env, cwd=cwd, sandbox=sandbox)
+    except BaseException:
+        capture.close()
+        raise
+    sampler = _group_sampler()
+    if sampler is not None:
+        sampler.watch(child.pid)
+
+    timed_out = False
+    try:
+        await asyncio.wait_for(child.wait(), timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+        write(f"\n{'=' * 60}\n")
+        write(f"[TIMEOUT] Process exceeded {timeout} seconds\n")
+        write(f"{'=' * 60}\n")
+        write(f"[KILLING PROCESS] Attempting to terminate process group of PID {child.pid}...\n")
+
+        # Try graceful termination first
+        try:
+            child.kill_tree(None if sys.platform == 'win32' else signal.SIGTERM)
+            try:
+                await asyncio.wait_for(child.wait(), 5)
+                write(f"[KILLED] Process terminated gracefully\n")
+            except asyncio.TimeoutError:
+                # Force kill if termination didn't work
+                child.kill_tree()
+                await asyncio.wait_for(child.wait(), 5)
+                write(f"[KILLED] Process force-killed\n")
+        except Exception as e:
+            write(f"[ERROR] Failed to kill process: {e}\n")
+
+        write(f"\n[DIAGNOSTIC] Last output above shows where the test hung\n")
+
+    wall_seconds = time.monotonic() - started
+    children = sampler.unwatch(child.pid) if sampler is not None else None
+
+    # Don't let children the test forgot to clean up linger (or hold our pipes open).
+    # On POSIX they were killed before the leader was reaped; this is a no-op now.
+    child.kill_tree()
+    child.close()
+    if sandbox is not None:
+        sandbox.cleanup()
+
+    # Give the pipes a moment to drain
+    await asyncio.wait(child.pipes_closed, timeout=1)
+
+    returncode = TIMEOUT_EXIT_CODE if timed_out else child.returncode
+    resources = dict({'wall_seconds': round(wall_seconds, 3)}, **(child.rusage or {}))
+    resources['children_sampled'] = children
+    if sandbox is not None:
+        reasons = sandbox.limits_hit(child.returncode if child.returncode is not None else returncode, resources)
+        for reason in reasons:
+            write(f"[LIMIT] {reason}\n")
+        resources['limits_hit'] = [reason.split(':')[0] for reason in reasons]
+
+    capture.close()
+    capture.resources = resources
+    return returncode, capture
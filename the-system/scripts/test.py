@@ -14,8 +14,9 @@ import os
 import subprocess
 import argparse
 import time
-import threading
-import signal
+import shutil
+import json
+import asyncio
 from pathlib import Path
 from datetime import datetime
 
@@ -27,18 +28,34 @@ os.chdir(project_root)
 # Path to bundled uv.exe
 UV_EXE = str(project_root / 'the-system' / 'bin' / 'uv.exe')
 
+# Shared tracing (spans go to the orchestrator's trace file when one is active)
+sys.path.insert(0, str(script_dir))
+import tracing
+import run_history
+import supervisor
+import fork_server
+import sandbox
+
 # Create reports directory
 reports_dir = Path('./reports')
 reports_dir.mkdir(exist_ok=True)
 
-def run_command(cmd, description, capture_output=False, test_filename=None, timeout=3600):
-    """Run a command and return exit code, optionally capturing output.
+# Each test gets its own scratch directory, passed in this environment variable
+TEST_TMP_ENV = 'TEST_TMP_DIR'
+test_tmp_root = Path('./tmp/tests')
 
-    Uses Popen with real-time output capture and proper process killing on timeout.
-    """
+def print_banner(description):
     print(f"\n{'=' * 60}")
     print(f"{description}")
     print(f"{'=' * 60}\n")
+
+def run_command(cmd, description, capture_output=False, test_filename=None, timeout=3600, env=None, banner=True):
+    """Run a command and return exit code, optionally capturing output.
+
+    Uses Popen with real-time output capture and proper process killing on timeout.
+    """
+    if banner:
+        print_banner(description)
     # Convert command string to list for shell=False (better Windows compatibility)
     import shlex
     if isinstance(cmd, str):
@@ -49,101 +66,243 @@ def run_command(cmd, description, capture_output=False, test_filename=None, time
     if not capture_output:
         # For non-captured output (like build), use simple subprocess.run
         try:
-            result = subprocess.run(cmd_list, shell=False, timeout=timeout)
+            with tracing.span(description, cat="build"):
+                result = subprocess.run(cmd_list, shell=False, timeout=timeout)
             return result.returncode
         except subprocess.TimeoutExpired:
             print(f"\nCommand timed out after {timeout} seconds\n")
             return 124
 
-    # For captured output, use Popen with real-time streaming and proper kill
-    process = subprocess.Popen(
-        cmd_list,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-        bufsize=1,  # Line buffered
+    # Captured output is supervised on an event loop: no polling, exact deadline
+    returncode, capture = asyncio.run(run_captured(cmd_list, description, test_filename, timeout, env))
+    return returncode, capture.text()
+
+async def run_captured(cmd_list, description, test_filename=None, timeout=3600, env=None, capture=None, spawn=None,
+                       test_sandbox=None):
+    """Run cmd_list capturing stdout/stderr with a timeout. Returns (returncode, capture)."""
+    with tracing.async_span(description, cat="test", test=test_filename):
+        return await supervisor.supervise(cmd_list, timeout, env, capture=capture, spawn=spawn, sandbox=test_sandbox)
+
+def make_test_tmp_dir(test_file):
+    """Create an empty scratch directory for one test and return its absolute path."""
+    tmp_dir = (test_tmp_root / Path(test_file).stem).resolve()
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    return tmp_dir
+
+async def run_test(test_file, timeout=None, banner=True, tail_lines=supervisor.DEFAULT_TAIL_LINES,
+                   max_bytes=supervisor.DEFAULT_MAX_BYTES, fork_server=None, limits=None):
+    """Run one test with a timeout from its duration history, and record the run.
+
+    The test gets its own scratch directory in $TEST_TMP_DIR. Its output streams
+    into the report file as it arrives. With a fork_server the test is forked
+    from that warm server instead of launched through uv. limits (a
+    sandbox.Sandbox) caps its CPU, memory, files and processes. Returns
+    (exit_code, capture).
+    """
+    if timeout is None:
+        timeout = run_history.timeout_for(test_file)
+    env = dict(os.environ)
+    env[TEST_TMP_ENV] = str(make_test_tmp_dir(test_file))
+    description = f'Running test: {test_file} (timeout: {timeout}s)'
+    if banner:
+        print_banner(description)
+    capture = start_report(test_file, tail_lines, max_bytes)
+    started_at = time.time()
+    exit_code, capture = await run_captured(
+        [UV_EXE, 'run', '--script', test_file], description, test_file, timeout, env, capture,
+        spawn=fork_server.spawner(test_file) if fork_server else None,
+        test_sandbox=limits.for_test(test_file) if limits is not None else None
     )
+    if capture.resources.get('limits_hit'):
+        print(f"⚠ {Path(test_file).name} was stopped by resource limits: {', '.join(capture.resources['limits_hit'])}")
+    duration = time.time() - started_at
+    status = "TIMEOUT" if exit_code == 124 else ("PASS" if exit_code == 0 else "FAIL")
+    run_history.record_run(test_file, duration, status, started_at=started_at)
+
+    slower = run_history.regression(test_file)
+    if slower:
+        print(f"⚠ {Path(test_file).name} is getting slower: median {slower[1]:.1f}s → {slower[0]:.1f}s over recent runs")
+    return exit_code, capture
+
+async def run_test_with_reruns(test_file, reruns=0, **kwargs):
+    """Run a test, re-running a failure up to reruns times, and record its verdict.
+
+    Returns (exit_code, capture, verdict). verdict is PASS, FAIL, or FLAKY when a
+    failure passed on a re-run (exit_code is then 0). Each failed attempt keeps
+    its own report. Tests that have never passed are not re-run: they are
+    unimplemented, not flaky.
+    """
+    exit_code, capture = await run_test(test_file, **kwargs)
+    attempts = 1
+    if exit_code != 0 and reruns > 0 and run_history.has_passed(test_file):
+        while exit_code != 0 and attempts <= reruns:
+            report_path = write_report(test_file, exit_code, capture, announce=False)
+            print(f"↻ {test_file} failed (report: {report_path}); re-running ({attempts}/{reruns})")
+            exit_code, capture = await run_test(test_file, **kwargs)
+            attempts += 1
+        verdict = "FLAKY" if exit_code == 0 else "FAIL"
+    else:
+        verdict = "PASS" if exit_code == 0 else "FAIL"
+    run_history.record_verdict(test_file, verdict, attempts)
+    if verdict == "FLAKY":
+        print(f"⚠ {test_file} passed only on attempt {attempts}")
+        # Let parent scripts tell a flaky pass from a clean one
+        print(f"flaky: {test_file}")
+    return exit_code, capture, verdict
+
+async def run_tests(test_files, jobs, timeout, finish, use_fork_servers=False, reruns=0, **run_options):
+    """Run test files with up to jobs at once, calling finish(test_file, exit_code, capture, verdict) for each."""
+    semaphore = asyncio.Semaphore(max(1, jobs))
+    servers = {}
+    if use_fork_servers:
+        servers = await fork_server.start_servers(test_files, UV_EXE)
+
+    async def run_one(test_file):
+        async with semaphore:
+            exit_code, capture, verdict = await run_test_with_reruns(
+                test_file, reruns, timeout=timeout, banner=jobs <= 1, fork_server=servers.get(test_file), **run_options
+            )
+        if jobs > 1:
+            print_banner(f'Finished test: {test_file}')
+        finish(test_file, exit_code, capture, verdict)
 
-    output_lines = []
-    start_time = time.time()
-    timed_out = False
+    try:
+        await asyncio.gather(*(run_one(test_file) for test_file in test_files))
+    finally:
+        await fork_server.stop_servers(servers.values())
 
-    def read_stream(stream, output_list, prefix=""):
-        """Read from stream line by line and append to output_list."""
-        try:
-            for line in iter(stream.readline, ''):
-                if not line:
-                    break
-                output_list.append(prefix + line)
-        except Exception as e:
-            output_list.append(f"\n[ERROR reading stream: {e}]\n")
-
-    # Start threads to read stdout and stderr concurrently
-    stdout_thread = threading.Thread(target=read_stream, args=(process.stdout, output_lines))
-    stderr_thread = threading.Thread(target=read_stream, args=(process.stderr, output_lines, "[stderr] "))
-    stdout_thread.daemon = True
-    stderr_thread.daemon = True
-    stdout_thread.start()
-    stderr_thread.start()
-
-    # Monitor for timeout
-    while process.poll() is None:
-        elapsed = time.time() - start_time
-        if elapsed > timeout:
-            timed_out = True
-            output_lines.append(f"\n{'=' * 60}\n")
-            output_lines.append(f"[TIMEOUT] Process exceeded {timeout} seconds\n")
-            output_lines.append(f"{'=' * 60}\n")
-            output_lines.append(f"[KILLING PROCESS] Attempting to terminate PID {process.pid}...\n")
-
-            # Try graceful termination first
-            try:
-                process.terminate()
-                try:
-                    process.wait(timeout=5)
-                    output_lines.append(f"[KILLED] Process terminated gracefully\n")
-                except subprocess.TimeoutExpired:
-                    # Force kill if termination didn't work
-                    process.kill()
-                    process.wait(timeout=5)
-                    output_lines.append(f"[KILLED] Process force-killed\n")
-            except Exception as e:
-                output_lines.append(f"[ERROR] Failed to kill process: {e}\n")
-
-            output_lines.append(f"\n[DIAGNOSTIC] Last output above shows where the test hung\n")
-            break
-        time.sleep(0.1)  # Check every 100ms
-
-    # Wait for reading threads to finish (give them a moment to catch up)
-    stdout_thread.join(timeout=1)
-    stderr_thread.join(timeout=1)
-
-    # Get final return code
-    if timed_out:
-        returncode = 124
-    else:
-        returncode = process.returncode
+def estimate_durations(test_files):
+    """Expected seconds per test from run history.
 
-    output = ''.join(output_lines)
-    return returncode, output
+    Tests without history are assumed to be as slow as the slowest known test,
+    so they start early rather than becoming the straggler at the end.
+    """
+    known = {test_file: run_history.expected_duration(test_file) for test_file in test_files}
+    fallback = max((d for d in known.values() if d is not None), default=run_history.DEFAULT_DURATION)
+    return {test_file: fallback if d is None else d for test_file, d in known.items()}
 
-def write_report(test_filename, exit_code, output):
-    """Write a timestamped report to the reports directory."""
+def longest_first(test_files, estimates):
+    """Order tests by expected duration, longest first (ties by name, so the order is stable)."""
+    return sorted(test_files, key=lambda test_file: (-estimates[test_file], test_file))
+
+def shard_tests(test_files, index, count, estimates):
+    """
+    Split tests into count time-balanced bins and return bin index (1-based).
+
+    Greedy longest-processing-time: each test, longest first, goes to the bin
+    with the least expected time so far. Nodes that share the same history
+    compute the same bins.
+    """
+    bins = [[] for _ in range(count)]
+    totals = [0.0] * count
+    for test_file in longest_first(test_files, estimates):
+        target = min(range(count), key=lambda i: (totals[i], i))
+        bins[target].append(test_file)
+        totals[target] += estimates[test_file]
+    return bins[index - 1], totals[index - 1]
+
+def _format_cell(value, fmt):
+    return "-" if value is None else format(value, fmt)
+
+def print_resource_table(rows):
+    """Print per-test resource usage, most expensive wall time first. rows: [(test_file, exit_code, resources)]."""
+    print(f"\n{'test':<45} {'result':<7} {'wall':>8} {'user':>8} {'sys':>8} {'peak RSS≥':>10} {'children≥':>9}")
+    for test_file, exit_code, resources in sorted(rows, key=lambda row: -(row[2].get('wall_seconds') or 0)):
+        peak_rss = resources.get('peak_rss_kb')
+        print(
+            f"{Path(test_file).name:<45} {'PASS' if exit_code == 0 else 'FAIL':<7} "
+            f"{_format_cell(resources.get('wall_seconds'), '.1f'):>7}s "
+            f"{_format_cell(resources.get('user_seconds'), '.1f'):>7}s "
+            f"{_format_cell(resources.get('sys_seconds'), '.1f'):>7}s "
+            f"{_format_cell(peak_rss / 1024 if peak_rss is not None else None, '.0f'):>7} MB "
+            f"{_format_cell(resources.get('children_sampled'), 'd'):>9}"
+        )
+    print("≥ lower bounds: peak RSS is the largest single process wait4 saw; children are "
+          "sampled from /proc every 0.5s, so short-lived ones can be missed")
+
+def make_sandbox(args):
+    """The sandbox.Sandbox for the --limit-*/--cgroup options, or None if none were given."""
+    requested = [args.limit_cpu, args.limit_memory, args.limit_files, args.limit_procs]
+    if not args.cgroup and all(value is None for value in requested):
+        return None
+    if not sandbox.available():
+        print("⚠ Resource limits are not supported on this platform; running tests without them")
+        return None
+    cgroup = None
+    if args.cgroup:
+        cgroup, reason = sandbox.CgroupParent.create()
+        if cgroup is None:
+            print(f"⚠ No cgroup for tests ({reason}); using rlimits only")
+    return sandbox.Sandbox(
+        cpu_seconds=args.limit_cpu, memory_mb=args.limit_memory, open_files=args.limit_files,
+        processes=args.limit_procs, cgroup=cgroup, cgroup_cpus=args.cgroup_cpus
+    )
+
+def parse_shard(value):
+    """argparse type for --shard i/n."""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/n, got {value!r}")
+    if count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard {value!r} out of range (need 1 <= i <= n)")
+    return index, count
+
+# Placeholder status in a report that is still being written; same width as PASS/FAIL
+PENDING_STATUS = "...."
+
+# Second report line: "resources: {json}", padded to a fixed width so it can be
+# filled in place once the test has finished
+RESOURCES_PREFIX = "resources: "
+RESOURCES_WIDTH = 200
+
+def resources_line(resources):
+    """The fixed-width resources header line for a report."""
+    text = json.dumps(resources, separators=(',', ':'), sort_keys=True)
+    if len(RESOURCES_PREFIX) + len(text) > RESOURCES_WIDTH:
+        text = json.dumps({'wall_seconds': resources.get('wall_seconds')})
+    return f"{RESOURCES_PREFIX}{text}".ljust(RESOURCES_WIDTH) + "\n"
+
+def start_report(test_filename, tail_lines=supervisor.DEFAULT_TAIL_LINES, max_bytes=supervisor.DEFAULT_MAX_BYTES):
+    """Start a timestamped report (as <report>.part) that test output streams into."""
     timestamp = datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
-    status = "PASS" if exit_code == 0 else "FAIL"
 
     # Extract just the filename without path for the report
     test_name = Path(test_filename).name
 
-    report_name = f"{timestamp}_{test_name}.txt"
-    report_path = reports_dir / report_name
+    part_path = reports_dir / f"{timestamp}_{test_name}.txt.part"
+    attempt = 1
+    while part_path.exists() or part_path.with_suffix('').exists():
+        # A re-run that starts within the same second gets its own report
+        attempt += 1
+        part_path = reports_dir / f"{timestamp}_{test_name}.{attempt}.txt.part"
+    with open(part_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(f"{test_name} {PENDING_STATUS}\n")
+        f.write(resources_line({}))
+    return supervisor.OutputCapture(part_path, tail_lines, max_bytes, final_path=_final_report_path(part_path))
+
+def _final_report_path(part_path):
+    """The report's name once write_report() has dropped the .part suffix."""
+    return part_path.with_name(part_path.name[:-len('.part')])
+
+def write_report(test_filename, exit_code, capture, announce=True):
+    """Finish a report started by start_report(): fill in the header and drop the .part suffix."""
+    status = "PASS" if exit_code == 0 else "FAIL"
+    test_name = Path(test_filename).name
 
-    with open(report_path, 'w') as f:
-        f.write(f"{test_name} {status}\n")
-        f.write(output)
+    capture.close()
+    part_path = Path(capture.path)
+    with open(part_path, 'r+b') as f:
+        f.write(f"{test_name} {status}\n".encode('utf-8'))
+        f.write(resources_line(capture.resources).encode('utf-8'))
+    report_path = _final_report_path(part_path)
+    os.replace(part_path, report_path)
 
     # Print report file path for parent scripts to read
-    print(f"report file: {report_path}")
+    if announce:
+        print(f"report file: {report_path}")
 
     return report_path
 
@@ -151,20 +310,56 @@ def main():
     parser = argparse.ArgumentParser(description='Run tests with build step')
     parser.add_argument('--passing', action='store_true', help='Run only passing tests')
     parser.add_argument('--failing', action='store_true', help='Run only failing tests')
+    parser.add_argument('--skip-build', action='store_true', help='Skip ./tests/build.py (caller already built)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Run up to N tests concurrently in directory mode (default: 1)')
+    parser.add_argument('--timeout', type=int, default=None,
+                        help='Per-test timeout in seconds (default: derived from each test\'s duration history)')
+    parser.add_argument('--tail-lines', type=int, default=supervisor.DEFAULT_TAIL_LINES,
+                        help='Lines of each test\'s output kept for the console (default: %(default)s)')
+    parser.add_argument('--max-output-bytes', type=int, default=supervisor.DEFAULT_MAX_BYTES,
+                        help='Truncate a test\'s report after this many bytes of output (default: %(default)s)')
+    parser.add_argument('--reruns', type=int, default=0,
+                        help='Re-run a failing test up to N times; a test that then passes is reported as flaky '
+                             '(default: 0)')
+    parser.add_argument('--no-quarantine', action='store_true',
+                        help='Count failures of quarantined (frequently flaky) tests as failures')
+    parser.add_argument('--shard', type=parse_shard, default=None, metavar='I/N',
+                        help='Run only shard I of N time-balanced shards (directory mode)')
+    parser.add_argument('--limit-cpu', type=int, default=None, metavar='SECONDS',
+                        help='Per-test CPU time limit (SIGXCPU, then SIGKILL)')
+    parser.add_argument('--limit-memory', type=int, default=None, metavar='MB',
+                        help='Per-test memory limit (address space; memory.max with --cgroup)')
+    parser.add_argument('--limit-files', type=int, default=None, metavar='N',
+                        help='Per-test open file limit')
+    parser.add_argument('--limit-procs', type=int, default=None, metavar='N',
+                        help='Process limit (per user with rlimits; per test with --cgroup)')
+    parser.add_argument('--cgroup', action='store_true',
+                        help='Put each test in its own cgroup v2 group when one can be delegated (Linux)')
+    parser.add_argument('--cgroup-cpus', type=float, default=None, metavar='N',
+                        help='With --cgroup, cap each test at N CPUs (cpu.max)')
+    parser.add_argument('--fork-server', action='store_true',
+                        help='Fork tests from one warm server per script environment instead of one uv run each (POSIX only)')
     parser.add_argument('test_file', nargs='?', help='Specific test file to run')
 
     args = parser.parse_args()
 
+    if args.fork_server and not fork_server.available():
+        print(f"ERROR: --fork-server needs fork() and unix sockets, which {sys.platform} doesn't have")
+        print("Run without --fork-server to launch each test with uv")
+        sys.exit(2)
+
     # Step 1: Run build script
     if not os.path.exists('./tests/build.py'):
         print("ERROR: ./tests/build.py does not exist")
         print("Run work-queue.py to see what needs to be done")
         sys.exit(1)
 
-    exit_code = run_command([UV_EXE, 'run', '--script', './tests/build.py'], 'Building project')
-    if exit_code != 0:
-        print(f"\nBuild failed with exit code {exit_code}")
-        sys.exit(exit_code)
+    if not args.skip_build:
+        exit_code = run_command([UV_EXE, 'run', '--script', './tests/build.py'], 'Building project')
+        if exit_code != 0:
+            print(f"\nBuild failed with exit code {exit_code}")
+            sys.exit(exit_code)
 
     # Step 2: Determine which tests to run
     if args.test_file:
@@ -193,17 +388,15 @@ def main():
             sys.exit(0)
 
     # Step 3: Run tests directly (no pytest)
+    run_options = {'tail_lines': args.tail_lines, 'max_bytes': args.max_output_bytes, 'limits': make_sandbox(args)}
     if args.test_file:
         # Run single test file
-        exit_code, output = run_command(
-            [UV_EXE, 'run', '--script', test_target],
-            f'Running test: {test_target}',
-            capture_output=True,
-            test_filename=test_target,
-            timeout=120,
+        exit_code, capture, verdict = asyncio.run(
+            run_test_with_reruns(test_target, args.reruns, timeout=args.timeout, **run_options)
         )
-        print(output)  # Print output to console
-        write_report(test_target, exit_code, output)
+        print(capture.text())  # Print the end of the output to console
+        write_report(test_target, exit_code, capture)
+        print_resource_table([(test_target, exit_code, capture.resources)])
     else:
         # Run all tests in directory
         import glob
@@ -212,20 +405,54 @@ def main():
             print(f"\nNo test files found in {test_target}")
             return 0
 
+        # Longest first, so a slow test never starts last and holds up the run
+        estimates = estimate_durations(test_files)
+        test_files = longest_first(test_files, estimates)
+        if args.shard:
+            index, count = args.shard
+            test_files, expected = shard_tests(test_files, index, count, estimates)
+            print(f"\nShard {index}/{count}: {len(test_files)} test(s), ~{expected:.0f}s expected")
+            if not test_files:
+                print("\nNothing to run in this shard")
+                return 0
+
         failed = []
-        for test_file in test_files:
-            exit_code, output = run_command(
-                [UV_EXE, 'run', '--script', test_file],
-                f'Running test: {test_file}',
-                capture_output=True,
-                test_filename=test_file,
-                timeout=120,
-            )
-            print(output)  # Print output to console
-            report_path = write_report(test_file, exit_code, output)
+        flaky = []
+        quarantined = []
+        usage = []
+
+        def finish(test_file, exit_code, capture, verdict):
+            print(capture.text())  # Print the end of the output to console
+            report_path = write_report(test_file, exit_code, capture)
             print(f"Report written to: {report_path}")
-            if exit_code != 0:
-                failed.append(test_file)
+            usage.append((test_file, exit_code, capture.resources))
+            if verdict == "FLAKY":
+                flaky.append(test_file)
+            elif exit_code != 0:
+                if not args.no_quarantine and run_history.is_quarantined(test_file):
+                    print(f"quarantined: {test_file}")
+                    quarantined.append(test_file)
+                else:
+                    failed.append(test_file)
+
+        if args.jobs > 1:
+            # Output is collected per test and printed whole as each one finishes
+            print(f"\nRunning {len(test_files)} test(s) with {args.jobs} parallel workers...")
+        asyncio.run(run_tests(
+            test_files, args.jobs, args.timeout, finish, args.fork_server, args.reruns, **run_options
+        ))
+
+        print_resource_table(usage)
+
+        if flaky:
+            print(f"\n⚠ {len(flaky)} test(s) passed only on a re-run (flaky):")
+            for f in flaky:
+                score, _ = run_history.flakiness(f)
+                print(f"  - {f} (flaky in {score:.0%} of recent runs)")
+        if quarantined:
+            print(f"\n⚠ {len(quarantined)} quarantined test(s) failed (not counted; see run_history.py):")
+            for f in quarantined:
+                print(f"  - {f}")
 
         if failed:
             print(f"\n✗ {len(failed)} test(s) failed:")
@@ -233,7 +460,7 @@ def main():
                 print(f"  - {f}")
             exit_code = 1
         else:
-            print(f"\n✓ All {len(test_files)} test(s) passed")
+            print(f"\n✓ All {len(test_files) - len(quarantined)} test(s) passed")
             exit_code = 0
 
     print(f"\n{'=' * 60}")
@@ -0,0 +1,162 @@
+#!/usr/bin/env uvrun
+# /// script
+# requires-python = ">=3.8"
+# dependencies = []
+# ///
+
+"""
+Chrome trace / Perfetto timeline export shared by the whole pipeline.
+
+The orchestrator (software-construction.py or reqs-gen.py) calls start_trace(),
+which creates ./reports/<timestamp>_trace.json and exports its absolute path in
+the PIPELINE_TRACE_FILE environment variable. Every process that inherits that
+variable (test.py, tests/build.py, the agent wrapper, ...) appends its spans to
+the same file, so one run loads into https://ui.perfetto.dev as a single
+timeline with real PIDs and thread IDs.
+
+Usage from Python:
+    import tracing
+    tracing.start_trace("software-construction")   # orchestrator only
+    with tracing.span("build", cat="build"):
+        ...
+
+Spans are no-ops when no trace is active.
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import itertools
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from datetime import datetime
+
+TRACE_ENV = "PIPELINE_TRACE_FILE"
+
+_lock = threading.Lock()
+_named_threads = set()
+_process_named = False
+_async_ids = itertools.count(1)
+
+
+def _now_us():
+    # Wall clock, so timestamps from different processes line up
+    return time.time_ns() // 1000
+
+
+def trace_file():
+    """Path of the active trace file, or None when tracing is off."""
+    return os.environ.get(TRACE_ENV) or None
+
+
+def _write(events):
+    path = trace_file()
+    if not path:
+        return
+    data = "".join(json.dumps(event, separators=(",", ":")) + ",\n" for event in events)
+    # One O_APPEND write per batch keeps lines from different processes intact
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+        try:
+            os.write(fd, data.encode("utf-8"))
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def _metadata(pid, tid):
+    """Process/thread name events the first time this process or thread emits."""
+    global _process_named
+    events = []
+    with _lock:
+        if not _process_named:
+            _process_named = True
+            events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": tid,
+                           "args": {"name": Path(sys.argv[0]).name or "python"}})
+        if tid not in _named_threads:
+            _named_threads.add(tid)
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                           "args": {"name": threading.current_thread().name}})
+    return events
+
+
+def emit(event):
+    """Append one raw trace event (pid, tid and ts are filled in if missing)."""
+    if not trace_file():
+        return
+    pid = os.getpid()
+    tid = threading.get_native_id()
+    event.setdefault("pid", pid)
+    event.setdefault("tid", tid)
+    event.setdefault("ts", _now_us())
+    _write(_metadata(pid, tid) + [event])
+
+
+@contextmanager
+def span(name, cat="pipeline", **args):
+    """
+    Record a complete ("X") event covering the with-block on the current thread.
+
+    Spans nest naturally when opened inside each other on the same thread.
+    """
+    if not trace_file():
+        yield
+        return
+    start = _now_us()
+    try:
+        yield
+    finally:
+        emit({"name": name, "cat": cat, "ph": "X", "ts": start, "dur": _now_us() - start, "args": args})
+
+
+@contextmanager
+def async_span(name, cat="pipeline", **args):
+    """
+    Record an async ("b"/"e") event pair, for work that interleaves with other
+    spans on the same thread (asyncio coroutines).
+    """
+    if not trace_file():
+        yield
+        return
+    # Counters restart in every process (and are copied into forked ones), so
+    # the PID goes into the id to keep spans of different processes apart
+    span_id = hex((os.getpid() << 32) | next(_async_ids))
+    emit({"name": name, "cat": cat, "ph": "b", "id": span_id, "args": args})
+    try:
+        yield
+    finally:
+        emit({"name": name, "cat": cat, "ph": "e", "id": span_id})
+
+
+def start_trace(name):
+    """
+    Start a new trace file under ./reports and export it to child processes.
+
+    Returns the trace file path. The file is closed into valid JSON when this
+    process exits; events appended by children before then are kept.
+    """
+    reports_dir = Path("./reports")
+    reports_dir.mkdir(exist_ok=True)
+    timestamp = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    path = (reports_dir / f"{timestamp}_{name}_trace.json").resolve()
+    path.write_text("[\n", encoding="utf-8")
+    os.environ[TRACE_ENV] = str(path)
+    atexit.register(_finish_trace, str(path))
+    print(f"Trace: {path} (open in https://ui.perfetto.dev)", flush=True)
+    return path
+
+
+def _finish_trace(path):
+    if os.environ.get(TRACE_ENV) != path:
+        return
+    end = {"name": "trace_end", "ph": "i", "s": "g", "pid": os.getpid(),
+           "tid": threading.get_native_id(), "ts": _now_us()}
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(end, separators=(",", ":")) + "\n]\n")
+    except OSError:
+        pass
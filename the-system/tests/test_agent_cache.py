@@ -0,0 +1,85 @@
+"""
+Unit tests for the-system/scripts/agent_cache.py.
+
+Run from the project root:
+    python -m unittest discover -s the-system/tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+import agent_cache
+
+PROMPT = "Please follow these instructions: @prompts/CHECK.md"
+
+
+class CacheKeyTests(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        Path('prompts').mkdir()
+        Path('prompts/CHECK.md').write_text("Check the README. Follow @prompts/PHILOSOPHY.md\n")
+        Path('prompts/PHILOSOPHY.md').write_text("Keep it simple.\n")
+        Path('reqs').mkdir()
+        Path('reqs/flow.md').write_text("$REQ_A: it works\n")
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def key(self, prompt=PROMPT, agent='claude', model='sonnet', cache_inputs=('reqs',)):
+        return agent_cache.cache_key(prompt, agent, model, list(cache_inputs))
+
+    def test_key_is_stable_for_unchanged_inputs(self):
+        self.assertEqual(self.key(), self.key())
+
+    def test_references_are_followed_recursively(self):
+        self.assertEqual(agent_cache.referenced_paths(PROMPT),
+                         {Path('prompts/CHECK.md'), Path('prompts/PHILOSOPHY.md')})
+        before = self.key()
+        Path('prompts/PHILOSOPHY.md').write_text("Keep it simpler.\n")
+        self.assertNotEqual(self.key(), before)
+
+    def test_cache_inputs_directory_is_part_of_the_key(self):
+        before = self.key()
+        Path('reqs/other.md').write_text("$REQ_B: so does this\n")
+        self.assertNotEqual(self.key(), before)
+
+    def test_missing_input_is_part_of_the_key(self):
+        before = self.key(cache_inputs=['README.md'])
+        Path('README.md').write_text("# Project\n")
+        self.assertNotEqual(self.key(cache_inputs=['README.md']), before)
+
+    def test_prompt_agent_and_model_are_part_of_the_key(self):
+        keys = {self.key(), self.key(prompt=PROMPT + " "), self.key(agent='codex'), self.key(model='opus')}
+        self.assertEqual(len(keys), 4)
+
+    def test_store_and_lookup(self):
+        key = self.key()
+        self.assertIsNone(agent_cache.lookup(key))
+        agent_cache.store(key, "looks good", "req-check_readmes")
+        self.assertEqual(agent_cache.lookup(key), "looks good")
+
+    def test_expired_entries_are_dropped(self):
+        key = self.key()
+        agent_cache.store(key, "looks good", "req-check_readmes")
+        with mock.patch.dict(os.environ, {'PROMPT_AGENTIC_CACHE_TTL': '-1'}):
+            self.assertIsNone(agent_cache.lookup(key))
+        self.assertIsNone(agent_cache.lookup(key))
+
+    def test_cache_is_opt_in(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop('PROMPT_AGENTIC_CACHE', None)
+            self.assertFalse(agent_cache.enabled())
+            os.environ['PROMPT_AGENTIC_CACHE'] = '1'
+            self.assertTrue(agent_cache.enabled())
+
+
+if __name__ == '__main__':
+    unittest.main()
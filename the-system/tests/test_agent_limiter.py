@@ -0,0 +1,110 @@
+"""
+Unit tests for the-system/scripts/agent_limiter.py.
+
+Run from the project root:
+    python -m unittest discover -s the-system/tests
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+import agent_limiter
+
+
+class TokenBucketTests(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        self._env = mock.patch.dict(os.environ, {
+            'PROMPT_AGENTIC_RPM': '60', 'PROMPT_AGENTIC_BURST': '3', 'PROMPT_AGENTIC_MAX_INFLIGHT': '10',
+        })
+        self._env.start()
+        self.now = 1000.0
+        self._clock = mock.patch.object(agent_limiter.time, 'time', lambda: self.now)
+        self._clock.start()
+
+    def tearDown(self):
+        self._clock.stop()
+        self._env.stop()
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def acquire(self):
+        return agent_limiter.try_acquire(600)
+
+    def test_burst_then_wait_for_refill(self):
+        leases = [self.acquire() for _ in range(3)]
+        self.assertTrue(all(lease_id is not None for lease_id, _ in leases))
+        lease_id, wait = self.acquire()
+        self.assertIsNone(lease_id)
+        self.assertAlmostEqual(wait, 1.0)  # One token per second at 60 RPM
+
+    def test_tokens_refill_over_time(self):
+        for _ in range(3):
+            self.acquire()
+        self.now += 1.0
+        self.assertIsNotNone(self.acquire()[0])
+        self.assertIsNone(self.acquire()[0])
+
+    def test_refill_is_capped_at_burst(self):
+        self.now += 3600
+        granted = 0
+        while self.acquire()[0] is not None:
+            granted += 1
+        self.assertEqual(granted, 3)
+
+    def test_inflight_cap_until_release(self):
+        os.environ['PROMPT_AGENTIC_MAX_INFLIGHT'] = '1'
+        lease_id, _ = self.acquire()
+        self.now += 60
+        self.assertEqual(self.acquire(), (None, agent_limiter.POLL_SECONDS))
+        agent_limiter.release(lease_id)
+        self.assertIsNotNone(self.acquire()[0])
+
+    def test_expired_lease_frees_its_slot(self):
+        os.environ['PROMPT_AGENTIC_MAX_INFLIGHT'] = '1'
+        self.acquire()
+        self.now += 601
+        self.assertIsNotNone(self.acquire()[0])
+
+    def test_lease_of_dead_process_frees_its_slot(self):
+        os.environ['PROMPT_AGENTIC_MAX_INFLIGHT'] = '1'
+        child = subprocess.Popen([sys.executable, '-c', 'pass'])
+        child.wait()
+        conn = agent_limiter._connect()
+        conn.execute("INSERT INTO leases VALUES ('crashed', ?, ?, ?)", (child.pid, self.now, self.now + 600))
+        conn.close()
+        self.assertIsNotNone(self.acquire()[0])
+
+    def test_pause_stops_every_caller(self):
+        agent_limiter.pause(30)
+        lease_id, wait = self.acquire()
+        self.assertIsNone(lease_id)
+        self.assertAlmostEqual(wait, 30.0)
+        self.now += 30
+        self.assertIsNone(self.acquire()[0])  # The bucket was emptied and only now refills
+        self.now += 1
+        self.assertIsNotNone(self.acquire()[0])
+
+
+class TransientErrorTests(unittest.TestCase):
+    def test_throttles_and_network_errors_are_transient(self):
+        for text in ('API Error: 529 {"type":"error"}', 'unexpected status 429 Too Many Requests',
+                     'HTTP/1.1 503 Service Unavailable', 'Rate limit reached', 'read ECONNRESET'):
+            self.assertTrue(agent_limiter.is_transient(text), text)
+
+    def test_numbers_outside_an_http_status_are_not(self):
+        for text in ('File "x.py", line 429, in run', 'killed pid 5293', 'exited with code 1'):
+            self.assertFalse(agent_limiter.is_transient(text), text)
+
+
+if __name__ == '__main__':
+    unittest.main()
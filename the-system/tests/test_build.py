@@ -0,0 +1,124 @@
+"""
+Unit tests for tests/build.py, run against a stub BUILD_COMMAND in a scratch project.
+
+Run from the project root:
+    python -m unittest discover -s the-system/tests
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+BUILD_SCRIPT = Path(__file__).resolve().parent.parent.parent / 'tests' / 'build.py'
+
+# Run in ./code: logs the build and "compiles" main.cs into bin/screenshot.exe
+STUB_BUILD = """\
+from pathlib import Path
+with open('../builds.log', 'a') as f:
+    f.write('build\\n')
+Path('bin').mkdir(exist_ok=True)
+Path('bin/screenshot.exe').write_bytes(Path('main.cs').read_bytes())
+"""
+
+
+class BuildTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        (self.root / 'tests').mkdir()
+        shutil.copy2(BUILD_SCRIPT, self.root / 'tests' / 'build.py')
+        (self.root / 'code').mkdir()
+        (self.root / 'stub_build.py').write_text(STUB_BUILD)
+        self.env = dict(os.environ)
+        self.env.pop('BUILD_FORCE', None)
+        self.env.update({
+            'BUILD_COMMAND': f'"{Path(sys.executable).as_posix()}" ../stub_build.py',
+            'BUILD_ARTIFACT': 'bin/screenshot.exe',
+            'BUILD_CACHE_DIR': '',
+        })
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def build(self, source):
+        """Build with main.cs set to source; returns the run's build-history record."""
+        (self.root / 'code' / 'main.cs').write_text(source)
+        result = subprocess.run([sys.executable, str(self.root / 'tests' / 'build.py')],
+                                env=self.env, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        history = (self.root / '.cache' / 'build-history.jsonl').read_text().splitlines()
+        return json.loads(history[-1])
+
+    def builds(self):
+        log = self.root / 'builds.log'
+        return len(log.read_text().splitlines()) if log.exists() else 0
+
+    def release(self):
+        return (self.root / 'release' / 'screenshot.exe').read_text()
+
+
+class BuildTests(BuildTestCase):
+    def test_unchanged_sources_skip_the_build(self):
+        self.assertEqual(self.build('v1')['result'], 'miss')
+        self.assertEqual(self.build('v1')['result'], 'up-to-date')
+        self.assertEqual(self.builds(), 1)
+        self.assertEqual(self.release(), 'v1')
+
+    def test_source_change_rebuilds(self):
+        self.build('v1')
+        self.assertEqual(self.build('v2')['result'], 'miss')
+        self.assertEqual(self.builds(), 2)
+        self.assertEqual(self.release(), 'v2')
+
+    def test_modified_release_exe_rebuilds(self):
+        self.build('v1')
+        (self.root / 'release' / 'screenshot.exe').write_text('tampered')
+        self.assertEqual(self.build('v1')['result'], 'miss')
+        self.assertEqual(self.release(), 'v1')
+
+
+class ArtifactCacheTests(BuildTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = self.root / 'build-cache'
+        self.env.update({'BUILD_CACHE_DIR': str(self.cache_dir), 'BUILD_CACHE_ENTRIES': '2'})
+
+    def cached_sources(self):
+        """Sources of the builds in the artifact cache."""
+        return sorted(entry.joinpath('screenshot.exe').read_text()
+                      for entry in self.cache_dir.iterdir() if not entry.name.startswith('.'))
+
+    def test_cache_hit_skips_the_build(self):
+        self.build('v1')
+        self.build('v2')
+        self.assertEqual(self.build('v1')['result'], 'cache-hit')
+        self.assertEqual(self.builds(), 2)
+        self.assertEqual(self.release(), 'v1')
+
+    def test_corrupt_entry_is_rebuilt(self):
+        self.build('v1')
+        self.build('v2')
+        for entry in self.cache_dir.iterdir():
+            exe = entry / 'screenshot.exe'
+            if exe.exists() and exe.read_text() == 'v1':
+                exe.write_text('corrupt')
+        self.assertEqual(self.build('v1')['result'], 'miss')
+        self.assertEqual(self.release(), 'v1')
+
+    def test_eviction_keeps_the_most_recently_used(self):
+        self.build('v1')
+        self.build('v2')
+        self.build('v3')
+        self.assertEqual(self.cached_sources(), ['v2', 'v3'])
+        self.assertEqual(self.build('v2')['result'], 'cache-hit')  # v2 is now the newest
+        self.build('v4')
+        self.assertEqual(self.cached_sources(), ['v2', 'v4'])
+
+
+if __name__ == '__main__':
+    unittest.main()
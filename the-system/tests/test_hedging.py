@@ -0,0 +1,130 @@
+"""
+Unit tests for hedged agent calls in the-system/scripts/prompt_agentic_coder.py,
+against stub claude and codex CLIs.
+
+Run from the project root:
+    python -m unittest discover -s the-system/tests
+"""
+
+import os
+import sys
+import tempfile
+import textwrap
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+import agent_cache
+import agent_metrics
+import prompt_agentic_coder
+
+REPORT_TYPE = 'hedge_test'
+
+# Each stub records its PID, then answers after $<AGENT>_SLEEP seconds
+# (or fails straight away if $<AGENT>_FAIL is set)
+CLAUDE_STUB = """\
+    #!/bin/sh
+    cat > /dev/null
+    echo $$ > "$STUB_DIR/claude.pid"
+    [ -n "$CLAUDE_FAIL" ] && { echo "claude failed" >&2; exit 1; }
+    sleep "$CLAUDE_SLEEP"
+    echo '{"result": "from claude"}'
+"""
+CODEX_STUB = """\
+    #!/bin/sh
+    cat > /dev/null
+    echo $$ > "$STUB_DIR/codex.pid"
+    [ -n "$CODEX_FAIL" ] && { echo "codex failed" >&2; exit 1; }
+    sleep "$CODEX_SLEEP"
+    echo '{"type": "item.completed", "item": {"type": "agent_message", "text": "from codex"}}'
+"""
+
+
+@unittest.skipIf(sys.platform == 'win32', 'stub agent CLIs are shell scripts')
+class HedgingTests(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+
+        self.stub_dir = Path(self._tmp.name) / 'bin'
+        self.stub_dir.mkdir()
+        for name, script in (('claude', CLAUDE_STUB), ('codex', CODEX_STUB)):
+            path = self.stub_dir / name
+            path.write_text(textwrap.dedent(script))
+            path.chmod(0o755)
+
+        env = {
+            'PATH': f"{self.stub_dir}{os.pathsep}{os.environ.get('PATH', '')}",
+            'STUB_DIR': str(self.stub_dir),
+            'CLAUDE_SLEEP': '0', 'CODEX_SLEEP': '0',
+            'PROMPT_AGENTIC_CACHE': '0', 'PROMPT_AGENTIC_HEDGE': '1',
+            'PROMPT_AGENTIC_RPM': '6000', 'PROMPT_AGENTIC_BURST': '100',
+        }
+        self._env = mock.patch.dict(os.environ, env)
+        self._env.start()
+        for name in ('CLAUDE_FAIL', 'CODEX_FAIL', 'PROMPT_AGENTIC_MODEL', 'PROMPT_AGENTIC_HEDGE_MODEL'):
+            os.environ.pop(name, None)
+
+        # History that puts the claude hedge threshold at 0.2s
+        for _ in range(agent_metrics.HEDGE_MIN_CALLS):
+            agent_metrics.record_call(REPORT_TYPE, 'claude', 'sonnet', time.time(), 0.2, 'ok')
+
+    def tearDown(self):
+        self._env.stop()
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def ask(self, prompt='Check the README'):
+        return prompt_agentic_coder.get_ai_response_text(
+            prompt, report_type=REPORT_TYPE, agent='claude', read_only=True, hedge=True, timeout=30
+        )
+
+    def pid(self, agent):
+        path = self.stub_dir / f'{agent}.pid'
+        return int(path.read_text()) if path.exists() else None
+
+    def assertKilled(self, pid):
+        with self.assertRaises(ProcessLookupError):
+            os.kill(pid, 0)
+
+    def test_fast_answer_is_not_hedged(self):
+        self.assertEqual(self.ask(), 'from claude')
+        self.assertIsNone(self.pid('codex'))
+
+    def test_hedge_fires_after_threshold_and_kills_the_loser(self):
+        os.environ['CLAUDE_SLEEP'] = '20'
+        started = time.monotonic()
+        self.assertEqual(self.ask(), 'from codex')
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertKilled(self.pid('claude'))
+
+    def test_primary_wins_if_it_answers_first(self):
+        os.environ['CLAUDE_SLEEP'] = '1'
+        os.environ['CODEX_SLEEP'] = '20'
+        self.assertEqual(self.ask(), 'from claude')
+        self.assertIsNotNone(self.pid('codex'))
+        self.assertKilled(self.pid('codex'))
+
+    def test_failed_hedge_does_not_win(self):
+        os.environ['CLAUDE_SLEEP'] = '1'
+        os.environ['CODEX_FAIL'] = '1'
+        self.assertEqual(self.ask(), 'from claude')
+        self.assertIsNotNone(self.pid('codex'))
+
+    def test_hedged_answer_is_cached_under_the_winner(self):
+        os.environ['PROMPT_AGENTIC_CACHE'] = '1'
+        os.environ['CLAUDE_SLEEP'] = '20'
+        self.assertEqual(self.ask('Check the README again'), 'from codex')
+        codex_key = agent_cache.cache_key('Check the README again', 'codex',
+                                          prompt_agentic_coder._agent_model('codex', hedging=True), None)
+        claude_key = agent_cache.cache_key('Check the README again', 'claude',
+                                           prompt_agentic_coder._agent_model('claude'), None)
+        self.assertEqual(agent_cache.lookup(codex_key), 'from codex')
+        self.assertIsNone(agent_cache.lookup(claude_key))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+Unit tests for the-system/scripts/pipeline.py.
+
+Run from the project root:
+    python -m unittest discover -s the-system/tests
+"""
+
+import asyncio
+import sys
+import threading
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+from pipeline import Pipeline
+
+
+class PipelineTests(unittest.TestCase):
+    def setUp(self):
+        self.pipeline = Pipeline({"agent": 2, "test": 1})
+        self.events = []
+
+    def tearDown(self):
+        self.pipeline.shutdown()
+
+    def run_async(self, coro):
+        return asyncio.run(coro)
+
+    async def step(self, name, seconds=0.01):
+        self.events.append(f"start {name}")
+        await asyncio.sleep(seconds)
+        self.events.append(f"end {name}")
+        return name
+
+    def test_item_starts_after_its_deps(self):
+        async def main():
+            a = self.pipeline.submit("a", self.step, "a", 0.05)
+            b = self.pipeline.submit("b", self.step, "b", deps=[a])
+            return await b
+
+        self.assertEqual(self.run_async(main()), "b")
+        self.assertEqual(self.events, ["start a", "end a", "start b", "end b"])
+
+    def test_failed_dep_fails_dependents(self):
+        def fail():
+            raise ValueError("broken build")
+
+        async def main():
+            build = self.pipeline.submit("build", fail, resource="build")
+            test = self.pipeline.submit("test", self.step, "test", deps=[build], resource="test")
+            with self.assertRaises(ValueError):
+                await test
+
+        self.run_async(main())
+        self.assertEqual(self.events, [])
+
+    def test_plain_functions_run_on_a_worker_thread(self):
+        async def main():
+            return await self.pipeline.submit("index", threading.get_ident)
+
+        self.assertNotEqual(self.run_async(main()), threading.get_ident())
+
+    def test_resource_limit_caps_concurrency(self):
+        running, peak = [0], [0]
+
+        async def item():
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.02)
+            running[0] -= 1
+
+        async def main():
+            for i in range(5):
+                self.pipeline.submit(f"agent {i}", item, resource="agent")
+            await self.pipeline.wait()
+
+        self.run_async(main())
+        self.assertEqual(peak[0], 2)
+
+    def test_cancel_pending_leaves_running_items(self):
+        async def main():
+            running = self.pipeline.submit("probe 1", self.step, "1", 0.05, resource="test")
+            waiting = self.pipeline.submit("probe 2", self.step, "2", resource="test")
+            await asyncio.sleep(0.01)
+            self.assertEqual(self.pipeline.pending, 1)
+            self.pipeline.cancel_pending([running, waiting])
+            self.assertEqual(await running, "1")
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+            self.assertEqual(self.pipeline.pending, 0)
+
+        self.run_async(main())
+        self.assertEqual(self.events, ["start 1", "end 1"])
+
+    def test_wait_includes_items_submitted_while_waiting(self):
+        async def chain():
+            await asyncio.sleep(0.01)
+            self.pipeline.submit("follow-up", self.step, "follow-up")
+
+        async def main():
+            self.pipeline.submit("first", chain)
+            await self.pipeline.wait()
+
+        self.run_async(main())
+        self.assertEqual(self.events, ["start follow-up", "end follow-up"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+"""
+Unit tests for the-system/scripts/run_history.py.
+
+Run from the project root:
+    python -m unittest discover -s the-system/tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+import run_history
+
+
+class TimeoutTests(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def record(self, duration, status, count=1):
+        for _ in range(count):
+            run_history.record_run('test_example.py', duration, status)
+
+    def test_hangs_do_not_raise_timeout(self):
+        self.record(20.0, 'PASS', count=5)
+        before = run_history.timeout_for('test_example.py')
+        self.record(before + 0.5, 'TIMEOUT', count=10)
+        self.assertEqual(run_history.timeout_for('test_example.py'), before)
+
+    def test_fast_failures_do_not_lower_timeout(self):
+        self.record(200.0, 'PASS', count=5)
+        before = run_history.timeout_for('test_example.py')
+        self.record(1.0, 'FAIL', count=20)
+        self.assertEqual(run_history.timeout_for('test_example.py'), before)
+
+    def test_default_until_enough_passing_runs(self):
+        self.record(120.5, 'TIMEOUT', count=3)
+        self.record(1.0, 'FAIL', count=3)
+        self.assertEqual(run_history.timeout_for('test_example.py'), run_history.DEFAULT_TIMEOUT)
+
+    def test_hangs_are_not_a_regression(self):
+        self.record(10.0, 'PASS', count=10)
+        self.record(120.5, 'TIMEOUT', count=5)
+        self.assertIsNone(run_history.regression('test_example.py'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+Unit tests for duration-aware scheduling and sharding in the-system/scripts/test.py.
+
+Run from the project root:
+    python -m unittest discover -s the-system/tests
+"""
+
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / 'scripts'
+sys.path.insert(0, str(SCRIPTS_DIR))
+import run_history
+
+# test.py would shadow the stdlib test package, and chdirs to the project root on import
+_cwd = os.getcwd()
+_spec = importlib.util.spec_from_file_location('test_runner', SCRIPTS_DIR / 'test.py')
+test_runner = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(test_runner)
+os.chdir(_cwd)
+
+ESTIMATES = {'a.py': 10.0, 'b.py': 8.0, 'c.py': 6.0, 'd.py': 5.0, 'e.py': 4.0}
+
+
+class ShardingTests(unittest.TestCase):
+    def test_longest_first_breaks_ties_by_name(self):
+        estimates = {'z.py': 5.0, 'a.py': 5.0, 'm.py': 9.0}
+        self.assertEqual(test_runner.longest_first(sorted(estimates), estimates), ['m.py', 'a.py', 'z.py'])
+
+    def test_shards_cover_every_test_once(self):
+        shards = [test_runner.shard_tests(sorted(ESTIMATES), i, 3, ESTIMATES)[0] for i in (1, 2, 3)]
+        self.assertEqual(sorted(t for shard in shards for t in shard), sorted(ESTIMATES))
+
+    def test_each_test_goes_to_the_least_loaded_shard(self):
+        self.assertEqual(test_runner.shard_tests(sorted(ESTIMATES), 1, 2, ESTIMATES), (['a.py', 'd.py'], 15.0))
+        self.assertEqual(test_runner.shard_tests(sorted(ESTIMATES), 2, 2, ESTIMATES), (['b.py', 'c.py', 'e.py'], 18.0))
+
+    def test_shards_do_not_depend_on_input_order(self):
+        shuffled = ['c.py', 'e.py', 'a.py', 'd.py', 'b.py']
+        self.assertEqual(test_runner.shard_tests(shuffled, 2, 2, ESTIMATES),
+                         test_runner.shard_tests(sorted(ESTIMATES), 2, 2, ESTIMATES))
+
+    def test_more_shards_than_tests_leaves_some_empty(self):
+        self.assertEqual(test_runner.shard_tests(['a.py'], 2, 2, {'a.py': 1.0}), ([], 0.0))
+
+
+class EstimateTests(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def test_unknown_tests_are_assumed_as_slow_as_the_slowest(self):
+        run_history.record_run('fast.py', 2.0, 'PASS')
+        run_history.record_run('slow.py', 30.0, 'PASS')
+        self.assertEqual(test_runner.estimate_durations(['fast.py', 'slow.py', 'new.py']),
+                         {'fast.py': 2.0, 'slow.py': 30.0, 'new.py': 30.0})
+
+    def test_without_history_every_test_gets_the_default(self):
+        self.assertEqual(test_runner.estimate_durations(['new.py']), {'new.py': run_history.DEFAULT_DURATION})
+
+
+if __name__ == '__main__':
+    unittest.main()